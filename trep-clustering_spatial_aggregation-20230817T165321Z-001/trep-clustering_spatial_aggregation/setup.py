@@ -15,6 +15,7 @@ setuptools.setup(
         "geokit",
         "FINE",
         "MATES",
-        "sqlalchemy"
+        "sqlalchemy",
+        "pyarrow"
         ]
     )
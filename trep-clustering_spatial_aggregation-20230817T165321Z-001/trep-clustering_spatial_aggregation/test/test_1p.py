@@ -38,5 +38,5 @@ def test_1percent():
             }
     glr.add_tech("Wind")
     glr.techs["Wind"].run_exclusion(exclusion_dict=exclusion_dict)
-    glr.techs["Wind"].restrict_area(share=0.01, tolerance=0.0001, step=0.0001)
+    glr.techs["Wind"].restrict_area(share=0.01, tolerance=0.0001)
     assert (0.009 * 100 < glr.techs["Wind"].ec.percentAvailable < 0.011 * 100), "Bigger deviation than tolerance"
@@ -0,0 +1,27 @@
+from trep.asset_registry import AssetRegistry
+import pandas as pd
+
+
+def test_asset_registry():
+    units = pd.DataFrame({"ENH_MastrID": ["SEE1", "SEE2", "SEE3", "SEE4"],
+                          "ENH_Laengengrad": [6.80, 6.83, 7.50, None],
+                          "ENH_Breitengrad": [51.20, 51.22, 52.00, 51.20],
+                          "ENH_Gemeindeschluessel": ["05111000", "05111000", "05515000", "05111000"]})
+    registry = AssetRegistry(units)
+    assert list(registry.query(6.7, 51.1, 6.9, 51.3).ENH_MastrID) == ["SEE1", "SEE2"], "Unexpected units in box"
+    assert len(registry.query(8.0, 53.0, 9.0, 54.0)) == 0, "Box outside of the grid should be empty"
+    assert list(registry.get_municipality("05111000").ENH_MastrID) == ["SEE1", "SEE2", "SEE4"], \
+        "Unexpected units of the municipality"
+    assert len(registry.get_municipality("09162000")) == 0, "Unknown municipality should be empty"
+    subset = registry.query(6.7, 51.1, 6.9, 51.3)
+    subset["ENH_MastrID"] = "changed"
+    assert registry.units.ENH_MastrID[0] == "SEE1", "Queries should return copies"
+
+
+def test_asset_registry_cell_edges():
+    # coordinates on the edges of cells, where a rounded origin of the grid loses units
+    units = pd.DataFrame({"ENH_MastrID": ["SEE1", "SEE2", "SEE3"], "ENH_Laengengrad": [6.8, 6.85, 7.1],
+                          "ENH_Breitengrad": [51.15, 51.2, 51.25]})
+    registry = AssetRegistry(units)
+    assert list(registry.query(6.8, 51.15, 7.1, 51.25).ENH_MastrID) == ["SEE1", "SEE2", "SEE3"], \
+        "Units on the edges of cells are lost"
@@ -0,0 +1,106 @@
+from trep.availability import PackedAvailability, grow_areas, stamp_footprints
+import geokit as gk
+import glaes as gl
+import numpy as np
+import pandas as pd
+import scipy.ndimage
+
+
+def test_packed_availability(tmp_path):
+    region = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 1030, 990, srs=3035), pixelRes=10)
+    availability = PackedAvailability(region)
+    assert availability.percentAvailable == 100, "Unexpected initial availability"
+    mask = np.zeros(region.mask.shape, dtype=bool)
+    mask[:, :50] = True
+    availability.exclude(mask)
+    assert availability.pixelsAvailable == region.mask.sum() - mask.sum(), "Unexpected exclusion"
+    mask[:, :25] = False
+    availability.include(mask)
+    assert availability.areaAvailable == (region.mask.sum() - 25 * region.mask.shape[0]) * 100, \
+        "Unexpected inclusion"
+    dense = availability.to_availability()
+    assert np.array_equal(PackedAvailability.from_availability(region, dense).packed, availability.packed), \
+        "Packing is not reversible"
+    output = str(tmp_path / "availability.tif")
+    availability.save(output)
+    loaded = PackedAvailability.from_raster(region, output, block_size=7)
+    assert np.array_equal(loaded.packed, availability.packed), "Saved availability differs"
+
+
+def test_read_region_window(tmp_path):
+    from trep.availability import read_region
+    state = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 2000, 1000, srs=3035), pixelRes=10)
+    data = np.arange(state.mask.size, dtype=np.int32).reshape(state.mask.shape)
+    output = str(tmp_path / "state.tif")
+    state.createRaster(output=output, data=data)
+    mun = gk.RegionMask.fromGeom(gk.geom.box(500, 200, 800, 600, srs=3035), pixelRes=10)
+    assert np.array_equal(read_region(mun, output), data[40:80, 50:80]), "Unexpected window of the raster"
+
+
+def test_stamp_footprints():
+    region = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 1000, 1000, srs=3035), pixelRes=10)
+    availability = np.full(region.mask.shape, 100, dtype=np.uint8)
+    n_pixels = stamp_footprints(region, availability, [500], [500], [100, 100], shape="rectangle")
+    assert n_pixels == 400 and (availability == 0).sum() == 400, "Unexpected pixels of the rectangle"
+    availability[:] = 100
+    n_pixels = stamp_footprints(region, availability, [500], [500], [200, 100], direction=[0])
+    assert abs(n_pixels - np.pi * 200 * 100 / 100) < 20, "Unexpected area of the ellipse"
+    assert availability[50, 68] == 0 and availability[32, 50] == 100, "Ellipse should be oriented west to east"
+    availability[:] = 100
+    stamp_footprints(region, availability, [500], [500], [200, 100], direction=[90])
+    assert availability[50, 68] == 100 and availability[32, 50] == 0, "Ellipse should be oriented south to north"
+    assert stamp_footprints(region, availability, [5000, np.nan], [5000, 500], [200, 100]) == 0, \
+        "Footprints outside of the region should not be stamped"
+
+
+def test_stamp_footprints_as_exclude_points():
+    region = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 1000, 1000, srs=3035), pixelRes=10)
+    for shape, scale, direction in [("ellipse", [300, 100], 30), ("rectangle", [200, 80], 60)]:
+        items = pd.DataFrame({"geom": [gk.geom.point(500, 500, srs=3035)], "scale": [np.array(scale)],
+                              "direction": [direction]})
+        ec = gl.ExclusionCalculator(region)
+        ec.excludePoints(items, shape)
+        excluded = (ec._availability == 0) & region.mask
+        availability = np.full(region.mask.shape, 100, dtype=np.uint8)
+        stamp_footprints(region, availability, [500], [500], scale, direction=direction, shape=shape)
+        stamped = availability == 0
+        # pixels on the outline may differ, as excludePoints rasterizes a polygon of the footprint
+        assert (excluded != stamped).sum() < 0.05 * excluded.sum(), f"Stamped {shape} differs from excludePoints"
+
+
+def test_separation_as_stamp_footprints():
+    region = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 5000, 5000, srs=3035), pixelRes=10)
+    direction = 30
+    separation = (800, 200)
+    ec = gl.ExclusionCalculator(region)
+    ec.distributeItems(separation=separation, axialDirection=direction)
+    x, y = np.array(ec.itemCoords).T
+    assert len(x) > 10, "Too few items placed"
+    # no other item is within the separation ellipse of an item, stamped with the direction of the footprints
+    for i in range(len(x)):
+        availability = np.full(region.mask.shape, 100, dtype=np.uint8)
+        stamp_footprints(region, availability, [x[i]], [y[i]], [0.95 * separation[0], 0.95 * separation[1]],
+                         direction=direction)
+        cols = np.floor((np.delete(x, i) - region.extent.xMin) / region.pixelWidth).astype(int)
+        rows = np.floor((region.extent.yMax - np.delete(y, i)) / region.pixelHeight).astype(int)
+        assert (availability[rows, cols] == 100).all(), "Separation of placed items differs from the footprints"
+
+
+def test_grow_areas():
+    rng = np.random.default_rng(0)
+    values = scipy.ndimage.gaussian_filter(rng.random((60, 80)), 2)
+    available = rng.random(values.shape) < 0.8
+    threshold, pixels, areas, sizes = grow_areas(values, available, 500, min_pixels=20, n_bins=50)
+    # labelling the pixels above the threshold gives the same areas
+    labels, _ = scipy.ndimage.label(available & (values >= threshold))
+    label_sizes = np.bincount(labels.ravel())
+    label_sizes[0] = 0
+    expected = np.flatnonzero((label_sizes >= 20)[labels.ravel()])
+    assert np.array_equal(np.sort(pixels[(sizes >= 20)[areas]]), expected), "Unexpected areas"
+    assert label_sizes[label_sizes >= 20].sum() >= 500, "The target is not met"
+    # one pixel less does not meet the target
+    below = np.sort(values[available & (values >= threshold)])[1]
+    labels, _ = scipy.ndimage.label(available & (values >= below))
+    label_sizes = np.bincount(labels.ravel())
+    label_sizes[0] = 0
+    assert label_sizes[label_sizes >= 20].sum() < 500, "The threshold is too low"
@@ -0,0 +1,46 @@
+import os
+import json
+import time
+from trep import batch
+
+
+def _fake_region(rs, level, techs, estimate_kwargs, trep_kwargs, memory_limit, connection):
+    """Worker of run_batch, which succeeds, fails with a long traceback or hangs depending on the region."""
+    if rs == "error":
+        # larger than the buffer of the pipe
+        connection.send("x" * 2 ** 20)
+    elif rs == "slow":
+        time.sleep(60)
+    else:
+        connection.send(None)
+    connection.close()
+
+
+def test_run_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "_run_region", _fake_region)
+    manifest_path = os.path.join(tmp_path, "batch.json")
+    # a region running when the last batch was interrupted is run again
+    with open(manifest_path, "w") as f:
+        json.dump({"level": "MUN", "regions": {"interrupted": {"status": "running", "attempts": 1}}}, f)
+    regions = ["ok", "error", "slow", "interrupted"]
+    manifest = batch.run_batch(regions, level="MUN", manifest_path=manifest_path, n_jobs=4, timeout=5)
+    entries = manifest["regions"]
+    assert entries["ok"]["status"] == "done" and entries["ok"]["error"] is None, "Region ok should be done"
+    assert entries["error"]["status"] == "failed" and entries["error"]["error"] == "x" * 2 ** 20, \
+        "The long traceback should be received"
+    assert entries["slow"]["status"] == "failed" and entries["slow"]["error"].startswith("timeout"), \
+        "Region slow should time out"
+    assert entries["interrupted"]["status"] == "done" and entries["interrupted"]["attempts"] == 2, \
+        "Interrupted region should be run again"
+    with open(manifest_path, "r") as f:
+        assert json.load(f) == manifest, "The manifest file differs"
+
+    # finished and failed regions are skipped
+    manifest = batch.run_batch(regions, level="MUN", manifest_path=manifest_path, n_jobs=4, timeout=5)
+    assert all(manifest["regions"][rs]["attempts"] == 1 for rs in ["ok", "error", "slow"]), "Regions were run again"
+
+    # failed regions are run again with retry_failed
+    manifest = batch.run_batch(["ok", "error"], level="MUN", manifest_path=manifest_path, retry_failed=True)
+    assert manifest["regions"]["ok"]["attempts"] == 1, "Finished region was run again"
+    assert manifest["regions"]["error"]["attempts"] == 2 and manifest["regions"]["error"]["status"] == "failed", \
+        "Failed region should be retried"
@@ -0,0 +1,15 @@
+from trep import TREP
+
+
+def test_child_Ilmenau():
+    glr = TREP("Ilm-Kreis", case="tests")
+    child = glr.child("Ilmenau")
+    glr_mun = TREP("Ilmenau", level="MUN", case="tests")
+    assert child.rs == glr_mun.rs, "Unexpected RS of the child"
+    assert child._settings == glr._settings, "The child should have the settings of its parent"
+    assert child.intermediate_cache is glr.intermediate_cache, "The child should share the intermediate cache"
+    # the mask of the child is cut out of the municipality labels of the district
+    pixels = child.regionMask.mask.sum()
+    assert abs(pixels - glr_mun.regionMask.mask.sum()) < 1e-4 * pixels, "Mask of the child differs"
+    assert (child.regionMask.pixelWidth, child.regionMask.pixelHeight) == \
+        (glr.regionMask.pixelWidth, glr.regionMask.pixelHeight), "The child should be on the grid of the parent"
@@ -0,0 +1,28 @@
+import os
+from trep.exclusion_planner import ExclusionPlanner
+
+
+def _layer(key):
+    return dict(key=key, category="infrastructure", parts=[dict(regional=False, feature_dict=dict(source="osm"))])
+
+
+def test_planner_merges_saved_runs(tmp_path):
+    path = os.path.join(tmp_path, "planner", "exclusion_planner.json")
+    # two processes start from the same, missing statistics
+    planner_1 = ExclusionPlanner(path)
+    planner_2 = ExclusionPlanner(path)
+    planner_1.record(_layer("roads"), 10, 0.5, 10)
+    planner_2.record(_layer("roads"), 30, 0.1, 10)
+    planner_2.record(_layer("railways"), 1, 0.2, 10)
+    planner_1.save()
+    planner_2.save()
+    stats = ExclusionPlanner(path).stats
+    assert stats["roads:osm"]["runs"] == 2, "The run of the first process was lost"
+    assert abs(stats["roads:osm"]["cost"] - 2) < 1e-9, "Unexpected mean cost"
+    assert abs(stats["roads:osm"]["selectivity"] - 0.3) < 1e-9, "Unexpected mean selectivity"
+    assert stats["railways:osm"]["runs"] == 1, "Unexpected runs of railways"
+    # saving again does not add the runs twice
+    planner_2.save()
+    assert ExclusionPlanner(path).stats["roads:osm"]["runs"] == 2, "Runs were saved twice"
+    ordered = ExclusionPlanner(path).order([_layer("roads"), _layer("railways")])
+    assert [layer["key"] for layer in ordered] == ["railways", "roads"], "Unexpected order of the layers"
@@ -0,0 +1,20 @@
+from trep.intermediate_cache import IntermediateCache
+import os
+import time
+
+
+def test_writing_and_eviction(tmp_path):
+    cache = IntermediateCache(str(tmp_path), max_size=1.5e-6)
+    paths = [os.path.join(str(tmp_path), f"layer{i}_{'0' * 19}{i}.tif") for i in range(3)]
+    for path in paths:
+        with cache.writing(path) as _path:
+            assert _path != path, "Missing intermediate should be written to a temporary file"
+            with open(_path, "wb") as f:
+                f.write(b"0" * 600)
+        assert os.path.isfile(path), "Intermediate was not moved into the cache"
+        time.sleep(0.01)
+    # only the two most recently used files fit into the budget of 1500 bytes
+    assert not os.path.isfile(paths[0]), "Least recently used intermediate was not evicted"
+    with cache.writing(paths[1]) as _path:
+        assert _path == paths[1], "Existing intermediate was not reused"
+    assert len(os.listdir(str(tmp_path))) == 2, "Temporary files were left in the cache"
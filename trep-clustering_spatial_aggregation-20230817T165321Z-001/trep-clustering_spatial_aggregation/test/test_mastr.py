@@ -0,0 +1,64 @@
+from trep.mastr import MastrSnapshot
+import geokit as gk
+import pandas as pd
+import sqlite3
+import multiprocessing
+import pytest
+
+
+def _create_mastr(path):
+    """Create a MaStR database with wind and solar units in two states."""
+    units = pd.DataFrame({
+        "ENH_MastrID": ["SEE1", "SEE2", "SEE3", "SEE4", "SEE5"],
+        "ENH_Bundesland": ["Nordrhein-Westfalen", "Nordrhein-Westfalen", "Nordrhein-Westfalen", "Bayern",
+                           "Nordrhein-Westfalen"],
+        "ENH_EinheitenTyp": ["Windeinheit", "Windeinheit", "Solareinheit", "Windeinheit", "Windeinheit"],
+        "ENH_Betriebsstatus": ["In Betrieb", "In Betrieb", "In Betrieb", "In Betrieb", "In Planung"],
+        "ENH_Nettonennleistung": [3000.0, 2000.0, 500.0, 4000.0, 5000.0],
+        "ENH_Breitengrad": [51.2, 52.0, 51.2, 48.1, 51.2],
+        "ENH_Laengengrad": [6.8, 7.5, 6.8, 11.6, 6.8]})
+    connection = sqlite3.connect(path)
+    units.to_sql("processed", connection, index=False)
+    connection.close()
+
+
+def test_mastr_snapshot(tmp_path):
+    db_path = str(tmp_path / "mastr.db")
+    _create_mastr(db_path)
+    snapshot = MastrSnapshot.open(db_path, str(tmp_path / "snapshot"))
+    units = snapshot.get_units("05", "Windeinheit", columns=["ENH_MastrID", "ENH_Nettonennleistung"])
+    assert sorted(units.ENH_MastrID) == ["SEE1", "SEE2", "SEE5"], "Unexpected units of the partition"
+    assert list(units.columns) == ["ENH_MastrID", "ENH_Nettonennleistung"], "Only requested columns should be read"
+    units = snapshot.get_units("Nordrhein-Westfalen", "Windeinheit", columns=["ENH_MastrID"],
+                               filters=[("ENH_Betriebsstatus", "=", "In Betrieb")],
+                               extent=gk.Extent(6.7, 51.1, 6.9, 51.3, srs=4326))
+    assert list(units.ENH_MastrID) == ["SEE1"], "Unexpected units in the bounding box"
+    assert len(snapshot.get_units("09", "Solareinheit")) == 0, "Missing partitions should be empty"
+    with pytest.raises(ValueError):
+        snapshot.get_units("17", "Windeinheit")
+
+
+def _open_snapshot(paths):
+    return MastrSnapshot.open(*paths).path
+
+
+def test_mastr_snapshot_versions(tmp_path):
+    db_path = str(tmp_path / "mastr.db")
+    path = str(tmp_path / "snapshot")
+    _create_mastr(db_path)
+    snapshot = MastrSnapshot.open(db_path, path)
+    assert MastrSnapshot.open(db_path, path).path == snapshot.path, "An unchanged snapshot should not be compiled"
+    connection = sqlite3.connect(db_path)
+    connection.execute("DELETE FROM processed WHERE ENH_MastrID = 'SEE2'")
+    connection.commit()
+    connection.close()
+    # processes opening the changed snapshot at the same time compile it once
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        paths = pool.map(_open_snapshot, [(db_path, path)] * 4)
+    assert len(set(paths)) == 1 and paths[0] != snapshot.path, "The snapshot should be compiled once"
+    new = MastrSnapshot.open(db_path, path)
+    assert new.path == paths[0], "The pointer should name the new version"
+    assert sorted(new.get_units("05", "Windeinheit").ENH_MastrID) == ["SEE1", "SEE5"], "Unexpected units"
+    # the previous version stays readable
+    assert sorted(snapshot.get_units("05", "Windeinheit").ENH_MastrID) == ["SEE1", "SEE2", "SEE5"], \
+        "The previous version should not be changed"
@@ -0,0 +1,37 @@
+from trep.region_catalog import RegionCatalog
+import geokit as gk
+import os
+
+
+def _create_vg250(path):
+    """Create a state with one district of two municipalities."""
+    mun = [gk.geom.box(0, 0, 1000, 1000, srs=3035), gk.geom.box(1000, 0, 2000, 1000, srs=3035)]
+    gk.vector.createVector(mun, output=os.path.join(path, "VG250_GEM.shp"),
+                           fieldVals={"RS": ["051110000000", "051110000001"], "AGS": ["05111000", "05111001"],
+                                      "GEN": ["Düsseldorf", "Neuss"], "NUTS": ["DEA11", "DEA11"], "GF": [4, 4]})
+    krs = [gk.geom.box(0, 0, 2000, 1000, srs=3035)]
+    gk.vector.createVector(krs, output=os.path.join(path, "VG250_KRS.shp"),
+                           fieldVals={"RS": ["05111"], "AGS": ["05111"], "GEN": ["Düsseldorf"], "NUTS": ["DEA11"],
+                                      "GF": [4]})
+    lan = [gk.geom.box(0, 0, 2000, 1000, srs=3035), gk.geom.box(0, 1000, 2000, 1100, srs=3035)]
+    gk.vector.createVector(lan, output=os.path.join(path, "VG250_LAN.shp"),
+                           fieldVals={"RS": ["05", "05"], "AGS": ["05", "05"],
+                                      "GEN": ["Nordrhein-Westfalen", "Nordrhein-Westfalen"],
+                                      "NUTS": ["DEA", "DEA"], "GF": [4, 1]})
+
+
+def test_region_catalog(tmp_path):
+    _create_vg250(str(tmp_path))
+    path = str(tmp_path / "catalog" / "region_catalog.sqlite")
+    catalog = RegionCatalog.open(str(tmp_path), path)
+    features = catalog.get_features("MUN", ["Neuss"])
+    assert list(features.RS) == ["051110000001"], "Municipality not found by name"
+    assert abs(features.geom[0].GetArea() - 1e6) < 1e-3, "Geometry differs from the shapefile"
+    assert list(catalog.get_children("05111")) == ["051110000000", "051110000001"], "Unexpected municipalities"
+    assert len(catalog.get_features("state", ["NRW"])) == 1, "Water areas of states should not be selected"
+    assert catalog.get_intersecting("MUN", 1500, 100, 1600, 200) == ["051110000001"], "Unexpected spatial query"
+    assert catalog.get_neighbours("051110000000") == ["051110000001"], "Touching municipalities are neighbours"
+    assert catalog.get_neighbours("05", level="state") == [], "Parts of a region are no neighbours"
+    version = catalog.version
+    catalog.close()
+    assert RegionCatalog.open(str(tmp_path), path).version == version, "Unchanged catalog was built again"
@@ -0,0 +1,21 @@
+from trep.region_labels import rasterize_labels, pixel_index, point_coordinates
+import geokit as gk
+import numpy as np
+
+
+def test_rasterize_labels():
+    region = gk.RegionMask.fromGeom(gk.geom.box(0, 0, 2000, 1000, srs=3035), pixelRes=10)
+    geoms = [gk.geom.box(0, 0, 1000, 1000, srs=3035), gk.geom.box(1000, 0, 2000, 1000, srs=3035)]
+    labels = rasterize_labels(region, geoms, labels=[7, 9])
+    assert (np.bincount(labels.ravel(), minlength=10)[[7, 9]] == 10000).all(), "Unexpected label areas"
+    rows, cols, inside = pixel_index(region, [5, 1995, 3000], [5, 995, 5])
+    assert list(labels[rows, cols][inside]) == [7, 9], "Unexpected labels of points"
+    assert list(inside) == [True, True, False], "Point outside of the region was not detected"
+
+
+def test_point_coordinates():
+    points = [gk.geom.point(7.0, 51.0, srs=4326), gk.geom.point(8.5, 52.5, srs=4326)]
+    x, y = point_coordinates(points)
+    assert np.allclose(x, [7.0, 8.5]) and np.allclose(y, [51.0, 52.5]), "Unexpected coordinates"
+    x, y = point_coordinates([])
+    assert len(x) == 0 and len(y) == 0, "Coordinates of no points should be empty"
@@ -0,0 +1,20 @@
+from trep.region_mask_cache import RegionMaskCache
+import geokit as gk
+import numpy as np
+
+
+def test_region_mask_cache(tmp_path):
+    cache = RegionMaskCache(str(tmp_path))
+    geom = gk.geom.box(0, 0, 1030, 990, srs=3035)
+    path = cache.get_path(["05111"], "nuts3", 3035, 10, "v1")
+    assert cache.load(path) is None, "Mask should not be cached yet"
+    region = gk.RegionMask.fromGeom(geom, pixelRes=10)
+    cache.save(path, region)
+    loaded = cache.load(path, geom=geom)
+    assert np.array_equal(loaded.mask, region.mask), "Cached mask differs"
+    assert loaded.extent.xyXY == region.extent.xyXY, "Cached extent differs"
+    # without a geometry the cached geometry is loaded
+    loaded = cache.load(path)
+    assert abs(loaded.geometry.Area() - geom.Area()) < 1e-6, "Cached geometry differs"
+    assert loaded.geometry.GetSpatialReference().IsSame(region.srs), "Cached geometry has another srs"
+    assert cache.get_path(["05111"], "nuts3", 3035, 10, "v2") != path, "New boundaries should not reuse the mask"
@@ -1,4 +1,6 @@
 from trep import TREP
+import copy
+import numpy as np
 import time
 
 def test_Ilm_Kreis():
@@ -32,3 +34,13 @@ def test_Juelich():
     glr.Wind.estimate_potential()
     assert 7.8 > glr.techs["Wind"].ec.percentAvailable > 7.4, "Unexpected area outcome"
     assert len(glr.techs["Wind"].predicted_items) == 92, "Unexpected turbine outcome"
+
+
+def test_parallel_exclusion():
+    glr = TREP(level="MUN", region="Ilmenau", case="tests")
+    exclusion_dict = glr.Wind.load_exclusionDict("wind_basis")
+    glr.Wind._run_exclusion(copy.deepcopy(exclusion_dict))
+    serial = glr.Wind.ec._availability.copy()
+    glr.Wind.ec = glr.new_ec()
+    glr.Wind._run_exclusion(copy.deepcopy(exclusion_dict), n_jobs=3)
+    assert np.array_equal(glr.Wind.ec._availability, serial), "Parallel exclusion differs from the serial exclusion"
@@ -0,0 +1,213 @@
+import os
+import numpy as np
+import pandas as pd
+from trep import utils
+
+# size of the cells of the grid index in degree
+CELL_SIZE = 0.05
+# unit type, conditions and columns of the existing units of each technology in the MaStR snapshot
+KINDS = {
+    "Wind": ("Windeinheit",
+             [("ENH_Betriebsstatus", "=", "In Betrieb")],
+             ["ENH_MastrID", "ENH_Nettonennleistung", "ENH_Plz", "ENH_InbetriebnahmeDatum",
+              "ENH_Rotordurchmesser", "ENH_Nabenhoehe", "ENH_Breitengrad", "ENH_Laengengrad", "ENH_Seelage"]),
+    "OpenfieldPV": ("Solareinheit",
+                    [("ENH_Lage", "=", "Freifläche"), ("ENH_Betriebsstatus", "=", "In Betrieb")],
+                    ["ENH_MastrID", "ENH_Nettonennleistung", "ENH_Plz", "ENH_InbetriebnahmeDatum",
+                     "ENH_Breitengrad", "ENH_Laengengrad"]),
+}
+
+# registries of the process by kind, state and source
+_registries = {}
+
+
+class AssetRegistry(object):
+    """Existing units of one technology in one federal state.
+
+    The units are held in memory with a grid index of their coordinates and, if given, an index of their
+    municipality, so the units of a region are selected without reading the MaStR again. The arrays of the
+    registry are read-only and queries return copies, so registries loaded before a fork are shared copy-on-write
+    with the worker processes.
+    """
+
+    def __init__(self, units, cell_size=CELL_SIZE):
+        """
+        Parameters
+        ----------
+        units : pd.DataFrame
+            the units, indexed by coordinates if they have the columns ENH_Laengengrad and ENH_Breitengrad and by
+            municipality if they have the column ENH_Gemeindeschluessel
+        cell_size : float, optional
+            size of the cells of the grid index in degree, by default CELL_SIZE
+        """
+        self.units = units.reset_index(drop=True)
+        self.cell_size = cell_size
+        self._grid = None
+        self._municipalities = None
+        if "ENH_Laengengrad" in units.columns and "ENH_Breitengrad" in units.columns:
+            self._build_grid()
+        if "ENH_Gemeindeschluessel" in units.columns:
+            self._build_municipalities()
+
+    def _build_grid(self):
+        """Sort the units by grid cell. The units of a cell are given by the start of the cell and the next one."""
+        lon = pd.to_numeric(self.units["ENH_Laengengrad"], errors="coerce").values.astype(float)
+        lat = pd.to_numeric(self.units["ENH_Breitengrad"], errors="coerce").values.astype(float)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        if not valid.any():
+            return
+        # the grid is given by integer cell indices, so the origin is not rounded
+        cols = np.floor(lon[valid] / self.cell_size).astype(np.int64)
+        rows = np.floor(lat[valid] / self.cell_size).astype(np.int64)
+        col_origin, row_origin = int(cols.min()), int(rows.min())
+        n_cols = int(cols.max()) - col_origin + 1
+        n_rows = int(rows.max()) - row_origin + 1
+        cells = np.full(len(lon), n_rows * n_cols, dtype=np.int64)
+        cells[valid] = np.clip(rows - row_origin, 0, n_rows - 1) * n_cols + \
+            np.clip(cols - col_origin, 0, n_cols - 1)
+        order = np.argsort(cells, kind="stable")
+        starts = np.searchsorted(cells[order], np.arange(n_rows * n_cols + 1))
+        for array in [lon, lat, order, starts]:
+            array.flags.writeable = False
+        self._grid = {"lon": lon, "lat": lat, "order": order, "starts": starts, "col_origin": col_origin,
+                      "row_origin": row_origin, "n_cols": n_cols, "n_rows": n_rows}
+
+    def _build_municipalities(self):
+        """Sort the units by municipality."""
+        ags = self.units["ENH_Gemeindeschluessel"].astype(str).values
+        order = np.argsort(ags, kind="stable")
+        keys, starts = np.unique(ags[order], return_index=True)
+        starts = np.append(starts, len(order))
+        for array in [order, keys, starts]:
+            array.flags.writeable = False
+        self._municipalities = {"order": order, "keys": keys, "starts": starts}
+
+    def __len__(self):
+        return len(self.units)
+
+    def query(self, lon_min, lat_min, lon_max, lat_max):
+        """
+        Get the units within a bounding box.
+
+        Parameters
+        ----------
+        lon_min, lat_min, lon_max, lat_max : float
+            bounding box in EPSG:4326
+
+        Returns
+        -------
+        pd.DataFrame
+            copy of the units in the bounding box
+        """
+        if self._grid is None:
+            return self.units.iloc[[]].copy()
+        grid = self._grid
+        col_min = max(int(np.floor(lon_min / self.cell_size)) - grid["col_origin"], 0)
+        col_max = min(int(np.floor(lon_max / self.cell_size)) - grid["col_origin"], grid["n_cols"] - 1)
+        row_min = max(int(np.floor(lat_min / self.cell_size)) - grid["row_origin"], 0)
+        row_max = min(int(np.floor(lat_max / self.cell_size)) - grid["row_origin"], grid["n_rows"] - 1)
+        if col_min > col_max or row_min > row_max:
+            return self.units.iloc[[]].copy()
+        # the cells of a row of the grid are contiguous in the sorted units
+        rows = [grid["order"][grid["starts"][row * grid["n_cols"] + col_min]:
+                              grid["starts"][row * grid["n_cols"] + col_max + 1]]
+                for row in range(row_min, row_max + 1)]
+        rows = np.sort(np.concatenate(rows))
+        lon = grid["lon"][rows]
+        lat = grid["lat"][rows]
+        rows = rows[(lon >= lon_min) & (lon <= lon_max) & (lat >= lat_min) & (lat <= lat_max)]
+        return self.units.iloc[rows].copy()
+
+    def query_extent(self, extent):
+        """Get the units within the bounding box of a gk.Extent, see query."""
+        return self.query(*extent.castTo(4326).pad(0.01).xyXY)
+
+    def get_municipality(self, ags):
+        """
+        Get the units of a municipality.
+
+        Parameters
+        ----------
+        ags : str
+            AGS of the municipality
+
+        Returns
+        -------
+        pd.DataFrame
+            copy of the units of the municipality
+        """
+        if self._municipalities is None:
+            return self.units.iloc[[]].copy()
+        municipalities = self._municipalities
+        i = np.searchsorted(municipalities["keys"], str(ags))
+        if i == len(municipalities["keys"]) or municipalities["keys"][i] != str(ags):
+            return self.units.iloc[[]].copy()
+        rows = municipalities["order"][municipalities["starts"][i]:municipalities["starts"][i + 1]]
+        return self.units.iloc[np.sort(rows)].copy()
+
+
+def get_registry(kind, state, source):
+    """
+    Get the registry of the existing units of a technology in a federal state. The registry is loaded once per
+    process and shared by all TREPs.
+
+    Parameters
+    ----------
+    kind : str
+        ["Wind", "OpenfieldPV", "RooftopPV"]
+    state : str
+        number of the federal state ("01" to "16")
+    source : trep.mastr.MastrSnapshot or str
+        MaStR snapshot for "Wind" and "OpenfieldPV", path to pv_groups.csv for "RooftopPV"
+
+    Returns
+    -------
+    AssetRegistry
+        the registry
+    """
+    source_path = source if isinstance(source, str) else source.path
+    key = (kind, state, os.path.abspath(source_path))
+    if key not in _registries:
+        if kind == "RooftopPV":
+            units = _load_pv_groups(source_path)
+            units = units[units.ENH_Gemeindeschluessel.str[:2] == state]
+        elif kind in KINDS:
+            unit_type, filters, columns = KINDS[kind]
+            units = source.get_units(state, unit_type, columns=columns, filters=filters)
+        else:
+            raise ValueError(f"Unknown kind of existing units {kind}")
+        print(f"Load {len(units)} existing {kind} units of state {utils.get_mastr_state(state)}", flush=True)
+        _registries[key] = AssetRegistry(units)
+    return _registries[key]
+
+
+def _load_pv_groups(path):
+    """Read the grouped rooftop pv units of the MaStR."""
+    return pd.read_csv(path, dtype={"ENH_Gemeindeschluessel": str}, index_col=0)
+
+
+def preload(states, mastr=None, pv_groups_path=None, kinds=("Wind", "OpenfieldPV", "RooftopPV")):
+    """
+    Load the registries of federal states, e.g. before worker processes are forked.
+
+    Parameters
+    ----------
+    states : list
+        numbers of the federal states
+    mastr : trep.mastr.MastrSnapshot, optional
+        MaStR snapshot for "Wind" and "OpenfieldPV", by default None
+    pv_groups_path : str, optional
+        path to pv_groups.csv for "RooftopPV", by default None
+    kinds : tuple, optional
+        technologies to load, by default all
+    """
+    for state in sorted(set(states)):
+        for kind in kinds:
+            source = pv_groups_path if kind == "RooftopPV" else mastr
+            if source is not None:
+                get_registry(kind, state, source)
+
+
+def clear():
+    """Drop all registries of the process, e.g. after the MaStR changed."""
+    _registries.clear()
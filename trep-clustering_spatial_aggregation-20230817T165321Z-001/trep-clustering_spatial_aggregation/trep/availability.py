@@ -0,0 +1,428 @@
+import numpy as np
+import scipy.ndimage
+import scipy.sparse
+import scipy.sparse.csgraph
+from osgeo import gdal, osr
+
+# number of set bits of every byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def aligned_window(region, ds):
+    """
+    Get the window of a region in a raster on the same grid.
+
+    Parameters
+    ----------
+    region : gk.RegionMask
+        Region of the window
+    ds : gdal.Dataset
+        Opened raster
+
+    Returns
+    -------
+    tuple or None
+        column and row offset of the region in the raster, None if the grids are not aligned or the region is
+        not completely within the raster
+    """
+    x_origin, pixel_width, x_rotation, y_origin, y_rotation, pixel_height = ds.GetGeoTransform()
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(ds.GetProjection())
+    if x_rotation != 0 or y_rotation != 0 or not srs.IsSame(region.srs) or \
+            not np.isclose(pixel_width, region.pixelWidth) or not np.isclose(-pixel_height, region.pixelHeight):
+        return None
+    extent = region.extent
+    x_offset = (extent.xMin - x_origin) / region.pixelWidth
+    y_offset = (y_origin - extent.yMax) / region.pixelHeight
+    if not (np.isclose(x_offset, round(x_offset)) and np.isclose(y_offset, round(y_offset))):
+        return None
+    x_offset, y_offset = int(round(x_offset)), int(round(y_offset))
+    height, width = region.mask.shape
+    if x_offset < 0 or y_offset < 0 or x_offset + width > ds.RasterXSize or y_offset + height > ds.RasterYSize:
+        return None
+    return x_offset, y_offset
+
+
+def read_region(region, path):
+    """
+    Read a raster on the grid of a region.
+
+    Of rasters on the same grid, e.g. the potential area of a state for one of its municipalities, only the
+    window of the region is read. Other rasters are warped to the region in memory.
+
+    Parameters
+    ----------
+    region : gk.RegionMask
+        Region to read
+    path : str
+        Path to the raster
+
+    Returns
+    -------
+    np.ndarray
+        Values of the raster on the grid of the region
+    """
+    ds = gdal.Open(path)
+    window = aligned_window(region, ds)
+    if window is None:
+        return region.warp(path)
+    height, width = region.mask.shape
+    return ds.GetRasterBand(1).ReadAsArray(window[0], window[1], width, height)
+
+
+# maximum number of pixels tested at once when footprints are stamped
+FOOTPRINT_CHUNK_PIXELS = 2 ** 22
+
+
+def stamp_footprints(region, availability, x, y, scale, direction=0, shape="ellipse", value=0):
+    """
+    Set the pixels within oriented ellipses or rectangles around points to a value, e.g. to exclude the area
+    around turbines. A pixel is within a footprint if its center is. The footprints are tested in chunks of
+    points with similar size on windows of pixels around the points, so no geometry is created.
+
+    Parameters
+    ----------
+    region : gk.RegionMask
+        Grid of the availability
+    availability : np.ndarray
+        Availability on the grid of the region, changed in place
+    x, y : np.ndarray
+        Centers of the footprints in the srs of the region
+    scale : np.ndarray
+        Half lengths of the footprints along and transverse to the direction, with shape (n, 2) or (2,)
+    direction : float or np.ndarray, optional
+        Direction of the main axis of the footprints in degrees counterclockwise from the x axis. As the axis has
+        no orientation, 0 is the west-east axis and 90 the south-north axis, which is the convention of the
+        wind_dir of trep.Wind (0: west, 90: south). By default 0
+    shape : str, optional
+        "ellipse" or "rectangle", by default "ellipse"
+    value : int, optional
+        Value of the pixels within the footprints, by default 0
+
+    Returns
+    -------
+    int
+        number of pixels within the footprints
+    """
+    assert shape in ["ellipse", "rectangle"], f"Unknown shape {shape}"
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    scale = np.broadcast_to(np.asarray(scale, dtype=float), (len(x), 2))
+    angle = np.radians(np.broadcast_to(np.asarray(direction, dtype=float), (len(x),)))
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(angle) & np.all(np.isfinite(scale), axis=1)
+    if not valid.any():
+        return 0
+    x, y, angle = x[valid], y[valid], angle[valid]
+    along, across = np.abs(scale[valid, 0]), np.abs(scale[valid, 1])
+    cos, sin = np.cos(angle), np.sin(angle)
+    # half size of the bounding box of each footprint
+    if shape == "ellipse":
+        half_x = np.hypot(along * cos, across * sin)
+        half_y = np.hypot(along * sin, across * cos)
+    else:
+        half_x = np.abs(along * cos) + np.abs(across * sin)
+        half_y = np.abs(along * sin) + np.abs(across * cos)
+    extent = region.extent
+    pixel_width, pixel_height = region.pixelWidth, region.pixelHeight
+    height, width = availability.shape
+    center_cols = np.floor((x - extent.xMin) / pixel_width).astype(np.int64)
+    center_rows = np.floor((extent.yMax - y) / pixel_height).astype(np.int64)
+    radius_cols = np.ceil(half_x / pixel_width).astype(np.int64) + 1
+    radius_rows = np.ceil(half_y / pixel_height).astype(np.int64) + 1
+    # footprints outside of the grid are skipped
+    inside = (center_cols + radius_cols >= 0) & (center_cols - radius_cols < width) & \
+        (center_rows + radius_rows >= 0) & (center_rows - radius_rows < height)
+    order = np.argsort((radius_cols * radius_rows)[inside], kind="stable")
+    order = np.flatnonzero(inside)[order]
+    n_pixels = 0
+    start = 0
+    while start < len(order):
+        # all footprints of a chunk are tested on the window of the largest radii of the chunk
+        stop = start + 1
+        max_cols, max_rows = radius_cols[order[start]], radius_rows[order[start]]
+        while stop < len(order):
+            _max_cols = max(max_cols, radius_cols[order[stop]])
+            _max_rows = max(max_rows, radius_rows[order[stop]])
+            if (stop - start + 1) * (2 * _max_cols + 1) * (2 * _max_rows + 1) > FOOTPRINT_CHUNK_PIXELS:
+                break
+            max_cols, max_rows = _max_cols, _max_rows
+            stop += 1
+        chunk = order[start:stop]
+        start = stop
+        d_cols = np.arange(-max_cols, max_cols + 1)
+        d_rows = np.arange(-max_rows, max_rows + 1)
+        cols = center_cols[chunk, None, None] + d_cols[None, None, :]
+        rows = center_rows[chunk, None, None] + d_rows[None, :, None]
+        dx = extent.xMin + (cols + 0.5) * pixel_width - x[chunk, None, None]
+        dy = extent.yMax - (rows + 0.5) * pixel_height - y[chunk, None, None]
+        u = dx * cos[chunk, None, None] + dy * sin[chunk, None, None]
+        v = -dx * sin[chunk, None, None] + dy * cos[chunk, None, None]
+        a = along[chunk, None, None]
+        b = across[chunk, None, None]
+        if shape == "ellipse":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                within = (u / a) ** 2 + (v / b) ** 2 <= 1
+        else:
+            within = (np.abs(u) <= a) & (np.abs(v) <= b)
+        rows, cols = np.broadcast_arrays(rows, cols)
+        within &= (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        availability[rows[within], cols[within]] = value
+        n_pixels += int(within.sum())
+    return n_pixels
+
+
+def _find_roots(parent, nodes):
+    """Roots of nodes of a union-find forest, the paths of the nodes are compressed in place."""
+    roots = parent[nodes]
+    while True:
+        up = parent[roots]
+        if np.array_equal(up, roots):
+            break
+        roots = up
+    parent[nodes] = roots
+    return roots
+
+
+def grow_areas(values, available, target_pixels, min_pixels=1, chunk_pixels=1, n_bins=1000):
+    """
+    Add the available pixels in descending order of their values until the connected areas of at least
+    min_pixels pixels hold target_pixels pixels, e.g. to keep the windiest areas of a region.
+
+    The available area is labelled once, so areas which are too small even with all available pixels are
+    skipped. The bin of the histogram of the values, in which the target can be met first, is taken from the
+    cumulative counts, and all pixels of higher bins are added at once. Then the pixels are added in chunks of
+    chunk_pixels in descending order. The connected areas are tracked by a union-find forest over the
+    available pixels, so only the areas touched by a chunk are merged and nothing is labelled again. Areas are
+    connected by the edges of the pixels like in scipy.ndimage.label.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Values of the pixels, e.g. the wind speed
+    available : np.ndarray
+        Boolean matrix of the available pixels with the shape of values
+    target_pixels : float
+        Number of pixels the areas of at least min_pixels pixels shall hold
+    min_pixels : int, optional
+        Minimal number of pixels of an area, by default 1
+    chunk_pixels : int, optional
+        Number of pixels added at once, which is the accuracy of the result, by default 1
+    n_bins : int, optional
+        Number of bins of the histogram of the values, by default 1000
+
+    Returns
+    -------
+    threshold : float
+        Smallest value of the added pixels, None if no pixel is added
+    pixels : np.ndarray
+        Flat indices of the added pixels
+    areas : np.ndarray
+        Area of each added pixel, numbered from 1
+    sizes : np.ndarray
+        Number of pixels of each area, sizes[0] is 0
+    """
+    height, width = available.shape
+    labels, _ = scipy.ndimage.label(available)
+    label_sizes = np.bincount(labels.ravel())
+    label_sizes[0] = 0
+    candidates = np.flatnonzero(label_sizes[labels.ravel()] >= max(min_pixels, 1))
+    del labels
+    n = candidates.size
+    if n == 0:
+        return None, candidates, np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    speed = values.ravel()[candidates]
+
+    # bins of the histogram from the highest to the lowest values
+    counts, edges = np.histogram(speed, bins=n_bins)
+    first_bin = min(int(np.searchsorted(np.cumsum(counts[::-1]), target_pixels)), n_bins - 1)
+    bins = n_bins - 1 - np.clip(np.searchsorted(edges, speed, side="right") - 1, 0, n_bins - 1)
+    order = np.argsort(bins.astype(np.int16 if n_bins < 2 ** 15 else np.int64), kind="stable")
+    bin_starts = np.searchsorted(bins[order], np.arange(n_bins + 1))
+    # the pixels of the bins above the first bin can not meet the target and are added at once
+    batches = [order[:bin_starts[first_bin]]]
+    for _bin in range(first_bin, n_bins):
+        members = order[bin_starts[_bin]:bin_starts[_bin + 1]]
+        members = members[np.argsort(-speed[members], kind="stable")]
+        batches.extend(np.array_split(members, max(int(np.ceil(members.size / max(chunk_pixels, 1))), 1)))
+
+    parent = np.arange(n)
+    sizes = np.zeros(n, dtype=np.int64)
+    added = np.zeros(n, dtype=bool)
+    kept_pixels = 0
+    threshold = None
+    for batch in batches:
+        if batch.size == 0:
+            continue
+        added[batch] = True
+        sizes[batch] = 1
+        if min_pixels <= 1:
+            kept_pixels += batch.size
+        threshold = speed[batch].min()
+        # edges between the batch and the added pixels
+        flat = candidates[batch]
+        sources, targets = [], []
+        for offset, valid in [(1, flat % width != width - 1), (-1, flat % width != 0),
+                              (width, flat < (height - 1) * width), (-width, flat >= width)]:
+            neighbours = flat[valid] + offset
+            position = np.minimum(np.searchsorted(candidates, neighbours), n - 1)
+            hit = (candidates[position] == neighbours) & added[position]
+            sources.append(batch[valid][hit])
+            targets.append(position[hit])
+        sources = _find_roots(parent, np.concatenate(sources))
+        targets = _find_roots(parent, np.concatenate(targets))
+        different = sources != targets
+        if different.any():
+            # merge the touched areas, the first root of a group becomes the root of the merged area
+            roots, inverse = np.unique(np.concatenate([sources[different], targets[different]]),
+                                       return_inverse=True)
+            n_edges = int(different.sum())
+            graph = scipy.sparse.coo_matrix(
+                (np.ones(n_edges, dtype=np.int8), (inverse[:n_edges], inverse[n_edges:])),
+                shape=(roots.size, roots.size))
+            _, groups = scipy.sparse.csgraph.connected_components(graph, directed=False)
+            group_order = np.argsort(groups, kind="stable")
+            group_roots = roots[group_order][np.r_[True, np.diff(groups[group_order]) != 0]]
+            group_sizes = np.bincount(groups, weights=sizes[roots]).astype(np.int64)
+            root_sizes = sizes[roots]
+            kept_pixels -= root_sizes[root_sizes >= min_pixels].sum()
+            kept_pixels += group_sizes[group_sizes >= min_pixels].sum()
+            parent[roots] = group_roots[groups]
+            sizes[group_roots] = group_sizes
+        if kept_pixels >= target_pixels:
+            break
+
+    positions = np.flatnonzero(added)
+    _, areas = np.unique(_find_roots(parent, positions), return_inverse=True)
+    areas = areas.ravel() + 1
+    return threshold, candidates[positions], areas, np.bincount(areas)
+
+
+class PackedAvailability(object):
+    """Binary availability of a region with 8 pixels per byte.
+
+    The rows of the availability are packed separately, so that the matrix can be read and written in blocks of
+    rows without unpacking it completely. Pixels are either available (100) or excluded (0), partial availability
+    is not kept.
+    """
+
+    def __init__(self, region, packed=None):
+        """
+        Parameters
+        ----------
+        region : gk.RegionMask
+            Region of the availability
+        packed : np.ndarray, optional
+            Row-wise packed availability, by default the full region is available
+        """
+        self.region = region
+        self.shape = region.mask.shape
+        if packed is None:
+            packed = np.packbits(region.mask, axis=1)
+        self.packed = packed
+
+    @classmethod
+    def from_availability(cls, region, availability):
+        """Pack the availability matrix of an ExclusionCalculator."""
+        return cls(region, np.packbits(availability > 0, axis=1))
+
+    @classmethod
+    def from_raster(cls, region, path, block_size=1024):
+        """
+        Read the availability from a raster with values of 100 for available pixels, e.g. saved by
+        ExclusionCalculator.save. The window of the region in rasters on the same grid is read in blocks of rows,
+        others are warped to the region first.
+
+        Parameters
+        ----------
+        region : gk.RegionMask
+            Region of the availability
+        path : str
+            Path to the raster
+        block_size : int, optional
+            Number of rows read at once, by default 1024
+        """
+        ds = gdal.Open(path)
+        window = aligned_window(region, ds)
+        if window is not None:
+            height, width = region.mask.shape
+            band = ds.GetRasterBand(1)
+            packed = np.zeros((height, (width + 7) // 8), dtype=np.uint8)
+            for row in range(0, height, block_size):
+                rows = min(block_size, height - row)
+                block = band.ReadAsArray(window[0], window[1] + row, width, rows)
+                packed[row:row + rows] = np.packbits((block == 100) & region.mask[row:row + rows], axis=1)
+            return cls(region, packed)
+        matrix = region.warp(path)
+        return cls(region, np.packbits((matrix == 100) & region.mask, axis=1))
+
+    def _unpack_rows(self, start, stop):
+        return np.unpackbits(self.packed[start:stop], axis=1, count=self.shape[1]).view(bool)
+
+    def to_availability(self, dtype=np.uint8):
+        """Return the availability as dense matrix with values of 0 and 100."""
+        availability = np.zeros(self.shape, dtype=dtype)
+        availability[self._unpack_rows(0, self.shape[0])] = 100
+        return availability
+
+    def exclude(self, mask):
+        """
+        Exclude pixels.
+
+        Parameters
+        ----------
+        mask : np.ndarray
+            Boolean matrix of the pixels to exclude
+        """
+        self.packed &= ~np.packbits(mask, axis=1)
+
+    def include(self, mask):
+        """
+        Include pixels inside the region.
+
+        Parameters
+        ----------
+        mask : np.ndarray
+            Boolean matrix of the pixels to include
+        """
+        self.packed |= np.packbits(mask & self.region.mask, axis=1)
+
+    @property
+    def pixelsAvailable(self):
+        """Number of available pixels."""
+        return int(_POPCOUNT[self.packed].sum(dtype=np.int64))
+
+    @property
+    def areaAvailable(self):
+        """Available area in the unit of the region's srs."""
+        return self.pixelsAvailable * self.region.pixelWidth * self.region.pixelHeight
+
+    @property
+    def percentAvailable(self):
+        """Available area in percent of the region."""
+        return 100 * self.pixelsAvailable / self.region.mask.sum()
+
+    def save(self, output, block_size=1024):
+        """
+        Save the availability as GeoTiff with values of 0 and 100 and 255 outside the region.
+
+        Parameters
+        ----------
+        output : str
+            Path to the raster
+        block_size : int, optional
+            Number of rows written at once, by default 1024
+        """
+        extent = self.region.extent
+        ds = gdal.GetDriverByName("GTiff").Create(output, self.shape[1], self.shape[0], 1, gdal.GDT_Byte,
+                                                  options=["COMPRESS=DEFLATE", "TILED=YES", "BIGTIFF=IF_SAFER"])
+        ds.SetGeoTransform((extent.xMin, self.region.pixelWidth, 0, extent.yMax, 0, -self.region.pixelHeight))
+        ds.SetProjection(self.region.srs.ExportToWkt())
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(255)
+        for row in range(0, self.shape[0], block_size):
+            rows = min(block_size, self.shape[0] - row)
+            block = np.where(self.region.mask[row:row + rows],
+                             self._unpack_rows(row, row + rows) * np.uint8(100), 255).astype(np.uint8)
+            band.WriteArray(block, 0, row)
+        band.FlushCache()
+        ds = None
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import trep
+from trep import utils
+from trep.region_catalog import RegionCatalog
+from trep.mastr import MastrSnapshot
+from trep import asset_registry
+
+TECHS = ["Wind", "OpenfieldPV", "OpenfieldPVRoads", "RooftopPV"]
+
+
+def _run_region(rs, level, techs, estimate_kwargs, trep_kwargs, memory_limit, connection):
+    """Estimate the potential of one region in a worker process and send None or the error to the parent."""
+    try:
+        if memory_limit is not None:
+            import resource
+            limit = int(memory_limit * 1e9)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        glr = trep.TREP(rs, level=level, **trep_kwargs)
+        for tech in techs:
+            glr.techs[tech].estimate_potential(**estimate_kwargs.get(tech, {}))
+        glr.all_to_db()
+        connection.send(None)
+    except BaseException:
+        connection.send(traceback.format_exc())
+    finally:
+        connection.close()
+
+
+def _receive(worker):
+    """Read the result of a worker, which is None or its error. The receiver is closed once it is read."""
+    receiver = worker["receiver"]
+    if receiver.poll():
+        try:
+            worker["error"] = receiver.recv()
+            worker["sent"] = True
+        except EOFError:
+            # the worker exited without sending a result
+            pass
+        receiver.close()
+
+
+def _save_manifest(manifest, path):
+    """Write the manifest. The file is replaced atomically, so it is complete when the batch is interrupted."""
+    if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_regions(level, datasource_path=None, intermediate_path=None):
+    """
+    Get the RS of all regions of a level from the region catalog.
+
+    Parameters
+    ----------
+    level : str
+        ["MUN", "nuts3", "state"]
+    datasource_path : str, optional
+        path to external data source, use internal data source if not given, by default None
+    intermediate_path : str, optional
+        path to intermediate files holding the region catalog, by default None
+
+    Returns
+    -------
+    list
+        RS of the regions
+    """
+    if datasource_path is None:
+        datasource_path = utils.get_datasources_path()
+    if intermediate_path is None:
+        intermediate_path = os.path.join(utils.get_datasources_path(), "intermediates")
+    catalog = RegionCatalog.open(os.path.join(datasource_path, "germany_administrative", "vg250_ebenen"),
+                                 os.path.join(intermediate_path, "region_catalog.sqlite"))
+    regions = list(catalog.get_areas(level).index)
+    catalog.close()
+    return regions
+
+
+def run_batch(regions=None, level="nuts3", manifest_path=None, n_jobs=1, memory_limit=None, timeout=None,
+              techs=TECHS, estimate_kwargs=None, retry_failed=False, preload_assets=False, **trep_kwargs):
+    """
+    Estimate the potential of many regions, each in its own process.
+
+    Every region is run in a new worker process, so a crash or memory error of one region does not affect the
+    others. The status, timings and errors of all regions are written to a json manifest after every change.
+    When the batch is started again with the same manifest, finished regions are skipped.
+
+    Parameters
+    ----------
+    regions : list, optional
+        RS of the regions. All regions of the level if None, by default None
+    level : str, optional
+        ["MUN", "nuts3", "state"], by default "nuts3"
+    manifest_path : str, optional
+        path to the json manifest, by default batch_{level}.json in the case path of the database
+    n_jobs : int, optional
+        number of regions run at the same time, by default 1
+    memory_limit : float, optional
+        address space limit of each worker in GB, by default None
+    timeout : float, optional
+        time limit of each region in seconds, by default None
+    techs : list, optional
+        technologies to estimate, by default all
+    estimate_kwargs : dict, optional
+        keyword arguments of estimate_potential for each technology, by default None
+    retry_failed : bool, optional
+        whether to run failed regions again, by default False
+    preload_assets : bool, optional
+        whether to load the existing units of the states of the regions before the workers are forked, so the
+        workers share them instead of reading the MaStR each, by default False
+    trep_kwargs
+        keyword arguments of TREP, e.g. case, db_path or datasource_path
+
+    Returns
+    -------
+    dict
+        the manifest
+    """
+    if estimate_kwargs is None:
+        estimate_kwargs = {}
+    if regions is None:
+        regions = get_regions(level, datasource_path=trep_kwargs.get("datasource_path"),
+                              intermediate_path=trep_kwargs.get("intermediate_path"))
+    if manifest_path is None:
+        db_path = trep_kwargs.get("db_path")
+        if db_path is None:
+            db_path = os.path.join(utils.get_data_path(), "database")
+        manifest_path = os.path.join(db_path, trep_kwargs.get("case", "base"), f"batch_{level}.json")
+    manifest = {"level": level, "regions": {}}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    pending = []
+    for rs in regions:
+        entry = manifest["regions"].setdefault(rs, {"status": "pending", "attempts": 0})
+        if entry["status"] == "done" or (entry["status"] == "failed" and not retry_failed):
+            continue
+        # regions "running" when the last batch was interrupted are run again
+        entry["status"] = "pending"
+        pending.append(rs)
+    _save_manifest(manifest, manifest_path)
+    if preload_assets and len(pending) > 0:
+        datasource_path = trep_kwargs.get("datasource_path")
+        if datasource_path is None:
+            datasource_path = utils.get_datasources_path()
+        intermediate_path = trep_kwargs.get("intermediate_path")
+        if intermediate_path is None:
+            intermediate_path = os.path.join(utils.get_datasources_path(), "intermediates")
+        asset_registry.preload(
+            [rs[:2] for rs in pending],
+            mastr=MastrSnapshot.open(os.path.join(datasource_path, "mastr", "mastr.db"),
+                                     os.path.join(intermediate_path, "mastr")),
+            pv_groups_path=os.path.join(datasource_path, "mastr", "pv_groups.csv"))
+    print(f"Run {len(pending)} of {len(regions)} regions with {n_jobs} processes", flush=True)
+    # workers are forked to share the registries of existing units copy-on-write
+    context = mp.get_context("fork")
+
+    running = {}
+    while pending or running:
+        while pending and len(running) < n_jobs:
+            rs = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run_region,
+                                      args=(rs, level, techs, estimate_kwargs, trep_kwargs, memory_limit, sender))
+            process.start()
+            sender.close()
+            running[rs] = {"process": process, "receiver": receiver, "start": time.time(), "sent": False,
+                           "error": None}
+            entry = manifest["regions"][rs]
+            entry.update(status="running", start=time.strftime("%Y-%m-%d %H:%M:%S"), error=None)
+            entry["attempts"] += 1
+            _save_manifest(manifest, manifest_path)
+        # the receivers are read while waiting, so a worker sending a long traceback does not block on the pipe
+        ready = wait([worker["process"].sentinel for worker in running.values()] +
+                     [worker["receiver"] for worker in running.values() if not worker["receiver"].closed],
+                     timeout=1)
+        for rs, worker in list(running.items()):
+            process, receiver = worker["process"], worker["receiver"]
+            if not receiver.closed and (receiver in ready or process.sentinel in ready):
+                _receive(worker)
+            entry = manifest["regions"][rs]
+            if process.sentinel not in ready:
+                if timeout is not None and time.time() - worker["start"] > timeout:
+                    process.kill()
+                    process.join()
+                    entry.update(status="failed", error=f"timeout after {timeout} seconds")
+                else:
+                    continue
+            else:
+                process.join()
+                error = worker["error"]
+                if error is None and (process.exitcode != 0 or not worker["sent"]):
+                    # killed, e.g. by the out of memory killer
+                    error = f"worker exited with code {process.exitcode}"
+                entry.update(status="failed" if error is not None else "done", error=error)
+            entry["seconds"] = time.time() - worker["start"]
+            if not receiver.closed:
+                receiver.close()
+            del running[rs]
+            _save_manifest(manifest, manifest_path)
+            print(f"{rs}: {entry['status']} after {entry['seconds'] / 60} minutes", flush=True)
+    return manifest
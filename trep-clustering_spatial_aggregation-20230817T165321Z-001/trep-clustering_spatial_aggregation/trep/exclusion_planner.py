@@ -0,0 +1,198 @@
+import os
+import json
+import uuid
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the statistics are then written without lock
+    fcntl = None
+import numpy as np
+import geokit as gk
+from osgeo import ogr
+
+
+class ExclusionPlanner(object):
+    """Order and prune the exclusion layers of Technology._run_exclusion.
+
+    The planner keeps the cost (seconds per km² of region) and the selectivity (share of the remaining
+    available area excluded) of every layer from earlier runs in a json file. Layers are ordered by cost per
+    selectivity, so cheap layers excluding a lot of area run first. Layers without statistics run first in
+    their original order, layers which are not reported in the sankey diagram (e.g. border) are not moved.
+    The runs recorded by a planner are merged into the file under a lock, so concurrent processes keep the
+    runs of each other.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the json file of the layer statistics
+        """
+        self.path = path
+        self.stats = self._load()
+        # cost and selectivity of the runs recorded since the last save, by layer
+        self._runs = {}
+
+    def _load(self):
+        """Read the statistics, empty if the file does not exist."""
+        if not os.path.isfile(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def layer_id(layer):
+        """Return the name of a layer in the statistics."""
+        if layer["parts"][0]["regional"]:
+            return f"auxiliary:{layer['key']}"
+        return f"{layer['key']}:{layer['parts'][0]['feature_dict']['source']}"
+
+    def rank(self, layer):
+        """Return the expected cost per excluded share of a layer. Layers without statistics have rank -1."""
+        stats = self.stats.get(self.layer_id(layer))
+        if stats is None:
+            return -1
+        return stats["cost"] / max(stats["selectivity"], 1e-6)
+
+    def order(self, layers):
+        """
+        Order the layers by their rank.
+
+        Parameters
+        ----------
+        layers : list
+            Layers as returned by Technology._get_exclusion_layers
+
+        Returns
+        -------
+        list
+            The ordered layers
+        """
+        fixed = [layer for layer in layers if layer["category"] is None]
+        ordered = sorted([layer for layer in layers if layer["category"] is not None], key=self.rank)
+        return fixed + ordered
+
+    def record(self, layer, seconds, selectivity, area):
+        """
+        Update the statistics of a layer with the running mean of cost and selectivity.
+
+        Parameters
+        ----------
+        layer : dict
+            The excluded layer
+        seconds : float
+            Time needed to exclude the layer
+        selectivity : float
+            Excluded share of the area available before the layer
+        area : float
+            Area of the region in km²
+        """
+        run = (seconds / max(area, 1e-6), selectivity)
+        self._runs.setdefault(self.layer_id(layer), []).append(run)
+        self._update(self.stats, self.layer_id(layer), *run)
+
+    @staticmethod
+    def _update(stats, layer_id, cost, selectivity):
+        """Add one run to the running mean of cost and selectivity of a layer."""
+        stats = stats.setdefault(layer_id, {"cost": 0.0, "selectivity": 0.0, "runs": 0})
+        runs = stats["runs"]
+        stats["cost"] = (stats["cost"] * runs + cost) / (runs + 1)
+        stats["selectivity"] = (stats["selectivity"] * runs + selectivity) / (runs + 1)
+        stats["runs"] = runs + 1
+
+    def save(self):
+        """
+        Merge the recorded runs into the statistics of the file. The file is read, merged and replaced atomically
+        while holding an exclusive lock, so runs saved by other processes in the meantime are kept.
+        """
+        if len(self._runs) == 0:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                stats = self._load()
+                for layer_id, runs in self._runs.items():
+                    for run in runs:
+                        self._update(stats, layer_id, *run)
+                tmp_path = f"{self.path}.{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(stats, f, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self.stats = stats
+        self._runs = {}
+
+    @staticmethod
+    def skip_reason(layer, ec):
+        """
+        Check whether a layer can change the availability.
+
+        A layer is skipped if no area is available anymore or if none of its vector sources has a feature matching
+        its where clause within the bounding box of the available pixels, padded by the buffer. The extent in the
+        header of a source is tested first. Then the source is probed for its first feature with a spatial and
+        attribute filter, which uses the spatial index of the source if it has one.
+
+        Parameters
+        ----------
+        layer : dict
+            Layer as returned by Technology._get_exclusion_layers
+        ec : gl.ExclusionCalculator
+            ExclusionCalculator holding the current availability
+
+        Returns
+        -------
+        str or None
+            The reason to skip the layer or None if it has to be excluded
+        """
+        available = ec._availability > 0
+        rows = np.nonzero(available.any(axis=1))[0]
+        if rows.size == 0:
+            return "no available area"
+        cols = np.nonzero(available.any(axis=0))[0]
+        region_extent = ec.region.extent
+        xMin = region_extent.xMin + cols[0] * ec.region.pixelWidth
+        xMax = region_extent.xMin + (cols[-1] + 1) * ec.region.pixelWidth
+        yMax = region_extent.yMax - rows[0] * ec.region.pixelHeight
+        yMin = region_extent.yMax - (rows[-1] + 1) * ec.region.pixelHeight
+        for part in layer["parts"]:
+            feature_dict = part["feature_dict"]
+            if part["regional"]:
+                if feature_dict["type"] != "vector":
+                    return None
+                path = feature_dict["source_path"]
+            else:
+                path = feature_dict["path"]
+                if not path.lower().endswith((".shp", ".gpkg", ".geojson", ".sqlite")):
+                    return None
+            ds = ogr.Open(path)
+            if ds is None:
+                return None
+            vector_layer = ds.GetLayer()
+            buffer = feature_dict.get("buffer") or 0
+            extent = gk.Extent(xMin - buffer, yMin - buffer, xMax + buffer, yMax + buffer, srs=ec.region.srs)
+            if vector_layer.GetSpatialRef() is not None:
+                extent = extent.castTo(vector_layer.GetSpatialRef())
+            # the extent in the header of the source is tested before any feature is read
+            try:
+                header_extent = vector_layer.GetExtent(force=False)
+            except RuntimeError:
+                header_extent = None
+            # OGR returns an empty extent if the header has none
+            if header_extent not in (None, (0, 0, 0, 0)):
+                x_min, x_max, y_min, y_max = header_extent
+                if x_max < extent.xMin or x_min > extent.xMax or y_max < extent.yMin or y_min > extent.yMax:
+                    continue
+            vector_layer.SetSpatialFilterRect(extent.xMin, extent.yMin, extent.xMax, extent.yMax)
+            if feature_dict.get("where_text"):
+                # the layer is excluded if the where clause cannot be evaluated by OGR
+                if vector_layer.SetAttributeFilter(feature_dict["where_text"]) != 0:
+                    return None
+            # the first matching feature is enough, the features are not counted
+            vector_layer.ResetReading()
+            if vector_layer.GetNextFeature() is not None:
+                return None
+        return "no features within the available area"
@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+from contextlib import contextmanager
+
+
+class IntermediateCache(object):
+    """Content-addressed cache of intermediate exclusion rasters.
+
+    Every intermediate is named by a hash of all inputs which determine its content, i.e. the exclusion
+    parameters, the version of the source files and the grid of the region. New files are written to a
+    temporary file and moved into place atomically, so that several processes can share one directory.
+    Optionally the directory is kept below a size budget by removing the least recently used files.
+    """
+
+    # files managed by the cache: {name}_{digest}.tif
+    _pattern = re.compile(r".+_[0-9a-f]{20}\.tif$")
+
+    def __init__(self, path, max_size=None):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory of the intermediate files
+        max_size : float, optional
+            Size budget of the cache in GB. No eviction if None, by default None
+        """
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def _source_version(path):
+        """Return modification time and size of a source file and the sidecar files holding its attributes."""
+        version = []
+        for _path in [path, os.path.splitext(path)[0] + ".dbf"]:
+            if os.path.isfile(_path):
+                stat = os.stat(_path)
+                version.append([os.path.abspath(_path), stat.st_mtime_ns, stat.st_size])
+        return version
+
+    def get_path(self, name, feature_dict, regionMask):
+        """
+        Get the path of the intermediate file of an exclusion.
+
+        Parameters
+        ----------
+        name : str
+            Readable prefix of the file name, e.g. the exclusion key
+        feature_dict : dict
+            Dictionary containing the information for the exclusion
+        regionMask : gk.RegionMask
+            Region the exclusion is calculated for
+
+        Returns
+        -------
+        str
+            Path of the intermediate file
+        """
+        source = feature_dict.get("path", feature_dict.get("source_path"))
+        inputs = {
+            "name": name,
+            "source": [self._source_version(source)] if isinstance(source, str)
+            else [self._source_version(s) for s in source],
+            "where_text": feature_dict.get("where_text"),
+            "buffer": feature_dict.get("buffer"),
+            "value": feature_dict.get("value"),
+            "pixelRes": [regionMask.pixelWidth, regionMask.pixelHeight],
+            "srs": regionMask.srs.ExportToWkt(),
+            "extent": regionMask.extent.xyXY,
+        }
+        digest = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{name}_{digest[:20]}.tif")
+
+    @contextmanager
+    def writing(self, path):
+        """
+        Context to calculate an intermediate file.
+
+        Yields the path itself if the file exists and marks it as recently used. Otherwise, a temporary path is
+        yielded, which is moved to the final path when the context is left without error.
+
+        Parameters
+        ----------
+        path : str
+            Path of the intermediate file as returned by get_path. Nothing is cached if None.
+        """
+        if path is None:
+            yield None
+            return
+        if os.path.isfile(path):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                pass
+            yield path
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{os.path.splitext(path)[0]}.{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp.tif"
+        try:
+            yield tmp_path
+            if os.path.isfile(tmp_path):
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used intermediate files until the cache fits into its size budget."""
+        if self.max_size is None or not os.path.isdir(self.path):
+            return
+        files = []
+        for file in os.listdir(self.path):
+            if not self._pattern.match(file):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, file))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(self.path, file)))
+        total_size = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size * 1e9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            total_size -= size
@@ -0,0 +1,191 @@
+import os
+import json
+import uuid
+import shutil
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the snapshot is then compiled without lock
+    fcntl = None
+import sqlite3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from trep import utils
+
+# number of units in a row group, the smallest part of a partition read for a bounding box
+ROW_GROUP_SIZE = 10000
+
+
+class MastrSnapshot(object):
+    """Columnar snapshot of the processed table of the Marktstammdatenregister (MaStR).
+
+    The table is compiled once from mastr.db to parquet files partitioned by ENH_Bundesland and
+    ENH_EinheitenTyp. The units of each partition are sorted by latitude, so the minimum and maximum coordinates
+    of the row groups index the units and a bounding box query reads only the row groups it intersects. Only the
+    requested columns are read. The snapshot is compiled again when mastr.db changes.
+
+    Every compilation is written to its own version directory and the pointer file CURRENT names the version in
+    use. A new version is published by replacing the pointer, so processes reading an older version are not
+    disturbed.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Version directory of the snapshot
+        """
+        self.path = path
+        with open(os.path.join(path, "_meta.json"), "r") as f:
+            meta = json.load(f)
+        self.source = meta["source"]
+        self.partitions = meta["partitions"]
+
+    @classmethod
+    def open(cls, db_path, path):
+        """
+        Open the snapshot and compile it if it is missing or mastr.db changed. The snapshot is compiled while
+        holding a lock, so processes opening it at the same time compile it only once.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to mastr.db
+        path : str
+            Directory of the snapshot
+        """
+        source = cls._source_version(db_path)
+        snapshot = cls._current(path)
+        if snapshot is not None and snapshot.source == source:
+            return snapshot
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # another process may have compiled the snapshot while this one waited for the lock
+                snapshot = cls._current(path)
+                if snapshot is None or snapshot.source != source:
+                    cls.build(db_path, path)
+                    snapshot = cls._current(path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return snapshot
+
+    @classmethod
+    def _current(cls, path):
+        """Return the version of the snapshot named by the pointer file, None if there is none."""
+        pointer = os.path.join(path, "CURRENT")
+        if not os.path.isfile(pointer):
+            return None
+        with open(pointer, "r") as f:
+            version = f.read().strip()
+        return cls(os.path.join(path, version))
+
+    @staticmethod
+    def _source_version(db_path):
+        """Return modification time and size of mastr.db."""
+        stat = os.stat(db_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @staticmethod
+    def _partition_path(state, unit_type):
+        """Return the path of the file of a partition relative to the snapshot."""
+        return os.path.join(f"ENH_Bundesland={state}", f"ENH_EinheitenTyp={unit_type}", "part-0.parquet")
+
+    @classmethod
+    def build(cls, db_path, path):
+        """
+        Compile the processed table of mastr.db to a new version of the snapshot. The partitions are read one
+        after another, so only one partition is held in memory. The version is written to a temporary directory,
+        renamed and then published by atomically replacing the pointer file, so an interrupted build is never
+        opened. The previous version is kept for processes still reading it, older versions are removed.
+        Use open, which compiles the snapshot under a lock.
+
+        Parameters
+        ----------
+        db_path : str
+            Path to mastr.db
+        path : str
+            Directory of the snapshot
+        """
+        print("Compile MaStR snapshot", flush=True)
+        path = os.path.abspath(path)
+        source = cls._source_version(db_path)
+        version = f"v{source[0]}_{source[1]}_{uuid.uuid4().hex[:8]}"
+        tmp_path = os.path.join(path, f".{version}.tmp")
+        previous = cls._current(path)
+        connection = sqlite3.connect(db_path)
+        try:
+            groups = connection.execute(
+                "SELECT DISTINCT ENH_Bundesland, ENH_EinheitenTyp FROM processed "
+                "WHERE ENH_Bundesland IS NOT NULL AND ENH_EinheitenTyp IS NOT NULL").fetchall()
+            partitions = []
+            for state, unit_type in groups:
+                units = pd.read_sql(
+                    "SELECT * FROM processed WHERE ENH_Bundesland = ? AND ENH_EinheitenTyp = ? "
+                    "ORDER BY ENH_Breitengrad, ENH_Laengengrad", connection, params=(state, unit_type))
+                # SQLite columns may hold values of different types, they are stored as text
+                for column in units.columns[units.dtypes == object]:
+                    units[column] = units[column].where(units[column].isna(), units[column].astype(str))
+                partition = cls._partition_path(state, unit_type)
+                os.makedirs(os.path.dirname(os.path.join(tmp_path, partition)), exist_ok=True)
+                pq.write_table(pa.Table.from_pandas(units, preserve_index=False), os.path.join(tmp_path, partition),
+                               row_group_size=ROW_GROUP_SIZE)
+                partitions.append([state, unit_type])
+            with open(os.path.join(tmp_path, "_meta.json"), "w") as f:
+                json.dump({"source": source, "partitions": partitions}, f)
+            os.replace(tmp_path, os.path.join(path, version))
+            pointer_tmp = os.path.join(path, f".CURRENT.{version}.tmp")
+            with open(pointer_tmp, "w") as f:
+                f.write(version)
+            os.replace(pointer_tmp, os.path.join(path, "CURRENT"))
+        finally:
+            connection.close()
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        keep = {version} if previous is None else {version, os.path.basename(previous.path)}
+        for name in os.listdir(path):
+            if name.startswith("v") and name not in keep and os.path.isdir(os.path.join(path, name)):
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    def get_units(self, state, unit_type, columns=None, filters=None, extent=None):
+        """
+        Get the units of a type in a federal state.
+
+        Parameters
+        ----------
+        state : str
+            number of the federal state ("01" to "16") or ENH_Bundesland
+        unit_type : str
+            ENH_EinheitenTyp, e.g. "Windeinheit" or "Solareinheit"
+        columns : list, optional
+            columns to read, all columns if None, by default None
+        filters : list, optional
+            further conditions as tuples of column, operator and value, e.g.
+            [("ENH_Betriebsstatus", "=", "In Betrieb")], by default None
+        extent : gk.Extent, optional
+            only units within the bounding box of the extent are read, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            the units
+
+        Raises
+        ------
+        ValueError
+            if the federal state is unknown
+        """
+        state = utils.get_mastr_state(state)
+        filters = [] if filters is None else list(filters)
+        if extent is not None:
+            lon_min, lat_min, lon_max, lat_max = extent.castTo(4326).pad(0.01).xyXY
+            filters += [("ENH_Breitengrad", ">=", lat_min), ("ENH_Breitengrad", "<=", lat_max),
+                        ("ENH_Laengengrad", ">=", lon_min), ("ENH_Laengengrad", "<=", lon_max)]
+        if [state, unit_type] not in self.partitions:
+            return pd.DataFrame(columns=columns)
+        return pq.read_table(os.path.join(self.path, self._partition_path(state, unit_type)), columns=columns,
+                             filters=filters if len(filters) > 0 else None).to_pandas()
@@ -6,10 +6,9 @@ import geokit as gk
 import os
 import numpy as np
 from trep.utils import rename_columns
-import osgeo
+from trep.region_labels import point_coordinates
 from warnings import warn
 from abc import ABC
-from sqlalchemy import create_engine
 
 
 class BaseOpenfieldPV(ABC):
@@ -92,11 +91,12 @@ class BaseOpenfieldPV(ABC):
             # distance from PV-loc: sqrt(14m^2/kWp * pv_cap) -->
             # distance equally in both directions
             # (14m2 from Frauenhofer recent facts)
-            self.parent.OpenfieldPV.existing_items["scale"] = self.parent.OpenfieldPV.existing_items.apply(
-                lambda x: np.array([np.sqrt(x["capacity"] * 14) / 2, np.sqrt(x["capacity"] * 14) / 2]), axis=1)
+            half_width = np.sqrt(
+                self.parent.OpenfieldPV.existing_items["capacity"].values.astype(float) * 14) / 2
             self.parent.OpenfieldPV.existing_items["direction"] = 0
-            self.ec.excludePoints(self.parent.OpenfieldPV.existing_items,
-                                 geometry_shape="rectangle", save_to_ec="existing Openfield")
+            self.exclude_footprints(self.parent.OpenfieldPV.existing_items,
+                                    np.column_stack([half_width, half_width]),
+                                    geometry_shape="rectangle")
 
 
 class OpenfieldPV(BaseOpenfieldPV, Technology):
@@ -156,31 +156,10 @@ class OpenfieldPV(BaseOpenfieldPV, Technology):
                             "OpenEE-FreiflaechenPV_EPSG25832_Shape",
                             "Freiflaechen_PV.shp"),
                         where="{}".format(existing_str))
-                exItem = []
-                for row in _exItem.iterrows():
-                    exItem.append(
-                        [row[1]["geom"].GetX(), row[1]["geom"].GetY()]
-                    )
-                exItem = np.array(exItem)
-                exItem = \
-                    gk.srs.xyTransform(exItem, fromSRS=25832,
-                                       toSRS=self.parent.regionMask.srs)
-                _exItem["location"] = _exItem.apply(
-                    lambda x: np.array(
-                        gk.srs.xyTransform(
-                            np.array(
-                                [[x["geom"].GetX(),
-                                  x["geom"].GetY()]]),
-                            fromSRS=25832, toSRS=self.parent.regionMask.srs)),
-                    axis=1)
-                _exItem["location"] = _exItem.apply(lambda x: np.array(
-                    [x["location"][0][0], x["location"][0][1]]), axis=1)
-                _coor = gk.srs.xyTransform(
-                    exItem, fromSRS=self.parent.regionMask.srs, toSRS=4326)
+                x, y = point_coordinates(_exItem["geom"])
                 self.existing_items["capacity"] = _exItem["leistung"]
-                self.existing_items["lat"] = [i[1] for i in _coor]
-                self.existing_items["lon"] = [i[0] for i in _coor]
-                self.existing_items["location"] = _exItem["location"]
+                self.existing_items = self._set_item_locations(
+                    self.existing_items, x, y, srs=25832)
                 self.existing_items["geom"] = _exItem["geom"]
             else:
                 if not mastr:
@@ -188,63 +167,21 @@ class OpenfieldPV(BaseOpenfieldPV, Technology):
                         "For federal state {} ".format(self.parent.state) +
                         "only existing plants from mastr are available ",
                         UserWarning)
-                # Get data from mastr
-                _regions = []
-                # First get all items in federal state.
-                # TODO: Map all states, maybe in utils
-                if self.parent._state == "01":
-                    existing_str = "ENH_Bundesland='Schleswig-Holstein'"
-                elif self.parent._state == "03":
-                    existing_str = "ENH_Bundesland='Niedersachsen'"
-                elif self.parent._state == "05":
-                    existing_str = "ENH_Bundesland='Nordrhein-Westfalen'"
-                elif self.parent._state == "07":
-                    existing_str = "ENH_Bundesland='Rheinland-Pfalz'"
-                elif self.parent._state == "16":
-                    existing_str = "ENH_Bundesland='Thüringen'"
-                else:
-                    raise ValueError("State not implemented yet")
-                # Get openfield PVs from db
-                query = "SELECT ENH_MastrID, ENH_Nettonennleistung, " + \
-                    "ENH_Plz, ENH_InbetriebnahmeDatum, ENH_Breitengrad, " + \
-                    "ENH_Laengengrad FROM processed WHERE " + \
-                    "ENH_EinheitenTyp='Solareinheit' and " + \
-                    "ENH_Lage='Freifläche' and " +\
-                    "ENH_Betriebsstatus='In Betrieb'" + \
-                    " and ({})".format(existing_str)
-                engine = create_engine(
-                    "sqlite:///" + os.path.join(
-                        self.parent.datasource_path,
-                        "mastr", "mastr.db") + "/?charset=utf8mb4")
-                raw_pvs = pd.read_sql(sql=query, con=engine)
+                # Get openfield PVs in the bounding box of the region from the
+                # registry of existing units
+                raw_pvs = self.parent.get_existing_assets("OpenfieldPV")
                 # Geometry processing.
                 if len(raw_pvs) > 0:
-                    raw_pvs["point"] = raw_pvs.apply(lambda x: gk.geom.point(
-                        [x["ENH_Laengengrad"], x["ENH_Breitengrad"]]), axis=1)
-                    _rm_lat_lon = gk.geom.transform(
-                        self.parent.regionMask.geometry, toSRS=4326)
-                    raw_pvs["Within"] = raw_pvs.apply(
-                        lambda x: osgeo.ogr.Geometry.Within(
-                            x["point"],
-                            _rm_lat_lon),
-                        axis=1)
-                    self.existing_items = raw_pvs[raw_pvs["Within"]]
+                    self.existing_items = raw_pvs[self.parent.contains(
+                        raw_pvs["ENH_Laengengrad"], raw_pvs["ENH_Breitengrad"], srs=4326)]
                     if len(self.existing_items) > 0:
-                        self.existing_items["location"] = \
-                            self.existing_items.apply(
-                            lambda x: np.array(gk.srs.xyTransform(np.array(
-                                [[x["ENH_Laengengrad"],
-                                x["ENH_Breitengrad"]]]),
-                                fromSRS=4326,
-                                toSRS=self.parent.regionMask.srs)),
-                            axis=1)
-                        self.existing_items["geom"] = self.existing_items.apply(lambda x: gk.geom.point(
-                            [x["ENH_Laengengrad"], x["ENH_Breitengrad"]]), axis=1)
-                        self.existing_items["location"] = \
-                            self.existing_items.apply(lambda x: np.array(
-                                [x["location"][0][0], x["location"][0][1]]),
-                            axis=1)
                         self.existing_items = rename_columns(self.existing_items)
+                        self.existing_items = self._set_item_locations(
+                            self.existing_items, self.existing_items["lon"].values,
+                            self.existing_items["lat"].values, srs=4326)
+                        self.existing_items["geom"] = [
+                            gk.geom.point(lon, lat, srs=4326) for lon, lat in
+                            zip(self.existing_items["lon"], self.existing_items["lat"])]
                         self.existing_items = self.assign_optimal_orientation(
                             self.existing_items)
                 else:
@@ -299,9 +236,10 @@ class OpenfieldPV(BaseOpenfieldPV, Technology):
         report_dict = self._run_exclusion(exclusion_dict=_exclusion_dict, **args)
         if self.ec.percentAvailable > 0:
             self.ec.pruneIsolatedAreas(minSize=500)
+        self._repack()
         report_dict["Total_Area"] = int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2)
-        report_dict["Eligible_Area"] = self.ec.areaAvailable
-        report_dict["Eligible_Percentage"] = self.ec.percentAvailable
+        report_dict["Eligible_Area"] = self.eligible.areaAvailable
+        report_dict["Eligible_Percentage"] = self.eligible.percentAvailable
         return report_dict
 
     def estimate_potential(self, exclusion_dict=None, predict=True, ignore_exist=False, use_lffa=True,
@@ -334,6 +272,7 @@ class OpenfieldPV(BaseOpenfieldPV, Technology):
                 self.distribute_items()
                 self.report_dict["Items_Number"] = self.ec._itemCoords.shape[0]
                 self.report_dict["Capacity"] = self.predicted_items['capacity'].sum()
+            self._repack()
 
     def load_less_favoured_farming_areas(self, path_lffa: str = None, **kwargs):
         """Load the less-favoured farming areas to exclusion calculator.
@@ -403,28 +342,11 @@ class OpenfieldPV(BaseOpenfieldPV, Technology):
         ----------
         overwrite_old: bool, default False. Only set to True, when you want to save the loading time
         for a very large RegionMask.
+
+        With TREP(pack_availability=True) the result is read bit-packed in blocks of rows.
         """
         path_LE = os.path.join(self.result_path, "OpenfieldPV_potential_area.tif")
-        assert os.path.isfile(path_LE), f"Can't find the LE result {path_LE}"
-        if self.ec._hasEqualContext(path_LE):
-            print("The LE result can be directly accepted", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE)
-        else:
-            print("The LE result has to be warped to the mask region", flush=True)
-            path_LE_warp = os.path.join(self.result_path, "OpenfieldPV_potential_area_warp.tif")
-            self.ec.region.warp(path_LE, output=path_LE_warp)
-            print("Warp finished", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE_warp)
-        initial_LE = np.where(initial_LE == 100, 100, 0)
-        self.ec._availability = initial_LE
-        print("LE result is loaded", flush=True)
-        if overwrite_old:
-            self.ec.save(path_LE)
-        report_dict = {"Exclusion": "loaded from existing results",
-                       "Total_Area": int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2),
-                       "Eligible_Area": self.ec.areaAvailable,
-                       "Eligible_Percentage": self.ec.percentAvailable}
-        return report_dict
+        return self._load_eligible_area(path_LE, overwrite_old=overwrite_old)
 
     def merge_to_germany(self, path_states: list = None):
         """Merge the potential area in federal states to germany, i.e. merge several small rasters to one large.
@@ -551,6 +473,7 @@ class OpenfieldPVRoads(BaseOpenfieldPV, Technology):
                 mode="include")
         if self.ec.percentAvailable == 0:
             print(f"No area alongside {self.type} available")
+            self._repack()
             return {"Info": "There is no potential areas on sides of roads and railways"}
         else:
             report_dict = self._run_exclusion(_exclusion_dict, **args)
@@ -559,9 +482,10 @@ class OpenfieldPVRoads(BaseOpenfieldPV, Technology):
             # TODO: only if in dict
             if _exclusion_dict.get("existing") is not None:
                 self.exclude_existing()
+            self._repack()
             report_dict["Total_Area"] = int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2)
-            report_dict["Eligible_Area"] = self.ec.areaAvailable
-            report_dict["Eligible_Percentage"] = self.ec.percentAvailable
+            report_dict["Eligible_Area"] = self.eligible.areaAvailable
+            report_dict["Eligible_Percentage"] = self.eligible.percentAvailable
             return report_dict
 
     def estimate_potential(self, exclusion_dict=None, efficiency=0.2214, predict=True, ignore_exist=False, **args):
@@ -595,6 +519,7 @@ class OpenfieldPVRoads(BaseOpenfieldPV, Technology):
                     self.distribute_items(efficiency=efficiency)
                     self.report_dict["Items_Number"] = self.ec._itemCoords.shape[0]
                     self.report_dict["Capacity"] = self.predicted_items['capacity'].sum()
+            self._repack()
 
     def load_eligible_area(self, overwrite_old: bool = False):
         """
@@ -608,28 +533,11 @@ class OpenfieldPVRoads(BaseOpenfieldPV, Technology):
         ----------
         overwrite_old: bool, default False. Only set to True, when you want to save the loading time
         for a very large RegionMask.
+
+        With TREP(pack_availability=True) the result is read bit-packed in blocks of rows.
         """
         path_LE = os.path.join(self.result_path, "OpenfieldPVRoads_potential_area.tif")
-        assert os.path.isfile(path_LE), f"Can't find the LE result {path_LE}"
-        if self.ec._hasEqualContext(path_LE):
-            print("The LE result can be directly accepted", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE)
-        else:
-            print("The LE result has to be warped to the mask region", flush=True)
-            path_LE_warp = os.path.join(self.result_path, "OpenfieldPVRoads_potential_area_warp.tif")
-            self.ec.region.warp(path_LE, output=path_LE_warp)
-            print("Warp finished", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE_warp)
-        initial_LE = np.where(initial_LE == 100, 100, 0)
-        self.ec._availability = initial_LE
-        print("LE result is loaded", flush=True)
-        if overwrite_old:
-            self.ec.save(path_LE)
-        report_dict = {"Exclusion": "loaded from existing results",
-                       "Total_Area": int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2),
-                       "Eligible_Area": self.ec.areaAvailable,
-                       "Eligible_Percentage": self.ec.percentAvailable}
-        return report_dict
+        return self._load_eligible_area(path_LE, overwrite_old=overwrite_old)
 
     def merge_to_germany(self, path_states: list = None):
         """Merge the potential area in federal states to germany, i.e. merge several small rasters to one large.
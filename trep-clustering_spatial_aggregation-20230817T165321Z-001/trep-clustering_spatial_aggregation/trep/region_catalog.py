@@ -0,0 +1,325 @@
+import os
+import json
+import uuid
+import sqlite3
+import pandas as pd
+import geokit as gk
+from osgeo import ogr, osr
+
+# VG250 file of each level
+LEVEL_FILES = {"MUN": "VG250_GEM.shp", "nuts3": "VG250_KRS.shp", "state": "VG250_LAN.shp"}
+# length of the RS of the parent region of each level
+PARENT_RS_LENGTH = {"MUN": 5, "nuts3": 2, "state": None}
+# version of the tables of the catalog, catalogs of other versions are built again
+SCHEMA_VERSION = "2"
+# names of states, which are not given by the GEN of VG250
+STATE_ALIASES = {"NRW": "05", "Bayern": "09", "Baden-Württemberg": "08", "Thüringen": "16",
+                 "Schleswig-Holstein": "01"}
+
+
+class RegionCatalog(object):
+    """Indexed catalog of the administrative regions of VG250.
+
+    The municipalities, districts and states are read once from the VG250 shapefiles and stored in a SQLite
+    file with indexes on RS, GEN and the parent region and an R*Tree of the bounding boxes. The geometries are
+    stored valid as WKB, so regions are selected without scanning the shapefiles. The neighbours of each region,
+    i.e. the regions of the same level whose geometries intersect, are stored as adjacency table. The catalog is
+    built again when a shapefile changes.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite file of the catalog
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        meta = dict(self.connection.execute("SELECT key, value FROM meta").fetchall())
+        self.sources = json.loads(meta["sources"])
+        self.srs = osr.SpatialReference()
+        self.srs.ImportFromWkt(meta["srs"])
+        self.has_rtree = meta["rtree"] == "1"
+        self.schema = meta.get("schema", "1")
+
+    @classmethod
+    def open(cls, vg250_path, path):
+        """
+        Open the catalog and build it if it is missing or the VG250 shapefiles changed.
+
+        Parameters
+        ----------
+        vg250_path : str
+            Directory of the VG250 shapefiles, e.g. vg250_ebenen
+        path : str
+            Path to the SQLite file of the catalog
+        """
+        sources = cls._source_versions(vg250_path)
+        if os.path.isfile(path):
+            catalog = cls(path)
+            if catalog.sources == sources and catalog.schema == SCHEMA_VERSION:
+                return catalog
+            catalog.close()
+        cls.build(vg250_path, path)
+        return cls(path)
+
+    @staticmethod
+    def _source_versions(vg250_path):
+        """Return modification time and size of the VG250 files."""
+        versions = {}
+        for level, file in LEVEL_FILES.items():
+            for _file in [file, os.path.splitext(file)[0] + ".dbf"]:
+                stat = os.stat(os.path.join(vg250_path, _file))
+                versions[_file] = [stat.st_mtime_ns, stat.st_size]
+        return versions
+
+    @classmethod
+    def build(cls, vg250_path, path):
+        """
+        Build the catalog from the VG250 shapefiles. The file is written to a temporary file first and moved into
+        place atomically, so several processes can build it at the same time.
+
+        Parameters
+        ----------
+        vg250_path : str
+            Directory of the VG250 shapefiles, e.g. vg250_ebenen
+        path : str
+            Path to the SQLite file of the catalog
+        """
+        print("Build region catalog", flush=True)
+        if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp"
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE regions (id INTEGER PRIMARY KEY, level TEXT, rs TEXT, ags TEXT, gen TEXT, nuts TEXT, "
+                "gf INTEGER, parent TEXT, area_km2 REAL, xmin REAL, xmax REAL, ymin REAL, ymax REAL, geom BLOB)")
+            try:
+                connection.execute("CREATE VIRTUAL TABLE regions_rtree USING rtree(id, xmin, xmax, ymin, ymax)")
+                has_rtree = True
+            except sqlite3.OperationalError:
+                # SQLite without R*Tree module, the bounding boxes are queried from the regions table
+                has_rtree = False
+            srs = None
+            for level, file in LEVEL_FILES.items():
+                features = gk.vector.extractFeatures(os.path.join(vg250_path, file))
+                if srs is None:
+                    srs = features.geom.values[0].GetSpatialReference()
+                parent_length = PARENT_RS_LENGTH[level]
+                for _, feature in features.iterrows():
+                    geom = feature.geom
+                    if not geom.IsValid():
+                        geom = geom.Buffer(0)
+                    xmin, xmax, ymin, ymax = geom.GetEnvelope()
+                    cursor = connection.execute(
+                        "INSERT INTO regions (level, rs, ags, gen, nuts, gf, parent, area_km2, xmin, xmax, ymin, ymax, "
+                        "geom) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (level, feature.RS, feature.AGS, feature.GEN, feature.NUTS, int(feature.GF),
+                         None if parent_length is None else feature.RS[:parent_length], geom.GetArea() / 1e6,
+                         xmin, xmax, ymin, ymax, bytes(geom.ExportToWkb())))
+                    if has_rtree:
+                        connection.execute("INSERT INTO regions_rtree VALUES (?, ?, ?, ?, ?)",
+                                           (cursor.lastrowid, xmin, xmax, ymin, ymax))
+            connection.execute("CREATE INDEX regions_rs ON regions (level, rs)")
+            connection.execute("CREATE INDEX regions_gen ON regions (level, gen)")
+            connection.execute("CREATE INDEX regions_parent ON regions (level, parent)")
+            cls._build_adjacency(connection, has_rtree)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [("sources", json.dumps(cls._source_versions(vg250_path), sort_keys=True)),
+                                    ("srs", srs.ExportToWkt()),
+                                    ("rtree", "1" if has_rtree else "0"),
+                                    ("schema", SCHEMA_VERSION)])
+            connection.commit()
+            connection.close()
+            os.replace(tmp_path, path)
+        finally:
+            connection.close()
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _build_adjacency(connection, has_rtree):
+        """Store the pairs of regions of the same level whose geometries intersect, including touching ones.
+        Only regions with intersecting bounding boxes are tested."""
+        print("Build adjacency of regions", flush=True)
+        connection.execute("CREATE TABLE adjacency (level TEXT, rs TEXT, neighbour TEXT, "
+                           "PRIMARY KEY (level, rs, neighbour))")
+        if has_rtree:
+            query = ("SELECT regions.id, regions.rs FROM regions_rtree JOIN regions ON regions.id = regions_rtree.id "
+                     "WHERE regions.level = ? AND regions.id > ? AND regions_rtree.xmax >= ? "
+                     "AND regions_rtree.xmin <= ? AND regions_rtree.ymax >= ? AND regions_rtree.ymin <= ?")
+        else:
+            query = ("SELECT id, rs FROM regions WHERE level = ? AND id > ? AND xmax >= ? AND xmin <= ? "
+                     "AND ymax >= ? AND ymin <= ?")
+        for level in LEVEL_FILES:
+            rows = connection.execute("SELECT id, rs, xmin, xmax, ymin, ymax, geom FROM regions WHERE level = ?",
+                                      (level,)).fetchall()
+            geoms = {row[0]: ogr.CreateGeometryFromWkb(bytes(row[6])) for row in rows}
+            pairs = []
+            for region_id, rs, xmin, xmax, ymin, ymax, _ in rows:
+                # each pair of regions is tested once
+                for other_id, other_rs in connection.execute(query, (level, region_id, xmin, xmax, ymin,
+                                                                     ymax)).fetchall():
+                    if other_rs != rs and geoms[region_id].Intersects(geoms[other_id]):
+                        pairs += [(level, rs, other_rs), (level, other_rs, rs)]
+            connection.executemany("INSERT OR IGNORE INTO adjacency VALUES (?, ?, ?)", pairs)
+
+    def close(self):
+        """Close the connection to the catalog."""
+        self.connection.close()
+
+    @property
+    def version(self):
+        """Version of the catalog given by the versions of the VG250 files."""
+        return json.dumps(self.sources, sort_keys=True)
+
+    def _to_features(self, rows):
+        """Return selected rows as DataFrame like gk.vector.extractFeatures."""
+        features = pd.DataFrame(rows, columns=["RS", "AGS", "GEN", "NUTS", "GF", "parent", "area_km2", "geom"])
+        geoms = []
+        for wkb in features.geom:
+            geom = ogr.CreateGeometryFromWkb(bytes(wkb))
+            geom.AssignSpatialReference(self.srs)
+            geoms.append(geom)
+        features["geom"] = geoms
+        return features
+
+    def get_features(self, level, regions=None):
+        """
+        Get the features of regions.
+
+        Parameters
+        ----------
+        level : str
+            ["MUN", "nuts3", "state", "country"]. The country is given by all states.
+        regions : list, optional
+            RS or GEN of the regions. All regions of the level if None, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            RS, AGS, GEN, NUTS, GF, parent, area_km2 and geom of the regions
+        """
+        columns = "rs, ags, gen, nuts, gf, parent, area_km2, geom"
+        if level == "country":
+            rows = self.connection.execute(
+                f"SELECT {columns} FROM regions WHERE level = 'state' AND gf != 1 ORDER BY id").fetchall()
+            return self._to_features(rows)
+        if regions is None:
+            rows = self.connection.execute(
+                f"SELECT {columns} FROM regions WHERE level = ? ORDER BY id", (level,)).fetchall()
+            return self._to_features(rows)
+        conditions = []
+        parameters = [level]
+        for region in regions:
+            if level == "state" and region in STATE_ALIASES:
+                region = STATE_ALIASES[region]
+            if region[0] in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]:
+                conditions.append("rs = ?")
+            else:
+                conditions.append("gen = ?")
+            parameters.append(region)
+        where = f"level = ? AND ({' OR '.join(conditions)})"
+        if level == "state":
+            where += " AND gf != 1"
+        rows = self.connection.execute(f"SELECT {columns} FROM regions WHERE {where} ORDER BY id",
+                                       parameters).fetchall()
+        return self._to_features(rows)
+
+    def get_areas(self, level):
+        """
+        Get the area of all regions of a level.
+
+        Parameters
+        ----------
+        level : str
+            ["MUN", "nuts3", "state"]
+
+        Returns
+        -------
+        pd.Series
+            area in km² indexed by RS
+        """
+        rows = self.connection.execute("SELECT rs, SUM(area_km2) FROM regions WHERE level = ? GROUP BY rs",
+                                       (level,)).fetchall()
+        return pd.Series(dict(rows), name="area_km2", dtype=float)
+
+    def get_children(self, rs, level="MUN"):
+        """
+        Get the RS of all regions of a level within a parent region.
+
+        Parameters
+        ----------
+        rs : str
+            RS of the parent region
+        level : str, optional
+            level of the children, by default "MUN"
+
+        Returns
+        -------
+        np.ndarray
+            RS of the children
+        """
+        rows = self.connection.execute("SELECT rs FROM regions WHERE level = ? AND parent = ? ORDER BY id",
+                                       (level, rs)).fetchall()
+        return pd.Series([row[0] for row in rows], dtype=object).values
+
+    def get_neighbours(self, rs, level="MUN"):
+        """
+        Get the RS of the neighbours of a region, i.e. the regions of the same level whose geometries intersect.
+
+        Parameters
+        ----------
+        rs : str
+            RS of the region
+        level : str, optional
+            level of the region, by default "MUN"
+
+        Returns
+        -------
+        list
+            RS of the neighbours
+        """
+        rows = self.connection.execute(
+            "SELECT neighbour FROM adjacency WHERE level = ? AND rs = ? ORDER BY neighbour", (level, rs)).fetchall()
+        return [row[0] for row in rows]
+
+    def _query_intersecting(self, columns, level, xMin, yMin, xMax, yMax):
+        """Select rows of a level whose bounding box intersects a box in the srs of the catalog."""
+        columns = ", ".join(f"regions.{column}" for column in columns)
+        if self.has_rtree:
+            query = (f"SELECT {columns} FROM regions_rtree JOIN regions ON regions.id = regions_rtree.id "
+                     "WHERE regions.level = ? AND regions_rtree.xmax >= ? AND regions_rtree.xmin <= ? "
+                     "AND regions_rtree.ymax >= ? AND regions_rtree.ymin <= ? ORDER BY regions.id")
+        else:
+            query = (f"SELECT {columns} FROM regions WHERE level = ? AND xmax >= ? AND xmin <= ? AND ymax >= ? "
+                     "AND ymin <= ? ORDER BY regions.id")
+        return self.connection.execute(query, (level, xMin, xMax, yMin, yMax)).fetchall()
+
+    def get_intersecting(self, level, xMin, yMin, xMax, yMax):
+        """
+        Get the RS of all regions of a level whose bounding box intersects a box in the srs of the catalog.
+
+        Returns
+        -------
+        list
+            RS of the regions
+        """
+        rows = self._query_intersecting(["rs"], level, xMin, yMin, xMax, yMax)
+        return sorted(set(row[0] for row in rows))
+
+    def get_features_intersecting(self, level, xMin, yMin, xMax, yMax):
+        """
+        Get the features of all regions of a level whose bounding box intersects a box in the srs of the catalog.
+
+        Returns
+        -------
+        pd.DataFrame
+            RS, AGS, GEN, NUTS, GF, parent, area_km2 and geom of the regions
+        """
+        rows = self._query_intersecting(["rs", "ags", "gen", "nuts", "gf", "parent", "area_km2", "geom"],
+                                        level, xMin, yMin, xMax, yMax)
+        return self._to_features(rows)
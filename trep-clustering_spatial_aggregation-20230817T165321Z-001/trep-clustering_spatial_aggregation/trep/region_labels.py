@@ -0,0 +1,101 @@
+import numpy as np
+import geokit as gk
+from osgeo import gdal, ogr
+
+
+def rasterize_labels(regionMask, geoms, labels=None, dtype=np.int32):
+    """
+    Rasterize regions to a label raster on the grid of a RegionMask.
+
+    Pixels are assigned to the region containing the pixel center, like the masks of gk.RegionMask.fromGeom.
+
+    Parameters
+    ----------
+    regionMask : gk.RegionMask
+        Grid of the label raster
+    geoms : list
+        Geometries of the regions
+    labels : list, optional
+        Label of each region, by default 1 to len(geoms)
+    dtype : np.dtype, optional
+        Data type of the label raster, by default np.int32
+
+    Returns
+    -------
+    np.ndarray
+        Label of the region of each pixel, 0 outside of all regions and of the RegionMask
+    """
+    if labels is None:
+        labels = range(1, len(geoms) + 1)
+    label_raster = _rasterize(regionMask.extent, regionMask.pixelWidth, regionMask.pixelHeight, regionMask.srs,
+                              regionMask.mask.shape, geoms, labels).astype(dtype)
+    label_raster[~regionMask.mask] = 0
+    return label_raster
+
+
+def _rasterize(extent, pixelWidth, pixelHeight, srs, shape, geoms, labels):
+    """Rasterize geometries with their label to a grid given by its extent and pixel size."""
+    height, width = shape
+    ds = gdal.GetDriverByName("MEM").Create("", width, height, 1, gdal.GDT_Int32)
+    ds.SetGeoTransform((extent.xMin, pixelWidth, 0, extent.yMax, 0, -pixelHeight))
+    ds.SetProjection(srs.ExportToWkt())
+    vector = ogr.GetDriverByName("Memory").CreateDataSource("")
+    layer = vector.CreateLayer("regions", srs=srs, geom_type=ogr.wkbMultiPolygon)
+    layer.CreateField(ogr.FieldDefn("label", ogr.OFTInteger))
+    for geom, label in zip(geoms, labels):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField("label", int(label))
+        feature.SetGeometry(gk.geom.transform(geom, toSRS=srs))
+        layer.CreateFeature(feature)
+    gdal.RasterizeLayer(ds, [1], layer, options=["ATTRIBUTE=label"])
+    return ds.GetRasterBand(1).ReadAsArray()
+
+
+def pixel_index(regionMask, x, y):
+    """
+    Get the pixel of points on the grid of a RegionMask.
+
+    Parameters
+    ----------
+    regionMask : gk.RegionMask
+        Grid of the pixels
+    x, y : np.ndarray
+        Coordinates of the points in the srs of the RegionMask
+
+    Returns
+    -------
+    tuple
+        rows, columns and whether the point is within the extent of the RegionMask
+    """
+    return _pixel_index(regionMask.extent, regionMask.pixelWidth, regionMask.pixelHeight, regionMask.mask.shape,
+                        x, y)
+
+
+def _pixel_index(extent, pixelWidth, pixelHeight, shape, x, y):
+    """Get the pixel of points on a grid given by its extent, pixel size and shape, see pixel_index."""
+    cols = np.floor((np.asarray(x, dtype=float) - extent.xMin) / pixelWidth).astype(np.int64)
+    rows = np.floor((extent.yMax - np.asarray(y, dtype=float)) / pixelHeight).astype(np.int64)
+    height, width = shape
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    return np.where(inside, rows, 0), np.where(inside, cols, 0), inside
+
+
+def transform_points(x, y, fromSRS, toSRS):
+    """Transform coordinates in bulk. Returns the coordinates unchanged if fromSRS is None or equal to toSRS."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if fromSRS is None or len(x) == 0:
+        return x, y
+    fromSRS = gk.srs.loadSRS(fromSRS)
+    toSRS = gk.srs.loadSRS(toSRS)
+    if fromSRS.IsSame(toSRS):
+        return x, y
+    points = np.array(gk.srs.xyTransform(np.column_stack([x, y]), fromSRS=fromSRS, toSRS=toSRS,
+                                         outputFormat="raw"))
+    return points[:, 0], points[:, 1]
+
+
+def point_coordinates(geoms):
+    """Return the x and y coordinates of point geometries as arrays in the srs of the geometries."""
+    coordinates = np.array([geom.GetPoint_2D() for geom in geoms], dtype=float).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
@@ -0,0 +1,108 @@
+import os
+import json
+import uuid
+import hashlib
+import numpy as np
+import geokit as gk
+from osgeo import ogr
+
+
+class RegionMaskCache(object):
+    """On-disk cache of rasterized region masks.
+
+    The mask of a region is stored as .npy file next to a json file with its extent and a .wkb file with its
+    geometry and is memory-mapped when loaded, so a cached region needs no union or transformation of its
+    geometries. Masks are named by a hash of the region ids, the level, the srs, the pixel resolution and the
+    version of the boundary dataset, so a changed dataset does not reuse old masks.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory of the cached masks
+        """
+        self.path = path
+
+    def get_path(self, regions, level, srs, pixelRes, version):
+        """
+        Get the path of a cached mask without extension.
+
+        Parameters
+        ----------
+        regions : list
+            RS of the regions
+        level : str
+            level of the regions
+        srs : any
+            spatial reference system as accepted by gk.srs.loadSRS
+        pixelRes : float
+            pixel resolution
+        version : str
+            version of the boundary dataset, e.g. RegionCatalog.version
+        """
+        inputs = {
+            "regions": sorted(set(regions)),
+            "level": level,
+            "srs": gk.srs.loadSRS(srs).ExportToWkt(),
+            "pixelRes": pixelRes,
+            "version": version,
+        }
+        digest = hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{level}_{digest[:20]}")
+
+    def load(self, path, geom=None):
+        """
+        Load a cached mask.
+
+        Parameters
+        ----------
+        path : str
+            Path as returned by get_path
+        geom : ogr.Geometry, optional
+            Geometry of the region in the srs of the mask, by default the cached geometry
+
+        Returns
+        -------
+        gk.RegionMask or None
+            The region mask or None if it is not cached
+        """
+        if not all(os.path.isfile(path + ext) for ext in (".json", ".npy", ".wkb")):
+            return None
+        with open(path + ".json", "r") as f:
+            meta = json.load(f)
+        mask = np.load(path + ".npy", mmap_mode="r")
+        srs = gk.srs.loadSRS(meta["srs"])
+        extent = gk.Extent(*meta["extent"], srs=srs)
+        if geom is None:
+            with open(path + ".wkb", "rb") as f:
+                geom = ogr.CreateGeometryFromWkb(f.read())
+            geom.AssignSpatialReference(srs)
+        return gk.RegionMask(extent, (meta["pixelWidth"], meta["pixelHeight"]), mask=mask, geom=geom)
+
+    def save(self, path, regionMask):
+        """
+        Save a region mask. The files are written to temporary files and moved into place atomically, the json
+        file last, so a mask is only loaded when it is complete.
+
+        Parameters
+        ----------
+        path : str
+            Path as returned by get_path
+        regionMask : gk.RegionMask
+            The region mask
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        tmp = f".{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp"
+        np.save(path + tmp + ".npy", np.ascontiguousarray(regionMask.mask))
+        os.replace(path + tmp + ".npy", path + ".npy")
+        with open(path + tmp + ".wkb", "wb") as f:
+            f.write(bytes(regionMask.geometry.ExportToWkb()))
+        os.replace(path + tmp + ".wkb", path + ".wkb")
+        meta = {"extent": list(regionMask.extent.xyXY), "srs": regionMask.srs.ExportToWkt(),
+                "pixelWidth": regionMask.pixelWidth, "pixelHeight": regionMask.pixelHeight}
+        with open(path + tmp + ".json", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + tmp + ".json", path + ".json")
@@ -5,12 +5,10 @@ import pandas as pd
 import geokit as gk
 from geoalchemy2 import Geometry  # <= not used but must be imported
 from sqlalchemy import create_engine, MetaData, select, func, and_, or_
-import osgeo
 import numpy as np
 import reskit as rk
 import scipy
 import time
-import trep
 import warnings
 import json
 
@@ -37,16 +35,7 @@ class RooftopPV(Technology):
         int
             population of region
         """
-        path = os.path.join(
-            self.parent.datasource_path,
-            "other", "Zensus2011_Bevoelkerung",
-            "Zensus11_Datensatz_Bevoelkerung.csv")
-        df_zensus = pd.read_csv(
-            path, sep=";", encoding="utf-8",
-            dtype={"AGS_12": str, "RS_Land": str, "RS_RB_NUTS2": str,
-                   "RS_Kreis": str, "RS_VB": str, "RS_Gem": str})
-        df_zensus["RS"] = df_zensus["RS_Land"] + df_zensus["RS_RB_NUTS2"] + \
-            df_zensus["RS_Kreis"] + df_zensus["RS_VB"] + df_zensus["RS_Gem"]
+        df_zensus = utils.get_zensus(self.parent.datasource_path)
         map_regions = {
             "Mönchengladbach": "Mönchengladbach, Stadt",
             "Ilmenau": "Ilmenau, Stadt",
@@ -98,6 +87,42 @@ class RooftopPV(Technology):
 
         return P_pv
 
+    @staticmethod
+    def estimate_roof_pv_potential_batch(datasource_path, region_catalog, level="MUN", efficiency=0.2214):
+        """Estimate the roof pv potential based on Ryberg for all regions of a level at once.
+
+        Same estimation as estimate_roof_pv_potential with the population of the Zensus 2011 and the area of
+        the regions in the region catalog, so no TREP has to be created.
+
+        Parameters
+        ----------
+        datasource_path : str
+            Path that indicate the datasources
+        region_catalog : trep.region_catalog.RegionCatalog
+            Catalog of the administrative regions, e.g. TREP.region_catalog
+        level : str, optional
+            ["MUN", "nuts3"], by default "MUN"
+        efficiency : float, optional
+            efficiency used for estimation, by default 0.2214
+
+        Returns
+        -------
+        pd.DataFrame
+            population, area in km² and P_pv total PV capacity potential in MW indexed by RS
+        """
+        df = pd.DataFrame({"area": region_catalog.get_areas(level)})
+        df["population"] = utils.get_population_table(datasource_path, level).reindex(df.index)
+        missing = df.population.isna().sum()
+        if missing > 0:
+            warnings.warn(f"No population found for {missing} regions of level {level}.")
+        df["population"] = df["population"].fillna(0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pv_area = 172.3*df["population"]*(df["population"]/df["area"])**(-0.352)
+        # 3.33m^2 module/kWp (30% efficiency) and
+        # 50% utilization factor portion of roofs that are north facing
+        df["P_pv"] = (pv_area*efficiency*0.5/1e3).where(df["population"] > 0, 0)  # in MWp
+        return df
+
     def get_roof_pv_items_ryberg(self, P_pv, elevation=300, resolution=1):
         """Get the rooftop PV items.
 
@@ -194,7 +219,9 @@ class RooftopPV(Technology):
                              func.ST_SRID(surfaces.c.geometry)),
                          func.ST_GeomFromWKB(surfaces.c.geometry),
                          func.ST_SRID(surfaces.c.geometry),
-                         surfaces.c.parent_id],
+                         surfaces.c.parent_id,
+                         func.ST_X(func.ST_Centroid(surfaces.c.geometry)).label("centroid_x"),
+                         func.ST_Y(func.ST_Centroid(surfaces.c.geometry)).label("centroid_y")],
                          surfaces.c.parent_id.in_(ts_ids),
                         )
             # rs = select([func.ST_AsText(func.ST_DumpPoints(surfaces.c.geometry).geom)], 
@@ -243,7 +270,6 @@ class RooftopPV(Technology):
                 srid = 25833
             else:
                 srid = 25832
-            region_geom = gk.geom.transform(self.parent.regionMask.geometry, toSRS=srid)
             pts = self.parent.regionMask.extent.xXyY
             pts = [(pts[0], pts[2]), (pts[0], pts[3]), (pts[1], pts[3]), (pts[1], pts[2])]
             pts = gk.srs.xyTransform(pts, fromSRS=self.parent.regionMask.srs, toSRS=srid)
@@ -267,10 +293,12 @@ class RooftopPV(Technology):
                                             bdgs_meta.c.id.in_(bdg_ids))
                 bdg_fct = pd.read_sql_query(select_bdg_ids_fct, conn)
                 _df = query_roofs(bdg_ids, bdg_fct)
-                _df["Within"] = _df.apply(lambda x: osgeo.ogr.Geometry.Within(gk.geom.convertWKT(x["ST_AsText_1"],
-                                                                                srs=int(x["ST_SRID_1"])),
-                                                                region_geom),
-                            axis=1)
+                # roofs are assigned to the region by the pixel of their centroid
+                _df["Within"] = False
+                for _srid in _df["ST_SRID_1"].unique():
+                    _rows = _df["ST_SRID_1"] == _srid
+                    _df.loc[_rows, "Within"] = self.parent.contains(
+                        _df.loc[_rows, "centroid_x"], _df.loc[_rows, "centroid_y"], srs=int(_srid))
                 _df = _df[_df["Within"]]
                 if i == 0:
                     df = _df
@@ -464,9 +492,9 @@ class RooftopPV(Technology):
 
     def get_existing_plants(self):
         """Get existing plants from MaStR in groups."""
-        def _get_existing(mastr_existing, ags):
-            mastr_existing_mun = \
-                mastr_existing[mastr_existing.ENH_Gemeindeschluessel == ags]
+        def _get_existing(ags):
+            mastr_existing_mun = self.parent.get_existing_assets(
+                "RooftopPV", ags=ags)
             mastr_existing_mun = \
                 mastr_existing_mun[mastr_existing_mun.ENH_Lage != "Freifläche"]
             # print("Not using {} kW, because no group is given".format(
@@ -516,24 +544,15 @@ class RooftopPV(Technology):
                     fromSRS=self.parent.regionMask.srs, toSRS="latlon")
             return existing
         if self.existing_items is None:
-            mastr_existing = pd.read_csv(
-                os.path.join(
-                    self.parent.datasource_path,
-                    "mastr", "pv_groups.csv"),
-                dtype={"ENH_Gemeindeschluessel": str},
-                index_col=0)
             if self.parent.level == "nuts3":
                 for i, mun in enumerate(self.parent.municipalities):
-                    glr_mun = trep.TREP(
-                        mun, level="MUN", case=self.parent.case,
-                        db_path=self.parent.db_path)
+                    ags = self.parent.region_catalog.get_features("MUN", [mun])["AGS"][0]
                     if i == 0:
-                        self.existing_items = _get_existing(
-                            mastr_existing, glr_mun._ags)
+                        self.existing_items = _get_existing(ags)
                     else:
                         self.existing_items["capacity"] = \
                             self.existing_items["capacity"].add(
-                                _get_existing(mastr_existing, glr_mun._ags)["capacity"])
+                                _get_existing(ags)["capacity"])
                     if self.predicted_items is None:
                         self.estimate_potential()
                         self.group_items()
@@ -543,8 +562,7 @@ class RooftopPV(Technology):
                             self.predicted_items[
                                 self.predicted_items.group == group].capacity.sum()
             else:
-                self.existing_items = _get_existing(
-                    mastr_existing, self.parent._ags)
+                self.existing_items = _get_existing(self.parent._ags)
 
     def calc_existing(self):
         """Calc share of used space on roofs."""
@@ -577,9 +595,7 @@ class RooftopPV(Technology):
                           len(self.parent.municipalities)), flush=True)
                     print(mun, flush=True)
                     if mun not in self.glr_muns.keys():
-                        self.glr_muns[mun] = trep.TREP(
-                            mun, case=self.parent.case, level="MUN",
-                            db_path=self.parent.db_path)
+                        self.glr_muns[mun] = self.parent.child(mun)
                     self.glr_muns[mun].RooftopPV.predicted_items = \
                         self.glr_muns[mun].check_db(
                         self.glr_muns[mun].techs["RooftopPV"])
@@ -616,9 +632,7 @@ class RooftopPV(Technology):
             if self.parent.level == "nuts3":
                 for i, mun in enumerate(self.parent.municipalities):
                     if mun not in self.glr_muns.keys():
-                        self.glr_muns[mun] = \
-                            trep.TREP(mun, level="MUN", case=self.parent.case,
-                                      db_path=self.parent.db_path)
+                        self.glr_muns[mun] = self.parent.child(mun)
                     self.glr_muns[mun].add_tech("RooftopPV")
                     temp = self.glr_muns[mun].check_db(
                         self.glr_muns[mun].techs["RooftopPV"], "ts", group)
@@ -682,9 +696,7 @@ class RooftopPV(Technology):
                           len(self.parent.municipalities)), flush=True)
                     print(mun, flush=True)
                     if mun not in self.glr_muns.keys():
-                        self.glr_muns[mun] = trep.TREP(
-                            mun, case=self.parent.case, level="MUN",
-                            db_path=self.parent.db_path)
+                        self.glr_muns[mun] = self.parent.child(mun)
                     self.glr_muns[mun].RooftopPV.sim()
                     if i == 0:
                         ts = self.glr_muns[mun].RooftopPV.ts_predicted_items
@@ -703,9 +715,7 @@ class RooftopPV(Technology):
         if self.parent.level == "nuts3":
             for i, mun in enumerate(self.parent.municipalities):
                 if mun not in self.glr_muns.keys():
-                    self.glr_muns[mun] = trep.TREP(
-                        mun, level="MUN", case=self.parent.case,
-                        db_path=self.parent.db_path)
+                    self.glr_muns[mun] = self.parent.child(mun)
                 self.glr_muns[mun].RooftopPV.sim_existing()
                 if i == 0:
                     self.ts_existing_items = \
@@ -1,8 +1,8 @@
 from abc import ABC, abstractmethod
 import glaes as gl
 import os
+import copy
 import json
-
 from numpy.lib.function_base import place
 from trep import utils
 import reskit as rk
@@ -11,25 +11,315 @@ import datetime as dt
 from MATES.core.InputGenerator import IG_utils
 import warnings
 import numpy as np
+import scipy.ndimage
 import geokit as gk
+from osgeo import gdal
 import time
+import shutil
+import tempfile
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from matplotlib.sankey import Sankey
 from typing import Dict, Type, Text
 import plotly.graph_objects as go
 from FINE.spagat.RE_representation import represent_RE_technology
+from trep.exclusion_planner import ExclusionPlanner
+from trep.availability import PackedAvailability, read_region, stamp_footprints
+from trep.region_labels import pixel_index, transform_points
+
+IMPLEMENTED_KEYS = [
+    "airports", "airfields", "health_treatment_buildings", "buildings", "mixed_buildings",
+    "water_still", "water_river", "water_stream", "motorway", "primary_roads", "secondary_roads",
+    "regional_roads", "railways", "power_lines", "farmland", "grassland", "forests",
+    "inner_areas", "outer_areas", "residential", "mixed_usage", "5Houses", "cemetery",
+    "10Houses", "industrial_commercial", "dvor", "vor", "military", "recreational", "available_side_stripes",
+    "camping", "historical", "mineral_extraction", "dump_sites", "construction", "buildings_all",
+    "wind_100m", "wind_100m_era", "wind_100m_power", "elevation", "slope", "seismic_station",
+    "birds", "nature_protection", "nationalpark", "habitats", "landscape", "trees",
+    "protected", "region_edge", "existing", "soft_exclusion", "state", "auxiliary", "forests_outside_FRA",
+    "forests_in_FRA_without_coniferous_forests", "buildings_commercial", "border", "biospheres_core",
+    "biospheres_develop", "biospheres_maintain", "exclusion_plan", "layer_statistics"
+]
+# data type of each source
+DATA_TYPES = {
+    "basis-dlm": "vector", "dlm250": "vector", "osm": "vector", "clc": "vector", "osm_overpass": "vector",
+    "copernicus": "raster", "gwa": "raster", "wdpa": "vector", "hu": "vector", "inner_areas": "vector",
+    "bgr": "vector", "vg250": "vector", "bfn": "vector"
+}
+# keys given by a value range of a raster instead of a buffer
+RASTER_KEYS = ["wind_100m", "wind_100m_era", "wind_100m_power", "elevation", "slope"]
+# resampling of the rasters to the region when raster layers are excluded or read
+RASTER_RESAMPLE_ALG = "bilinear"
+# keys which are not excluded if their entry is falsy, e.g. an empty dictionary, not only if it is None
+FALSY_SKIPPED_KEYS = ["dvor", "vor", "seismic_station"]
+# categories of the sankey diagram
+SANKEY_CATEGORIES = ["social", "infrastructure", "physical", "eco_tech", "protected", "others"]
+# (key, sankey label, sankey category) in the order the layers are excluded. Layers without category are
+# excluded but not reported in the sankey diagram. Regional features of the auxiliary dictionary follow in
+# the category "others".
+EXCLUSION_LAYERS = [
+    ("border", None, None),
+    ("motorway", "Motorways", "infrastructure"),
+    ("primary_roads", "Primary roads", "infrastructure"),
+    ("secondary_roads", "Secondary roads", "infrastructure"),
+    ("railways", "Railways", "infrastructure"),
+    ("power_lines", "Power lines", "infrastructure"),
+    ("inner_areas", "Inner areas", "social"),
+    ("5Houses", "5-Houses", "social"),
+    ("10Houses", "10-Houses", "social"),
+    ("outer_areas", "Outer areas", "social"),
+    ("residential", "Residential areas", "social"),
+    ("mixed_usage", "Mixed-use areas", "social"),
+    ("industrial_commercial", "Indu & Commer", "social"),
+    ("regional_roads", "Regional roads", "infrastructure"),
+    ("buildings", "Residential buildings", "social"),
+    ("buildings_commercial", "Commercial buildings", "social"),
+    ("buildings_all", "Buildings", "social"),
+    ("mixed_buildings", "Mixed-use buildings", "social"),
+    ("health_treatment_buildings", "Health treatment buildings", "social"),
+    ("water_still", "Lakes", "physical"),
+    ("water_river", "Rivers", "physical"),
+    ("water_stream", "Streams", "physical"),
+    ("farmland", "Farmlands", "physical"),
+    ("grassland", "Grassland", "physical"),
+    ("forests", "Forests", "physical"),
+    ("forests_outside_FRA", "Forests outside FRA", "physical"),
+    ("forests_in_FRA_without_coniferous_forests", "NC forests in FRA", "physical"),
+    ("trees", "Trees", "physical"),
+    ("airports", "Airports", "infrastructure"),
+    ("airfields", "Airfields", "infrastructure"),
+    ("dvor", "D-VOR", "infrastructure"),
+    ("vor", "VOR", "infrastructure"),
+    ("seismic_station", "Seismic station", "infrastructure"),
+    ("military", "Military", "social"),
+    ("cemetery", "Cemetery", "social"),
+    ("recreational", "Recreational areas", "social"),
+    ("camping", "Camping sites", "social"),
+    ("historical", "Historical sites", "social"),
+    ("mineral_extraction", "Mineral extraction sites", "social"),
+    ("dump_sites", "Dump sites", "social"),
+    ("construction", "Construction sites", "social"),
+    ("wind_100m", "Wind speed at 100m", "eco_tech"),
+    ("wind_100m_era", "Wind speed at 100m", "eco_tech"),
+    ("wind_100m_power", "Wind power at 100m", "eco_tech"),
+    ("elevation", "Elevation", "eco_tech"),
+    ("slope", "Slope", "eco_tech"),
+    ("birds", "Birds", "protected"),
+    ("nature_protection", "Nature protection areas", "protected"),
+    ("nationalpark", "National parks", "protected"),
+    ("habitats", "Habitats", "protected"),
+    ("landscape", "Landscape protected areas", "protected"),
+    ("biospheres_core", "Biospheres_core", "protected"),
+    ("biospheres_develop", "Biospheres_develop", "protected"),
+    ("biospheres_maintain", "Biospheres_maintain", "protected"),
+]
+
+# state of the parallel exclusion, inherited by the forked workers
+_PARALLEL_EXCLUSION = {}
+
+
+def _rasterize_part(index, slot):
+    """Rasterize one part of an exclusion layer into a slot of the shared masks in a forked worker, see
+    Technology._rasterize_layers_parallel."""
+    start = time.time()
+    technology = _PARALLEL_EXCLUSION["technology"]
+    ec = technology.parent.new_ec()
+    _PARALLEL_EXCLUSION["masks"][slot] = technology._layer_mask(_PARALLEL_EXCLUSION["parts"][index], ec)
+    return slot, time.time() - start
+
+
+def _exclude_tile(index):
+    """Exclude one tile in a forked worker, see Technology.run_exclusion_tiled."""
+    state = _PARALLEL_EXCLUSION
+    return state["technology"]._exclude_tile(state["tiles"][index], state["layers"], state["pad"],
+                                             state["region_edge"], state["region_vector"])
+
+
+class _LayerMasks(object):
+    """Bit-packed masks of excluded pixels in shared memory, one row per slot."""
+
+    def __init__(self, n_masks, shape):
+        self.shape = shape
+        self.size = int(np.prod(shape))
+        n_bytes = (self.size + 7) // 8
+        self._shm = shared_memory.SharedMemory(create=True, size=max(n_masks * n_bytes, 1))
+        self.packed = np.ndarray((n_masks, n_bytes), dtype=np.uint8, buffer=self._shm.buf)
+
+    def __setitem__(self, index, mask):
+        self.packed[index] = np.packbits(mask, axis=None)
+
+    def __getitem__(self, index):
+        return np.unpackbits(self.packed[index], count=self.size).reshape(self.shape).view(bool)
+
+    def close(self):
+        del self.packed
+        self._shm.close()
+        self._shm.unlink()
+
 
 class Technology(ABC):
     def __init__(self,
                  parent):
         self.parent = parent
-        self.ec = parent.new_ec()
+        if parent.pack_availability:
+            # the ExclusionCalculator is only created when it is used, so the dense availability is never built
+            self._ec = None
+            self._packed_availability = PackedAvailability(parent.regionMask)
+        else:
+            self.ec = parent.new_ec()
         self.predicted_items = None
         self.ts_predicted_items = None
         self.existing_items = None
         self.report_dict = None
         self.ts_existing_items = None
 
-    def _run_exclusion(self, exclusion_dict, ec=None, plot_sankey=True, use_net_flows=True):
+    @property
+    def ec(self):
+        """ExclusionCalculator of the technology. A packed availability is unpacked on access."""
+        if self._ec is None:
+            self._ec = self.parent.new_ec()
+        if self._packed_availability is not None:
+            self.unpack()
+        return self._ec
+
+    @ec.setter
+    def ec(self, ec):
+        self._ec = ec
+        self._packed_availability = None
+
+    @property
+    def is_packed(self):
+        """Whether the availability is held bit-packed."""
+        return self._packed_availability is not None
+
+    @property
+    def availability(self):
+        """
+        Bit-packed availability of the technology, see PackedAvailability. Supports exclude, include,
+        percentAvailable, areaAvailable and save without unpacking the availability.
+        """
+        if self._packed_availability is None:
+            self.pack()
+        return self._packed_availability
+
+    @property
+    def eligible(self):
+        """
+        Availability for reports and results, the packed availability with TREP(pack_availability=True) and the
+        ExclusionCalculator otherwise. Both support areaAvailable, percentAvailable and save.
+        """
+        return self.availability if self.parent.pack_availability else self.ec
+
+    def pack(self):
+        """Hold the availability bit-packed, i.e. with 8 pixels per byte, until the ExclusionCalculator is used."""
+        if self._packed_availability is None:
+            self._packed_availability = PackedAvailability.from_availability(self._ec.region,
+                                                                             self._ec._availability)
+            self._ec._availability = None
+
+    def _repack(self):
+        """Pack the availability again after it was used, if TREP(pack_availability=True)."""
+        if self.parent.pack_availability:
+            self.pack()
+
+    def unpack(self):
+        """Restore the dense availability of the ExclusionCalculator."""
+        if self._packed_availability is not None:
+            self._ec._availability = self._packed_availability.to_availability()
+            self._packed_availability = None
+
+    def _set_item_locations(self, items, x, y, srs):
+        """
+        Set the coordinates of items as numeric columns, x and y in the srs of the RegionMask and lat and lon.
+
+        Parameters
+        ----------
+        items : pd.DataFrame
+            items, e.g. existing plants
+        x, y : np.ndarray
+            coordinates of the items
+        srs : any
+            spatial reference system of the coordinates
+
+        Returns
+        -------
+        pd.DataFrame
+            items with the columns x, y, lat and lon
+        """
+        items["x"], items["y"] = transform_points(x, y, srs, self.parent.regionMask.srs)
+        items["lon"], items["lat"] = transform_points(x, y, srs, 4326)
+        return items
+
+    def exclude_footprints(self, items, scale, direction=0, geometry_shape="ellipse"):
+        """
+        Exclude oriented ellipses or rectangles around items, e.g. existing plants, from the availability. The
+        footprints are stamped into the availability directly, see trep.availability.stamp_footprints. Unlike
+        ec.excludePoints with save_to_ec, the footprints are not kept in ec._additional_points. These are only
+        drawn by the ExclusionCalculator and not used by TREP.
+
+        Parameters
+        ----------
+        items : pd.DataFrame
+            items with the columns lat and lon
+        scale : np.ndarray
+            half lengths of the footprints along and transverse to the direction, with shape (n, 2) or (2,)
+        direction : float or np.ndarray, optional
+            direction of the main axis of the footprints in degrees counterclockwise from the x axis, i.e.
+            0: west, 90: south as the wind_dir of Wind, by default 0
+        geometry_shape : str, optional
+            "ellipse" or "rectangle", by default "ellipse"
+
+        Returns
+        -------
+        int
+            number of excluded pixels
+        """
+        region = self.ec.region
+        x, y = transform_points(items["lon"].values, items["lat"].values, 4326, region.srs)
+        return stamp_footprints(region, self.ec._availability, x, y, scale, direction=direction,
+                                shape=geometry_shape)
+
+    def _load_eligible_area(self, path_LE, overwrite_old=False):
+        """
+        Load the existing result of Land Eligible Analysis to ExclusionCalculator.
+
+        Parameters
+        ----------
+        path_LE : str
+            Path to the result of the Land Eligible Analysis. Only the window of the region is read from rasters
+            on the same grid, others are warped to the region in memory.
+        overwrite_old : bool, optional
+            Whether to replace the result with the loaded availability, by default False
+
+        Returns
+        -------
+        dict
+            report of the loaded eligible area
+        """
+        assert os.path.isfile(path_LE), f"Can't find the LE result {path_LE}"
+        if self.is_packed or self.parent.pack_availability:
+            self._packed_availability = PackedAvailability.from_raster(self.parent.regionMask, path_LE)
+            if self._ec is not None:
+                self._ec._availability = None
+            availability = self._packed_availability
+            print("LE result is loaded", flush=True)
+        else:
+            initial_LE = read_region(self.ec.region, path_LE)
+            initial_LE = np.where(initial_LE == 100, 100, 0)
+            self.ec._availability = initial_LE
+            availability = self.ec
+            print("LE result is loaded", flush=True)
+        if overwrite_old:
+            availability.save(path_LE)
+        report_dict = {"Exclusion": "loaded from existing results",
+                       "Total_Area": int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2),
+                       "Eligible_Area": availability.areaAvailable,
+                       "Eligible_Percentage": availability.percentAvailable}
+        return report_dict
+
+    def _run_exclusion(self, exclusion_dict, ec=None, plot_sankey=True, use_net_flows=True, n_jobs=1,
+                       plan=False, single_pass=False, keep_provenance=False):
         """Run exclusion with glaes based on exclusion dict.
 
         Workflow wrapper for GLAES. Some additional functionalities and files
@@ -43,1399 +333,504 @@ class Technology(ABC):
             exclusion calculator, by default None
         plot_sankey : bool, optional
             by default False
+        use_net_flows : bool, optional
+            Whether to report the area excluded by each layer on top of the previous layers (net) or the
+            complete area covered by each layer (gross), by default True
+        n_jobs : int, optional
+            Number of processes used to rasterize the exclusion layers. With n_jobs > 1 the layers are rasterized
+            at the same time and their masks are combined with the availability in the original order as they are
+            finished, which gives the same result as the serial exclusion. Every process holds one availability
+            matrix of the region. By default 1, i.e. serial exclusion.
+        plan : bool, optional
+            Whether to order the layers by their cost and selectivity in earlier runs, see ExclusionPlanner.
+            In serial runs with net flows, layers which cannot change the availability are skipped. The plan is
+            added to the returned dictionary as "exclusion_plan". By default False
+        single_pass : bool, optional
+            Whether to read vector sources, which are used by several layers, only once. The features of all
+            layers of a source within the padded region extent are copied to a temporary file in one scan, from
+            which the layers are excluded with their own where clause and buffer. By default False
+        keep_provenance : bool, optional
+            Whether to keep the first excluding layer of each pixel as exclusion_provenance, e.g. to report the
+            area of each layer in split_by_municipality. The raster holds one byte per pixel of the region.
+            By default False
         """
         print("Start exclusion!")
-        # TODO reomve unused keys and add new keys
-        keys_social = [
-            "health_treatment_buildings", "buildings", "mixed_buildings", "inner_areas", "outer_areas", "residential",
-            "mixed_usage", "5Houses", "cemetery", "10Houses", "industrial_commercial", "military", "recreational",
-            "camping", "historical", "mineral_extraction", "dump_sites", "construction", "buildings_all",
-            "buildings_commercial"
-        ]
-        keys_infrastructre = [
-            "airports", "airfields", "motorway", "primary_roads", "secondary_roads",
-            "regional_roads", "railways", "power_lines", "dvor", "vor", "seismic_station",
-        ]
-        keys_physical = [
-            "water_still", "water_river", "water_stream", "farmland", "grassland", "forests", "forests_outside_FRA",
-            "forests_in_FRA_without_coniferous_forests", "trees"
-        ]
-        keys_eco_tech = [
-            "wind_100m", "wind_100m_era", "wind_100m_power", "elevation", "slope",
-        ]
-        keys_protected = [
-            "birds", "nature_protection", "nationalpark", "habitats", "landscape", "protected",
-            "biospheres_core", "biospheres_develop", "biospheres_maintain"
-        ]
-        implemented_keys = [
-            "airports", "airfields", "health_treatment_buildings", "buildings", "mixed_buildings",
-            "water_still", "water_river", "water_stream", "motorway", "primary_roads", "secondary_roads",
-            "regional_roads", "railways", "power_lines", "farmland", "grassland", "forests",
-            "inner_areas", "outer_areas", "residential", "mixed_usage", "5Houses", "cemetery",
-            "10Houses", "industrial_commercial", "dvor", "vor", "military", "recreational", "available_side_stripes",
-            "camping", "historical", "mineral_extraction", "dump_sites", "construction", "buildings_all",
-            "wind_100m", "wind_100m_era", "wind_100m_power", "elevation", "slope", "seismic_station",
-            "birds", "nature_protection", "nationalpark", "habitats", "landscape", "trees",
-            "protected", "region_edge", "existing", "soft_exclusion", "state", "auxiliary", "forests_outside_FRA",
-            "forests_in_FRA_without_coniferous_forests", "buildings_commercial", "border", "biospheres_core",
-            "biospheres_develop", "biospheres_maintain"
-        ]
         # get the conditions of each key
         exclusion_dict = self._get_exclusion_condition(exclusion_dict)
         for key in exclusion_dict.keys():
-            if key not in implemented_keys:
+            if key not in IMPLEMENTED_KEYS:
                 warnings.warn(
                     f"Key {key} in exclusion dict is not implemented and"
                     + "therefore not excluded. Possible exclusions are"
-                    + f" {implemented_keys}", UserWarning)
+                    + f" {IMPLEMENTED_KEYS}", UserWarning)
         if ec is None:
             _ec = self.ec
         else:
             _ec = ec
-        _datasources_path = self.parent.datasource_path
-        # _osm_path = os.path.join(self.parent.datasource_path, utils.get_osm_path(self.parent._state))
-        _osm_path = os.path.join(self.parent.datasource_path, os.path.join("osm", "merged"))
-        _state_path = os.path.join(
-            _datasources_path, "state_" + self.parent._state)
-        _road_shape_path = os.path.join(_osm_path, "gis_osm_roads_free_1.shp")
-        _intermediate_path = self.parent.intermediate_path
-        _wdpa_path = [
-            os.path.join(
-                _datasources_path, "wdpa", "WDPA_DE.shp")]
+        layers = self._get_exclusion_layers(exclusion_dict)
+        planner = ExclusionPlanner(os.path.join(self.parent.intermediate_path, "exclusion_planner.json"))
+        if plan:
+            layers = planner.order(layers)
+        # skipped layers are reported with zero area, which is only correct for net flows
+        prune = plan and use_net_flows and n_jobs == 1
 
         # get the initial available area
         init_available_areas = _ec.areaAvailable
-        remaining_area = init_available_areas
-        excluded_areas = []
-
-        excluded_areas_social = []
-        labels_social = []
-        excluded_areas_infrastructure = []
-        labels_infrastructure = []
-        excluded_areas_physical = []
-        labels_physical = []
-        excluded_areas_eco_tech = []
-        labels_eco_tech = []
-        excluded_areas_protected = []
-        labels_protected = []
-        # TODO another category only for auxiliary exclusion?
-        excluded_areas_others = []
-        labels_others = []
+        pixel_area = _ec.region.pixelWidth * _ec.region.pixelHeight
+        assert len(layers) < 254, "The provenance raster can only hold 253 layers"
+        # first excluding layer of each pixel, 0 if still available and 255 if not available before the exclusion
+        provenance = self._initial_provenance(_ec._availability)
+        available_pixels = int((provenance == 0).sum())
+        # the area of the region is the same for all layers
+        region_area = self.parent.area
+        gross_pixels = np.zeros(len(layers) + 2, dtype=np.int64)
 
         start = time.time()
-        if exclusion_dict.get("border") is not None:
-            # Urban fabric
-            self._exclude_features(exclusion_dict["border"], _ec,
-                                   intermediate=os.path.join(_intermediate_path,
-                                                             "border_"
-                                                             f"{exclusion_dict['border']['source']}_"
-                                                             f"{exclusion_dict['border']['buffer']}_"
-                                                             f"{self.parent._id}.tif"
-                                                             ),
-                                   plot_sankey=plot_sankey
-                                   )
-            print("Excluded border with " +
-                  f"{exclusion_dict['border']['source']} " +
-                  f"{exclusion_dict['border']['buffer']} " +
-                  f"after {(time.time() - start) / 60} minutes", flush=True)
-        else:
-            print("not excluding border", flush=True)
-        if exclusion_dict.get("motorway") is not None:
-            if isinstance(exclusion_dict['motorway']['path'], (tuple, list)):
-                excluded_area = 0
-                for n in range(len(exclusion_dict['motorway']['path'])):
-                    temp_dict = exclusion_dict["motorway"].copy()
-                    temp_dict["path"] = exclusion_dict["motorway"]["path"][n]
-                    temp_dict["where_text"] = exclusion_dict["motorway"]["where_text"][n]
-                    excluded_area += self._exclude_features(temp_dict, _ec,
-                                                            intermediate=os.path.join(_intermediate_path,
-                                                                                      f"motorway_{n}_"
-                                                                                      f"{exclusion_dict['motorway']['source']}_"
-                                                                                      f"{exclusion_dict['motorway']['buffer']}_"
-                                                                                      f"{self.parent._id}.tif"
-                                                                                      ),
-                                                            plot_sankey=plot_sankey
-                                                            )
-            else:
-                excluded_area = self._exclude_features(exclusion_dict["motorway"], _ec,
-                                                       intermediate=os.path.join(_intermediate_path,
-                                                                                 "motorway_"
-                                                                                 f"{exclusion_dict['motorway']['source']}_"
-                                                                                 f"{exclusion_dict['motorway']['buffer']}_"
-                                                                                 f"{self.parent._id}.tif"
-                                                                                 ),
-                                                       plot_sankey=plot_sankey
-                                                       )
-            print("Excluded motorway with " +
-                  f"{exclusion_dict['motorway']['source']} " +
-                  f"{exclusion_dict['motorway']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Motorways")
-        else:
-            print("not excluding motorway", flush=True)
-        if exclusion_dict.get("primary_roads") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["primary_roads"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "primary_roads_"
-                                                                             f"{exclusion_dict['primary_roads']['source']}_"
-                                                                             f"{exclusion_dict['primary_roads']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded primary_roads with " +
-                  f"{exclusion_dict['primary_roads']['source']} " +
-                  f"{exclusion_dict['primary_roads']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Primary roads")
-        else:
-            print("not excluding primary_roads", flush=True)
-        if exclusion_dict.get("secondary_roads") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["secondary_roads"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "secondary_roads_"
-                                                                             f"{exclusion_dict['secondary_roads']['source']}_"
-                                                                             f"{exclusion_dict['secondary_roads']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded secondary_roads with " +
-                  f"{exclusion_dict['secondary_roads']['source']} " +
-                  f"{exclusion_dict['secondary_roads']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Secondary roads")
-        else:
-            print("not excluding secondary_roads", flush=True)
-        if exclusion_dict.get("railways") is not None:
-            if isinstance(exclusion_dict['railways']['path'], (tuple, list)):
-                excluded_area = 0
-                for n in range(len(exclusion_dict['railways']['path'])):
-                    temp_dict = exclusion_dict["railways"].copy()
-                    temp_dict["path"] = exclusion_dict["railways"]["path"][n]
-                    temp_dict["where_text"] = exclusion_dict["railways"]["where_text"][n]
-                    excluded_area += self._exclude_features(temp_dict, _ec,
-                                                            intermediate=os.path.join(_intermediate_path,
-                                                                                      f"railways_{n}_"
-                                                                                      f"{exclusion_dict['railways']['source']}_"
-                                                                                      f"{exclusion_dict['railways']['buffer']}_"
-                                                                                      f"{self.parent._id}.tif"
-                                                                                      ),
-                                                            plot_sankey=plot_sankey
-                                                            )
-            else:
-                excluded_area = self._exclude_features(exclusion_dict["railways"], _ec,
-                                                       intermediate=os.path.join(_intermediate_path,
-                                                                                 "railways_"
-                                                                                 f"{exclusion_dict['railways']['source']}_"
-                                                                                 f"{exclusion_dict['railways']['buffer']}_"
-                                                                                 f"{self.parent._id}.tif"
-                                                                                 ),
-                                                       plot_sankey=plot_sankey
-                                                       )
-            print("Excluded railways with " +
-                  f"{exclusion_dict['railways']['source']} " +
-                  f"{exclusion_dict['railways']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Railways")
-        else:
-            print("not excluding railways", flush=True)
-        if exclusion_dict.get("power_lines") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["power_lines"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "power_lines_"
-                                                                             f"{exclusion_dict['power_lines']['source']}_"
-                                                                             f"{exclusion_dict['power_lines']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded power line with " +
-                  f"{exclusion_dict['power_lines']['source']} " +
-                  f"{exclusion_dict['power_lines']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Power lines")
-        else:
-            print("not excluding power line", flush=True)
-
-        if exclusion_dict.get("inner_areas") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["inner_areas"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "inner_areas_"
-                                                                             f"{exclusion_dict['inner_areas']['source']}_"
-                                                                             f"{exclusion_dict['inner_areas']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded inner areas with " +
-                  f"{exclusion_dict['inner_areas']['source']} " +
-                  f"{exclusion_dict['inner_areas']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Inner areas")
-        else:
-            print("not excluding inner areas", flush=True)
-
-        if exclusion_dict.get("5Houses") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["5Houses"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "5Houses_"
-                                                                             f"{exclusion_dict['5Houses']['source']}_"
-                                                                             f"{exclusion_dict['5Houses']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded 5Houses with " +
-                  f"{exclusion_dict['5Houses']['source']} " +
-                  f"{exclusion_dict['5Houses']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("5-Houses")
-        else:
-            print("not excluding 5 Houses", flush=True)
-
-        if exclusion_dict.get("10Houses") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["10Houses"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "10Houses_"
-                                                                             f"{exclusion_dict['10Houses']['source']}_"
-                                                                             f"{exclusion_dict['10Houses']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded 10Houses with " +
-                  f"{exclusion_dict['10Houses']['source']} " +
-                  f"{exclusion_dict['10Houses']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("10-Houses")
-        else:
-            print("not excluding 10Houses", flush=True)
-
-        if exclusion_dict.get("outer_areas") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["outer_areas"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "outer_areas_"
-                                                                             f"{exclusion_dict['outer_areas']['source']}_"
-                                                                             f"{exclusion_dict['outer_areas']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            # Urban fabric
-            print("Excluded residential outer areas with " +
-                  f"{exclusion_dict['outer_areas']['source']} " +
-                  f"{exclusion_dict['outer_areas']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Outer areas")
-        else:
-            print("not excluding outer areas", flush=True)
-
-        if exclusion_dict.get("residential") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["residential"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "residential_"
-                                                                             f"{exclusion_dict['residential']['source']}_"
-                                                                             f"{exclusion_dict['residential']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            # Urban fabric
-            print("Excluded residential areas with " +
-                  f"{exclusion_dict['residential']['source']} " +
-                  f"{exclusion_dict['residential']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Residential areas")
-        else:
-            print("not excluding residential areas", flush=True)
-
-        if exclusion_dict.get("mixed_usage") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["mixed_usage"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "mixed_usage_"
-                                                                             f"{exclusion_dict['mixed_usage']['source']}_"
-                                                                             f"{exclusion_dict['mixed_usage']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            # Urban fabric
-            print("Excluded residential mixed used areas with " +
-                  f"{exclusion_dict['mixed_usage']['source']} " +
-                  f"{exclusion_dict['mixed_usage']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Mixed-use areas")
-        else:
-            print("not excluding residential mixed used areas", flush=True)
-
-        if exclusion_dict.get("industrial_commercial") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["industrial_commercial"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "industrial_commercial_"
-                                                                             f"{exclusion_dict['industrial_commercial']['source']}_"
-                                                                             f"{exclusion_dict['industrial_commercial']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded industrial or commercial areas with " +
-                  f"{exclusion_dict['industrial_commercial']['source']} " +
-                  f"{exclusion_dict['industrial_commercial']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Indu & Commer")
-        else:
-            print("not excluding industrial or commercial areas", flush=True)
-        if exclusion_dict.get("secondary_roads") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["secondary_roads"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "secondary_roads_"
-                                                                             f"{exclusion_dict['secondary_roads']['source']}_"
-                                                                             f"{exclusion_dict['secondary_roads']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded secondary_roads with " +
-                  f"{exclusion_dict['secondary_roads']['source']} " +
-                  f"{exclusion_dict['secondary_roads']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Secondary roads")
-        else:
-            print("not excluding secondary_roads", flush=True)
-        if exclusion_dict.get("regional_roads") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["regional_roads"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "regional_roads_"
-                                                                             f"{exclusion_dict['regional_roads']['source']}_"
-                                                                             f"{exclusion_dict['regional_roads']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded regional_roads with " +
-                  f"{exclusion_dict['regional_roads']['source']} " +
-                  f"{exclusion_dict['regional_roads']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Regional roads")
-        else:
-            print("not excluding regional_roads", flush=True)
-        if exclusion_dict.get("buildings") is not None:
-            # residential buildings
-            excluded_area = self._exclude_features(exclusion_dict["buildings"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "buildings_"
-                                                                             f"{exclusion_dict['buildings']['source']}_"
-                                                                             f"{exclusion_dict['buildings']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded buildings with "
-                  f"{exclusion_dict['buildings']['source']} " +
-                  f"{exclusion_dict['buildings']['buffer']} " +
-                  f"after {(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            remaining_area = _ec.areaAvailable
-            excluded_areas_social.append(excluded_area)
-            labels_social.append("Residential buildings")
-        else:
-            print("not excluding buildings", flush=True)
-        if exclusion_dict.get("buildings_commercial") is not None:
-            # commercial buildings
-            excluded_area = self._exclude_features(exclusion_dict["buildings_commercial"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "buildings_commercial_"
-                                                                             f"{exclusion_dict['buildings_commercial']['source']}_"
-                                                                             f"{exclusion_dict['buildings_commercial']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded buildings_commercial with "
-                  f"{exclusion_dict['buildings_commercial']['source']} " +
-                  f"{exclusion_dict['buildings_commercial']['buffer']} " +
-                  f"after {(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            remaining_area = _ec.areaAvailable
-            excluded_areas_social.append(excluded_area)
-            labels_social.append("Commercial buildings")
-        else:
-            print("not excluding buildings_commercial", flush=True)
-        if exclusion_dict.get("buildings_all") is not None:
-            # all buildings
-            excluded_area = self._exclude_features(exclusion_dict["buildings_all"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "buildings_all_"
-                                                                             f"{exclusion_dict['buildings_all']['source']}_"
-                                                                             f"{exclusion_dict['buildings_all']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded buildings_all with "
-                  f"{exclusion_dict['buildings_all']['source']} " +
-                  f"{exclusion_dict['buildings_all']['buffer']} " +
-                  f"after {(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            remaining_area = _ec.areaAvailable
-            excluded_areas_social.append(excluded_area)
-            labels_social.append("Buildings")
-        else:
-            print("not excluding buildings_all", flush=True)
-        if exclusion_dict.get("mixed_buildings") is not None:
-            # Urban fabric
-            excluded_area = self._exclude_features(exclusion_dict["mixed_buildings"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "mixed_buildings_"
-                                                                             f"{exclusion_dict['mixed_buildings']['source']}_"
-                                                                             f"{exclusion_dict['mixed_buildings']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded mixed_buildings with " +
-                  f"{exclusion_dict['mixed_buildings']['source']} " +
-                  f"{exclusion_dict['mixed_buildings']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Mixed-use buildings")
-        else:
-            print("not excluding mixed buildings", flush=True)
-        if exclusion_dict.get("health_treatment_buildings") is not None:
-            # Urban fabric
-            excluded_area = self._exclude_features(exclusion_dict["health_treatment_buildings"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "health_treatment_buildings_"
-                                                                             f"{exclusion_dict['health_treatment_buildings']['source']}_"
-                                                                             f"{exclusion_dict['health_treatment_buildings']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded health_treatment_buildings with " +
-                  f"{exclusion_dict['health_treatment_buildings']['source']} " +
-                  f"{exclusion_dict['health_treatment_buildings']['buffer']} " +
-                  f"after {(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            remaining_area = _ec.areaAvailable
-            excluded_areas_social.append(excluded_area)
-            labels_social.append("Health treatment buildings")
-        else:
-            print("not excluding treatment_buildings buildings", flush=True)
-        if exclusion_dict.get("water_still") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["water_still"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "water_still_"
-                                                                             f"{exclusion_dict['water_still']['source']}_"
-                                                                             f"{exclusion_dict['water_still']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded water_still with " +
-                  f"{exclusion_dict['water_still']['source']} " +
-                  f"{exclusion_dict['water_still']['buffer']}" +
-                  f" after {(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Lakes")
-        else:
-            print("not excluding still water", flush=True)
-        if exclusion_dict.get("water_river") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["water_river"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "water_river_"
-                                                                             f"{exclusion_dict['water_river']['source']}_"
-                                                                             f"{exclusion_dict['water_river']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded water_river with " +
-                  f"{exclusion_dict['water_river']['source']} " +
-                  f"{exclusion_dict['water_river']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Rivers")
-        else:
-            print("not excluding rivers", flush=True)
-        if exclusion_dict.get("water_stream") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["water_stream"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "water_stream_"
-                                                                             f"{exclusion_dict['water_stream']['source']}_"
-                                                                             f"{exclusion_dict['water_stream']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded streams with " +
-                  f"{exclusion_dict['water_stream']['source']} " +
-                  f"{exclusion_dict['water_stream']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Streams")
-        else:
-            print("not excluding streams", flush=True)
-        if exclusion_dict.get("farmland") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["farmland"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "farmland_"
-                                                                             f"{exclusion_dict['farmland']['source']}_"
-                                                                             f"{exclusion_dict['farmland']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded farmland with " +
-                  f"{exclusion_dict['farmland']['source']} " +
-                  f"{exclusion_dict['farmland']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Farmlands")
-        else:
-            print("not excluding farmland", flush=True)
-        if exclusion_dict.get("grassland") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["grassland"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "grassland_"
-                                                                             f"{exclusion_dict['grassland']['source']}_"
-                                                                             f"{exclusion_dict['grassland']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded grassland with " +
-                  f"{exclusion_dict['grassland']['source']} " +
-                  f"{exclusion_dict['grassland']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Grassland")
-        else:
-            print("not excluding grassland", flush=True)
-        if exclusion_dict.get("forests") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["forests"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "forests_"
-                                                                             f"{exclusion_dict['forests']['source']}_"
-                                                                             f"{exclusion_dict['forests']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded forests with " +
-                  f"{exclusion_dict['forests']['source']} " +
-                  f"{exclusion_dict['forests']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Forests")
-        else:
-            print("not excluding forests", flush=True)
-        if exclusion_dict.get("forests_outside_FRA") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["forests_outside_FRA"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "forests_outside_FRA_"
-                                                                             f"{exclusion_dict['forests_outside_FRA']['source']}_"
-                                                                             f"{exclusion_dict['forests_outside_FRA']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded forests_outside_FRA with " +
-                  f"{exclusion_dict['forests_outside_FRA']['source']} " +
-                  f"{exclusion_dict['forests_outside_FRA']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Forests outside FRA")
-        else:
-            print("not excluding forests_outside_FRA", flush=True)
-        if exclusion_dict.get("forests_in_FRA_without_coniferous_forests") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["forests_in_FRA_without_coniferous_forests"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "forests_in_FRA_without_coniferous_forests_"
-                                                                             f"{exclusion_dict['forests_in_FRA_without_coniferous_forests']['source']}_"
-                                                                             f"{exclusion_dict['forests_in_FRA_without_coniferous_forests']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded forests_in_FRA_without_coniferous_forests with " +
-                  f"{exclusion_dict['forests_in_FRA_without_coniferous_forests']['source']} " +
-                  f"{exclusion_dict['forests_in_FRA_without_coniferous_forests']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("NC forests in FRA")
-        else:
-            print("not excluding forests_in_FRA_without_coniferous_forests", flush=True)
-        if exclusion_dict.get("trees") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["trees"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "trees_"
-                                                                             f"{exclusion_dict['trees']['source']}_"
-                                                                             f"{exclusion_dict['trees']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded trees with " +
-                  f"{exclusion_dict['trees']['source']} " +
-                  f"{exclusion_dict['trees']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_physical.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_physical.append("Trees")
-        else:
-            print("not excluding trees", flush=True)
-
-        if exclusion_dict.get("airports") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["airports"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "airports_"
-                                                                             f"{exclusion_dict['airports']['source']}_"
-                                                                             f"{exclusion_dict['airports']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded airports with " +
-                  f"{exclusion_dict['airports']['source']} " +
-                  f"{exclusion_dict['airports']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Airports")
-        else:
-            print("not excluding airports", flush=True)
-
-        if exclusion_dict.get("airfields") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["airfields"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "airfields_"
-                                                                             f"{exclusion_dict['airfields']['source']}_"
-                                                                             f"{exclusion_dict['airfields']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded airfields with " +
-                  f"{exclusion_dict['airfields']['source']} " +
-                  f"{exclusion_dict['airfields']['buffer']} after " +
+        if n_jobs > 1 and "fork" not in mp.get_all_start_methods():
+            warnings.warn("Parallel exclusion requires the 'fork' start method. Falling back to serial exclusion.")
+            n_jobs = 1
+        if single_pass:
+            shared_source_path = tempfile.mkdtemp(prefix="trep_")
+            self._prepare_shared_sources(layers, shared_source_path)
+        if n_jobs > 1:
+            layer_masks = self._rasterize_layers_parallel(layers, n_jobs)
+        exclusion_plan = []
+        for layer_id, layer in enumerate(layers, start=1):
+            layer_start = time.time()
+            rank = planner.rank(layer)
+            skip_reason = None
+            if prune:
+                skip_reason = planner.skip_reason(layer, _ec)
+            if skip_reason is None:
+                net_pixels = 0
+                rasterize_seconds = 0
+                for part in layer["parts"]:
+                    if n_jobs > 1:
+                        mask, part_seconds = next(layer_masks)
+                        rasterize_seconds += part_seconds
+                        # masks of the workers are shared with the other technologies by the parent process
+                        self._share_layer_mask(part, _ec, mask)
+                    else:
+                        mask = self._layer_mask(part, _ec)
+                    _gross_pixels, _net_pixels = self._apply_layer_mask(mask, _ec._availability, provenance, layer_id)
+                    gross_pixels[layer_id] += _gross_pixels
+                    net_pixels += _net_pixels
+                print(f"Excluded {layer['key']} with {layer['description']} "
+                      f"after {(time.time() - start) / 60} minutes", flush=True)
+                if n_jobs > 1:
+                    seconds = rasterize_seconds
+                else:
+                    seconds = time.time() - layer_start
+                planner.record(layer, seconds, net_pixels / available_pixels if available_pixels > 0 else 0,
+                               region_area)
+                available_pixels -= net_pixels
+            else:
+                seconds = time.time() - layer_start
+                print(f"Skipped {layer['key']}: {skip_reason}", flush=True)
+            exclusion_plan.append(dict(key=layer["key"], rank=rank, seconds=seconds,
+                                       skipped=skip_reason))
+        if n_jobs > 1:
+            layer_masks.close()
+        if single_pass:
+            shutil.rmtree(shared_source_path, ignore_errors=True)
+        if plan:
+            planner.save()
+            exclusion_dict["exclusion_plan"] = exclusion_plan
+
+        region_edge_id = len(layers) + 1
+        if exclusion_dict.get("region_edge") is not None:
+            available = _ec._availability > 0
+            _ec.excludeRegionEdge(exclusion_dict.get("region_edge"))
+            provenance[available & (_ec._availability == 0)] = region_edge_id
+            print("Excluded region edge with " +
+                  f"{exclusion_dict['region_edge']} after " +
                   f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Airfields")
         else:
-            print("not excluding airfields", flush=True)
+            print("not excluding region buffer", flush=True)
 
-        if exclusion_dict.get("dvor"):
-            excluded_area = self._exclude_features(exclusion_dict["dvor"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "dvor_"
-                                                                             f"{exclusion_dict['dvor']['source']}_"
-                                                                             f"{exclusion_dict['dvor']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded radio navigator D-VOR with " +
-                  f"{exclusion_dict['dvor']['source']} " +
-                  f"{exclusion_dict['dvor']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("D-VOR")
-        else:
-            print("not excluding radio navigator D-VOR", flush=True)
+        # net flows of all layers from one histogram of the provenance raster
+        net_pixels = np.bincount(provenance.ravel(), minlength=256)
+        self.exclusion_provenance = provenance if keep_provenance else None
+        self.exclusion_provenance_keys = [None] + [layer["key"] for layer in layers] + ["region_edge"]
+        exclusion_dict["layer_statistics"] = self._layer_statistics(self.exclusion_provenance_keys, net_pixels,
+                                                                     gross_pixels, pixel_area)
+        if plot_sankey:
+            self._save_layer_sankey(layers, net_pixels, gross_pixels, pixel_area, init_available_areas,
+                                    _ec.areaAvailable, use_net_flows=use_net_flows)
+        return exclusion_dict
 
-        if exclusion_dict.get("vor"):
-            excluded_area = self._exclude_features(exclusion_dict["vor"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "vor_"
-                                                                             f"{exclusion_dict['vor']['source']}_"
-                                                                             f"{exclusion_dict['vor']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded radio navigator VOR with " +
-                  f"{exclusion_dict['vor']['source']} " +
-                  f"{exclusion_dict['vor']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("VOR")
-        else:
-            print("not excluding radio navigator VOR", flush=True)
+    def sweep(self, exclusion_dicts, prune=True, return_availability=False):
+        """
+        Evaluate several variants of the exclusion against the current availability.
 
-        if exclusion_dict.get("seismic_station"):
-            excluded_area = self._exclude_features(exclusion_dict["seismic_station"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "seismic_station_"
-                                                                             f"{exclusion_dict['seismic_station']['source']}_"
-                                                                             f"{exclusion_dict['seismic_station']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded radio navigator seismic station with " +
-                  f"{exclusion_dict['seismic_station']['source']} " +
-                  f"{exclusion_dict['seismic_station']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_infrastructure.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_infrastructure.append("Seismic station")
-        else:
-            print("not excluding seismic station", flush=True)
+        Every part of an exclusion layer, which is used by several variants with the same source, where clause,
+        buffer and value, is rasterized only once. Vector parts used with different buffers are taken from one
+        distance raster, see _distance_raster. The masks are kept bit-packed in memory and combined with a copy
+        of the availability for each variant, so the availability of the technology is not changed.
 
-        if exclusion_dict.get("military") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["military"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "military_"
-                                                                             f"{exclusion_dict['military']['source']}_"
-                                                                             f"{exclusion_dict['military']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded military landuse with " +
-                  f"{exclusion_dict['military']['source']} " +
-                  f"{exclusion_dict['military']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Military")
-        else:
-            print("not excluding military", flush=True)
+        Only the exclusion layers and the region edge are evaluated. Technology specific steps of run_exclusion,
+        e.g. the exclusion of existing plants or of small areas, are not part of the sweep.
 
-        if exclusion_dict.get("cemetery") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["cemetery"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "cemetery_"
-                                                                             f"{exclusion_dict['cemetery']['source']}_"
-                                                                             f"{exclusion_dict['cemetery']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded cemetery areas with " +
-                  f"{exclusion_dict['cemetery']['source']} " +
-                  f"{exclusion_dict['cemetery']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Cemetery")
-        else:
-            print("not excluding cemetery", flush=True)
+        Parameters
+        ----------
+        exclusion_dicts : dict or list
+            Variants of the exclusion, either as dictionary {name: exclusion_dict} or as list. An exclusion_dict
+            can be given as name of a config file in data/config. Variants in a list are named by their config
+            file or their index.
+        prune : bool, optional
+            Whether to stop the evaluation of a variant as soon as no area is available anymore, by default True
+        return_availability : bool, optional
+            Whether to add the availability matrix of each variant to its report, by default False
 
-        if exclusion_dict.get("recreational") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["recreational"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "recreational_"
-                                                                             f"{exclusion_dict['recreational']['source']}_"
-                                                                             f"{exclusion_dict['recreational']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded recreational areas with " +
-                  f"{exclusion_dict['recreational']['source']} " +
-                  f"{exclusion_dict['recreational']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Recreational areas")
-        else:
-            print("not excluding recreational", flush=True)
+        Returns
+        -------
+        dict
+            report of each variant with eligible area and the statistics of its layers
+        """
+        if isinstance(exclusion_dicts, (list, tuple)):
+            exclusion_dicts = {(d if isinstance(d, str) else f"variant_{i}"): d for i, d in enumerate(exclusion_dicts)}
+        variants = {}
+        for name, exclusion_dict in exclusion_dicts.items():
+            if isinstance(exclusion_dict, str):
+                exclusion_dict = self.load_exclusionDict(exclusion_dict)
+            exclusion_dict = self._get_exclusion_condition(copy.deepcopy(exclusion_dict))
+            variants[name] = (exclusion_dict, self._get_exclusion_layers(exclusion_dict))
+
+        # vector parts, which are used with several buffers, are taken from their distance raster
+        buffers = {}
+        for exclusion_dict, layers in variants.values():
+            for layer in layers:
+                for part in layer["parts"]:
+                    if self._is_vector_part(part):
+                        buffers.setdefault(self._part_key(part, buffer=False), set()).add(
+                            part["feature_dict"].get("buffer") or 0)
+
+        ec = self.ec
+        region = ec.region
+        base_availability = ec._availability.copy()
+        pixel_area = region.pixelWidth * region.pixelHeight
+        masks = {}
+        start = time.time()
 
-        if exclusion_dict.get("camping") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["camping"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "camping_"
-                                                                             f"{exclusion_dict['camping']['source']}_"
-                                                                             f"{exclusion_dict['camping']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded camping sites with " +
-                  f"{exclusion_dict['camping']['source']} " +
-                  f"{exclusion_dict['camping']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Camping sites")
-        else:
-            print("not excluding camping", flush=True)
+        def _get_mask(part):
+            key = self._part_key(part)
+            if key not in masks:
+                buffer = part["feature_dict"].get("buffer") or 0
+                if self._is_vector_part(part) and len(buffers[self._part_key(part, buffer=False)]) > 1 and \
+                        buffer <= self.parent.max_distance:
+                    mask = (self._distance_raster(part, ec) <= buffer) & region.mask
+                else:
+                    mask = self._layer_mask(part, ec)
+                masks[key] = np.packbits(mask)
+                print(f"Rasterized {part['name']} after {(time.time() - start) / 60} minutes", flush=True)
+            return np.unpackbits(masks[key], count=region.mask.size).reshape(region.mask.shape).view(bool)
+
+        region_edges = {}
+
+        def _get_region_edge(region_edge):
+            if region_edge not in region_edges:
+                ec._availability = self._full_availability(region.mask, base_availability.dtype)
+                try:
+                    ec.excludeRegionEdge(region_edge)
+                    region_edges[region_edge] = (ec._availability == 0) & region.mask
+                finally:
+                    ec._availability = base_availability.copy()
+            return region_edges[region_edge]
+
+        reports = {}
+        for name, (exclusion_dict, layers) in variants.items():
+            availability = base_availability.copy()
+            provenance = self._initial_provenance(availability)
+            gross_pixels = np.zeros(len(layers) + 2, dtype=np.int64)
+            for layer_id, layer in enumerate(layers, start=1):
+                if prune and not availability.any():
+                    break
+                for part in layer["parts"]:
+                    _gross_pixels, _ = self._apply_layer_mask(_get_mask(part), availability, provenance, layer_id)
+                    gross_pixels[layer_id] += _gross_pixels
+            if exclusion_dict.get("region_edge") is not None:
+                _gross_pixels, _ = self._apply_layer_mask(_get_region_edge(exclusion_dict["region_edge"]),
+                                                          availability, provenance, len(layers) + 1)
+                gross_pixels[len(layers) + 1] += _gross_pixels
+            net_pixels = np.bincount(provenance.ravel(), minlength=256)
+            keys = [None] + [layer["key"] for layer in layers] + ["region_edge"]
+            eligible_pixels = int(net_pixels[0])
+            reports[name] = {"Exclusion": name,
+                             "Total_Area": int(region.mask.sum() * pixel_area),
+                             "Eligible_Area": eligible_pixels * pixel_area,
+                             "Eligible_Percentage": 100 * eligible_pixels / region.mask.sum(),
+                             "layer_statistics": self._layer_statistics(keys, net_pixels, gross_pixels,
+                                                                        pixel_area)}
+            if return_availability:
+                reports[name]["availability"] = availability
+            print(f"Evaluated {name} after {(time.time() - start) / 60} minutes", flush=True)
+        print(f"Evaluated {len(reports)} variants with {len(masks)} rasterized layers", flush=True)
+        return reports
+
+    def run_exclusion_tiled(self, exclusion_dict, output=None, tile_size=4096, n_jobs=1, plot_sankey=True,
+                            use_net_flows=True):
+        """
+        Run the exclusion tile by tile and write the available area to a raster.
 
-        if exclusion_dict.get("historical") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["historical"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "historical_"
-                                                                             f"{exclusion_dict['historical']['source']}_"
-                                                                             f"{exclusion_dict['historical']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded historical sites with " +
-                  f"{exclusion_dict['historical']['source']} " +
-                  f"{exclusion_dict['historical']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Historical sites")
-        else:
-            print("not excluding historical sites", flush=True)
+        The region is split into tiles of tile_size x tile_size pixels. Each tile is padded by the largest buffer
+        of the exclusion dict (clipped to the region extent), so that features outside of the tile are
+        considered as in a single run and the result is identical to _run_exclusion. Only the memory of the
+        padded tiles is needed for the exclusion, the ExclusionCalculator of the technology is not changed.
+        Use load_eligible_area to load the result.
 
-        if exclusion_dict.get("mineral_extraction") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["mineral_extraction"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "mineral_extraction_"
-                                                                             f"{exclusion_dict['mineral_extraction']['source']}_"
-                                                                             f"{exclusion_dict['mineral_extraction']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded mineral extraction with " +
-                  f"{exclusion_dict['mineral_extraction']['source']} " +
-                  f"{exclusion_dict['mineral_extraction']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Mineral extraction sites")
-        else:
-            print(f"Didn't exclude mineral extraction", flush=True)
+        Parameters
+        ----------
+        exclusion_dict : dict or str
+            Dictionary containing the information for the exclusion or name of a config in data/config
+        output : str, optional
+            Path to the resulting raster, by default {technology}_potential_area.tif in the result path
+        tile_size : int, optional
+            Number of rows and columns of a tile without padding, by default 4096
+        n_jobs : int, optional
+            Number of processes excluding tiles at the same time, by default 1
+        plot_sankey : bool, optional
+            by default True
+        use_net_flows : bool, optional
+            see _run_exclusion, by default True
 
-        if exclusion_dict.get("dump_sites") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["dump_sites"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "dump_sites_"
-                                                                             f"{exclusion_dict['dump_sites']['source']}_"
-                                                                             f"{exclusion_dict['dump_sites']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded dump sites with " +
-                  f"{exclusion_dict['dump_sites']['source']} " +
-                  f"{exclusion_dict['dump_sites']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Dump sites")
-        else:
-            print("not excluding dump sites", flush=True)
+        Returns
+        -------
+        dict
+            The exclusion dict with the "layer_statistics"
+        """
+        if isinstance(exclusion_dict, str):
+            exclusion_dict = self.load_exclusionDict(exclusion_dict)
+        exclusion_dict = self._get_exclusion_condition(exclusion_dict)
+        if output is None:
+            output = os.path.join(self.result_path, f"{type(self).__name__}_potential_area.tif")
+        layers = self._get_exclusion_layers(exclusion_dict)
+        for layer in layers:
+            for part in layer["parts"]:
+                # intermediates of tiles are not reused
+                part["intermediate"] = None
+        assert len(layers) < 254, "The provenance raster can only hold 253 layers"
+        region = self.parent.regionMask
+        pad = max([0] + [part["feature_dict"].get("buffer") or 0 for layer in layers for part in layer["parts"]])
+        pad = max(pad, exclusion_dict.get("region_edge") or 0)
+        pad = int(np.ceil(pad / min(region.pixelWidth, region.pixelHeight))) + 1
+        # the region edge is excluded with the geometry of the whole region instead of the tile
+        region_vector = None
+        if exclusion_dict.get("region_edge") is not None:
+            region_vector_path = tempfile.mkdtemp(prefix="trep_")
+            region_vector = os.path.join(region_vector_path, "region.shp")
+            gk.vector.createVector(region.geometry, output=region_vector)
+        height, width = region.mask.shape
+        tiles = []
+        for row in range(0, height, tile_size):
+            for col in range(0, width, tile_size):
+                window = (row, min(row + tile_size, height), col, min(col + tile_size, width))
+                if region.mask[window[0]:window[1], window[2]:window[3]].any():
+                    tiles.append(window)
+        print(f"Start tiled exclusion of {len(tiles)} tiles with a padding of {pad} pixels", flush=True)
+
+        extent = region.extent
+        ds = gdal.GetDriverByName("GTiff").Create(output, width, height, 1, gdal.GDT_Byte,
+                                                  options=["COMPRESS=DEFLATE", "TILED=YES", "BIGTIFF=IF_SAFER"])
+        ds.SetGeoTransform((extent.xMin, region.pixelWidth, 0, extent.yMax, 0, -region.pixelHeight))
+        ds.SetProjection(region.srs.ExportToWkt())
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(255)
+        band.Fill(255)
+        net_pixels = np.zeros(256, dtype=np.int64)
+        gross_pixels = np.zeros(len(layers) + 2, dtype=np.int64)
+        init_pixels = 0
+
+        def _write(tile, result):
+            nonlocal init_pixels
+            availability, _net_pixels, _gross_pixels, _init_pixels = result
+            band.WriteArray(availability, tile[2], tile[0])
+            net_pixels[:] += _net_pixels
+            gross_pixels[:] += _gross_pixels
+            init_pixels += _init_pixels
 
-        if exclusion_dict.get("construction") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["construction"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "construction_"
-                                                                             f"{exclusion_dict['construction']['source']}_"
-                                                                             f"{exclusion_dict['construction']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded construction sites with " +
-                  f"{exclusion_dict['construction']['source']} " +
-                  f"{exclusion_dict['construction']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_social.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_social.append("Construction sites")
-        else:
-            print("not excluding construction sites", flush=True)
+        start = time.time()
+        try:
+            if n_jobs > 1 and "fork" in mp.get_all_start_methods():
+                _PARALLEL_EXCLUSION.update(technology=self, tiles=tiles, layers=layers, pad=pad,
+                                           region_edge=exclusion_dict.get("region_edge"),
+                                           region_vector=region_vector)
+                try:
+                    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("fork")) as pool:
+                        futures = {pool.submit(_exclude_tile, i): i for i in range(len(tiles))}
+                        for n, future in enumerate(as_completed(futures)):
+                            _write(tiles[futures[future]], future.result())
+                            print(f"Excluded tile {n + 1}/{len(tiles)} after {(time.time() - start) / 60} minutes",
+                                  flush=True)
+                finally:
+                    _PARALLEL_EXCLUSION.clear()
+            else:
+                for n, tile in enumerate(tiles):
+                    _write(tile, self._exclude_tile(tile, layers, pad, exclusion_dict.get("region_edge"),
+                                                    region_vector))
+                    print(f"Excluded tile {n + 1}/{len(tiles)} after {(time.time() - start) / 60} minutes",
+                          flush=True)
+        finally:
+            band.FlushCache()
+            band = None
+            ds = None
+            if region_vector is not None:
+                shutil.rmtree(region_vector_path, ignore_errors=True)
+
+        pixel_area = region.pixelWidth * region.pixelHeight
+        keys = [None] + [layer["key"] for layer in layers] + ["region_edge"]
+        exclusion_dict["layer_statistics"] = self._layer_statistics(keys, net_pixels, gross_pixels, pixel_area)
+        if plot_sankey:
+            self._save_layer_sankey(layers, net_pixels, gross_pixels, pixel_area, init_pixels * pixel_area,
+                                    net_pixels[0] * pixel_area, use_net_flows=use_net_flows)
+        return exclusion_dict
 
-        if exclusion_dict.get("wind_100m") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["wind_100m"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "wind_100m_"
-                                                                             f"{exclusion_dict['wind_100m']['source']}_"
-                                                                             f"{exclusion_dict['wind_100m']['value']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(
-                "Excluded wind_100m with " +
-                f"{exclusion_dict['wind_100m']['source']} " +
-                f"{exclusion_dict['wind_100m']['value']} after " +
-                f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_eco_tech.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_eco_tech.append("Wind speed at 100m")
-        else:
-            print("not excluding wind100m", flush=True)
-        if exclusion_dict.get("wind_100m_era") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["wind_100m_era"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "wind_100m_era_"
-                                                                             f"{exclusion_dict['wind_100m_era']['source']}_"
-                                                                             f"{exclusion_dict['wind_100m_era']['value']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded wind_100m from era with " +
-                  f"{exclusion_dict['wind_100m_era']['source']} " +
-                  f"{exclusion_dict['wind_100m_era']['value']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_eco_tech.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_eco_tech.append("Wind speed at 100m")
-        else:
-            print("not excluding wind100m from era", flush=True)
-        if exclusion_dict.get("wind_100m_power") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["wind_100m_power"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "wind_100m_power_"
-                                                                             f"{exclusion_dict['wind_100m_power']['source']}_"
-                                                                             f"{exclusion_dict['wind_100m_power']['value']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print("Excluded wind_100m power density with " +
-                  f"{exclusion_dict['wind_100m_power']['source']} " +
-                  f"{exclusion_dict['wind_100m_power']['value']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_eco_tech.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_eco_tech.append("Wind power at 100m")
-        else:
-            print("not excluding 100m power density", flush=True)
-        if exclusion_dict.get("elevation") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["elevation"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "elevation_"
-                                                                             f"{exclusion_dict['elevation']['source']}_"
-                                                                             f"{exclusion_dict['elevation']['value']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(
-                "Excluded elevation with " +
-                f"{exclusion_dict['elevation']['source']} " +
-                f"{exclusion_dict['elevation']['value']} after " +
-                f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_eco_tech.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_eco_tech.append("Elevation")
-        else:
-            print("not excluding elevation", flush=True)
-        if exclusion_dict.get("slope") is not None:
-            slope_dict = exclusion_dict["slope"].copy()
-            # convert slope (degree) in DN (copernicus)
-            slope_dict["value"] = (exclusion_dict['slope']['value'][1],
-                                   250 * np.cos(np.pi / 180 * exclusion_dict['slope']['value'][0]))
-            excluded_area = self._exclude_features(slope_dict, _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "slope_"
-                                                                             f"{exclusion_dict['slope']['source']}_"
-                                                                             f"{exclusion_dict['slope']['value']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            # slope_raster = gk.raster.gradient(elevation_raster, factor=1)
-            print("Excluded slope with " +
-                  f"{exclusion_dict['slope']['source']} " +
-                  f"{exclusion_dict['slope']['value']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_eco_tech.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_eco_tech.append("Slope")
-        else:
-            print("not excluding slope", flush=True)
+    def _exclude_tile(self, tile, layers, pad, region_edge=None, region_vector=None):
+        """
+        Exclude all layers on one padded tile of the region, see run_exclusion_tiled.
 
-        if exclusion_dict.get("birds") is not None:
-            # 300m to Bird protection areas and "Naturschutzgebieten"
-            excluded_area = self._exclude_features(exclusion_dict["birds"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "birds_"
-                                                                             f"{exclusion_dict['birds']['source']}_"
-                                                                             f"{exclusion_dict['birds']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded birds protected areas with " +
-                  f"{exclusion_dict['birds']['source']} " +
-                  f"{exclusion_dict['birds']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Birds")
+        Returns
+        -------
+        tuple
+            Availability of the tile without padding (0, 100 and 255 outside the region), net and gross pixel
+            counts of the layers and the number of initially available pixels of the tile
+        """
+        region = self.parent.regionMask
+        height, width = region.mask.shape
+        row_start, row_stop, col_start, col_stop = tile
+        rows = slice(max(row_start - pad, 0), min(row_stop + pad, height))
+        cols = slice(max(col_start - pad, 0), min(col_stop + pad, width))
+        extent = region.extent
+        tile_extent = gk.Extent(extent.xMin + cols.start * region.pixelWidth,
+                                extent.yMax - rows.stop * region.pixelHeight,
+                                extent.xMin + cols.stop * region.pixelWidth,
+                                extent.yMax - rows.start * region.pixelHeight,
+                                srs=region.srs)
+        tile_mask = region.mask[rows, cols]
+        ec = gl.ExclusionCalculator(gk.RegionMask.fromMask(tile_extent, tile_mask))
+        # start from the current availability of the technology
+        if self._packed_availability is not None:
+            initial = self._packed_availability._unpack_rows(rows.start, rows.stop)[:, cols]
         else:
-            print("not excluding birds protected areas", flush=True)
+            initial = self._ec._availability[rows, cols] > 0
+        ec._availability = self._full_availability(initial & tile_mask)
+        provenance = self._initial_provenance(ec._availability)
+        core = (slice(row_start - rows.start, row_stop - rows.start),
+                slice(col_start - cols.start, col_stop - cols.start))
+        init_pixels = int((provenance[core] == 0).sum())
+        gross_pixels = np.zeros(len(layers) + 2, dtype=np.int64)
+        for layer_id, layer in enumerate(layers, start=1):
+            for part in layer["parts"]:
+                mask = self._layer_mask(part, ec)
+                self._apply_layer_mask(mask, ec._availability, provenance, layer_id)
+                gross_pixels[layer_id] += mask[core].sum()
+        if region_edge is not None:
+            available = ec._availability > 0
+            # same as ExclusionCalculator.excludeRegionEdge for the whole region
+            ec.excludeVectorType(region_vector, buffer=-region_edge, invert=True)
+            provenance[available & (ec._availability == 0)] = len(layers) + 1
+        net_pixels = np.bincount(provenance[core].ravel(), minlength=256)
+        availability = np.where(tile_mask[core], ec._availability[core], np.uint8(255)).astype(np.uint8, copy=False)
+        return availability, net_pixels, gross_pixels, init_pixels
 
-        if exclusion_dict.get("nature_protection") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["nature_protection"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "nature_protection_"
-                                                                             f"{exclusion_dict['nature_protection']['source']}_"
-                                                                             f"{exclusion_dict['nature_protection']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded nature_protection protected areas with " +
-                  f"{exclusion_dict['nature_protection']['source']} " +
-                  f"{exclusion_dict['nature_protection']['buffer']}"
-                  f" after {(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Nature protection areas")
-        else:
-            print("not excluding nature_protection", flush=True)
+    @staticmethod
+    def _initial_provenance(availability):
+        """Return the provenance raster before the exclusion: 0 if available and 255 if not available. The raster
+        is created as uint8, so no temporary array of a larger type is needed."""
+        provenance = np.full(availability.shape, 255, dtype=np.uint8)
+        provenance[availability > 0] = 0
+        return provenance
 
-        if exclusion_dict.get("nationalpark") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["nationalpark"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "nationalpark_"
-                                                                             f"{exclusion_dict['nationalpark']['source']}_"
-                                                                             f"{exclusion_dict['nationalpark']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded national park protected areas with " +
-                  f"{exclusion_dict['nationalpark']['source']} " +
-                  f"{exclusion_dict['nationalpark']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("National parks")
-        else:
-            print("not excluding nationa lpark protected areas", flush=True)
+    @staticmethod
+    def _full_availability(mask, dtype=np.uint8):
+        """Return an availability of 100 within a mask and 0 outside, created without a temporary int64 array."""
+        availability = np.zeros(mask.shape, dtype=dtype)
+        availability[mask] = 100
+        return availability
 
-        if exclusion_dict.get("habitats") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["habitats"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "habitats_"
-                                                                             f"{exclusion_dict['habitats']['source']}_"
-                                                                             f"{exclusion_dict['habitats']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded habitats protected areas with " +
-                  f"{exclusion_dict['habitats']['source']} " +
-                  f"{exclusion_dict['habitats']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Habitats")
-        else:
-            print("not excluding habitats protected areas", flush=True)
+    @staticmethod
+    def _layer_statistics(keys, net_pixels, gross_pixels, pixel_area):
+        """Return net and gross area of each layer from the pixel counts of the provenance raster."""
+        return {
+            key: dict(net_area=float(net_pixels[layer_id] * pixel_area),
+                      gross_area=float(gross_pixels[layer_id] * pixel_area))
+            for layer_id, key in enumerate(keys) if key is not None
+        }
 
-        if exclusion_dict.get("landscape") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["landscape"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "landscape_"
-                                                                             f"{exclusion_dict['landscape']['source']}_"
-                                                                             f"{exclusion_dict['landscape']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded landscape protected areas with " +
-                  f"{exclusion_dict['landscape']['source']} " +
-                  f"{exclusion_dict['landscape']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Landscape protected areas")
-        else:
-            print("not excluding landscape protected areas", flush=True)
-        if exclusion_dict.get("biospheres_core") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["biospheres_core"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "biospheres_core_"
-                                                                             f"{exclusion_dict['biospheres_core']['source']}_"
-                                                                             f"{exclusion_dict['biospheres_core']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded biospheres core zone with " +
-                  f"{exclusion_dict['biospheres_core']['source']} " +
-                  f"{exclusion_dict['biospheres_core']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
+    def _save_layer_sankey(self, layers, net_pixels, gross_pixels, pixel_area, init_available_areas,
+                           remaining_area, use_net_flows=True):
+        """Write the sankey config from the pixel counts of the layers, see _save_sankey_config."""
+        excluded_areas = {category: [] for category in SANKEY_CATEGORIES}
+        labels = {category: [] for category in SANKEY_CATEGORIES}
+        for layer_id, layer in enumerate(layers, start=1):
+            if layer["category"] is None:
+                # layer is excluded but not reported in the sankey diagram
+                continue
             if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Biospheres_core")
-        else:
-            print("not excluding biospheres core zone", flush=True)
+                excluded_areas[layer["category"]].append(net_pixels[layer_id] * pixel_area)
+            else:
+                excluded_areas[layer["category"]].append(gross_pixels[layer_id] * pixel_area)
+            labels[layer["category"]].append(layer["label"])
+        self._save_sankey_config(excluded_areas, labels, init_available_areas, remaining_area,
+                                 use_net_flows=use_net_flows)
 
-        if exclusion_dict.get("biospheres_develop") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["biospheres_develop"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "biospheres_develop_"
-                                                                             f"{exclusion_dict['biospheres_develop']['source']}_"
-                                                                             f"{exclusion_dict['biospheres_develop']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded biospheres development zone with " +
-                  f"{exclusion_dict['biospheres_develop']['source']} " +
-                  f"{exclusion_dict['biospheres_develop']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Biospheres_develop")
-        else:
-            print("not excluding biospheres development zone", flush=True)
+    def _get_exclusion_layers(self, exclusion_dict):
+        """
+        Translate the exclusion dictionary into the ordered list of layers, which are applied by _run_exclusion.
 
-        if exclusion_dict.get("biospheres_maintain") is not None:
-            excluded_area = self._exclude_features(exclusion_dict["biospheres_maintain"], _ec,
-                                                   intermediate=os.path.join(_intermediate_path,
-                                                                             "biospheres_maintain_"
-                                                                             f"{exclusion_dict['biospheres_maintain']['source']}_"
-                                                                             f"{exclusion_dict['biospheres_maintain']['buffer']}_"
-                                                                             f"{self.parent._id}.tif"
-                                                                             ),
-                                                   plot_sankey=plot_sankey
-                                                   )
-            print(f"Excluded biospheres maintaining zone with " +
-                  f"{exclusion_dict['biospheres_maintain']['source']} " +
-                  f"{exclusion_dict['biospheres_maintain']['buffer']} after " +
-                  f"{(time.time() - start) / 60} minutes",
-                  flush=True)
-            if use_net_flows:
-                excluded_area = remaining_area - _ec.areaAvailable
-            excluded_areas.append(remaining_area - _ec.areaAvailable)
-            excluded_areas_protected.append(excluded_area)
-            remaining_area = _ec.areaAvailable
-            labels_protected.append("Biospheres_maintain")
-        else:
-            print("not excluding biospheres maintaining zone", flush=True)
+        Parameters
+        ----------
+        exclusion_dict : dict
+            Dictionary containing the information for the exclusion, as returned by _get_exclusion_condition
 
-        # exclude regional features
+        Returns
+        -------
+        list of dict
+            One entry per layer with its "key", sankey "label" and "category", a "description" for the log and
+            the "parts" to exclude. Each part holds a "name", the "feature_dict", the "intermediate" path in the
+            intermediate cache and whether it is a "regional" feature from the auxiliary dictionary.
+        """
+        _cache = self.parent.intermediate_cache
+        layers = []
+        for key, label, category in EXCLUSION_LAYERS:
+            if exclusion_dict.get(key) is None or (key in FALSY_SKIPPED_KEYS and not exclusion_dict[key]):
+                print(f"not excluding {key}", flush=True)
+                continue
+            feature_dict = exclusion_dict[key]
+            # vector layers are named by their buffer, raster layers by their value range
+            parameter = feature_dict["value"] if key in RASTER_KEYS else feature_dict["buffer"]
+            description = f"{feature_dict['source']} {parameter}"
+            parts = []
+            if isinstance(feature_dict["path"], (tuple, list)):
+                for n in range(len(feature_dict["path"])):
+                    temp_dict = feature_dict.copy()
+                    temp_dict["path"] = feature_dict["path"][n]
+                    temp_dict["where_text"] = feature_dict["where_text"][n]
+                    parts.append(dict(name=f"{key}_{n}", feature_dict=temp_dict,
+                                      intermediate=_cache.get_path(f"{key}_{n}", temp_dict, self.parent.regionMask),
+                                      regional=False))
+            else:
+                if key == "slope":
+                    feature_dict = feature_dict.copy()
+                    # convert slope (degree) in DN (copernicus)
+                    feature_dict["value"] = (exclusion_dict['slope']['value'][1],
+                                             250 * np.cos(np.pi / 180 * exclusion_dict['slope']['value'][0]))
+                parts.append(dict(name=key, feature_dict=feature_dict,
+                                  intermediate=_cache.get_path(key, feature_dict, self.parent.regionMask),
+                                  regional=False))
+            layers.append(dict(key=key, label=label, category=category, parts=parts,
+                               description=description))
+
+        # regional features
         if exclusion_dict.get("auxiliary") is not None:
             aux_exclusion_dict = exclusion_dict["auxiliary"]
-            aux_keys = aux_exclusion_dict.keys()
-            for key in aux_keys:
-                # function to run the exclusion
+            for key in aux_exclusion_dict.keys():
                 special_feature_dict = aux_exclusion_dict[key]
                 if os.path.isfile(special_feature_dict["source_path"]):
                     # if full path is given, accept it
                     pass
                 else:
                     # otherwise it should be the location in datasources
-                    special_feature_dict["source_path"] = os.path.join(_datasources_path,
+                    special_feature_dict["source_path"] = os.path.join(self.parent.datasource_path,
                                                                        special_feature_dict["source_path"])
                     if not os.path.isfile(special_feature_dict["source_path"]):
                         warnings.warn(f"Cannot open {special_feature_dict['source_path']}. Give full path, or the path"
@@ -1446,199 +841,429 @@ class Technology(ABC):
                 if special_feature_dict["type"] == "raster":
                     if isinstance(special_feature_dict["value"], list):
                         special_feature_dict["value"] = tuple(special_feature_dict["value"])
-                    intermediate = os.path.join(_intermediate_path,
-                                                f"{key}_"
-                                                f"{special_feature_dict['value']}_"
-                                                f"{self.parent._id}.tif")
+                    parameter = special_feature_dict["value"]
                 elif special_feature_dict["type"] == "vector":
-                    intermediate = os.path.join(_intermediate_path,
-                                                f"{key}_"
-                                                f"{special_feature_dict['buffer']}_"
-                                                f"{self.parent._id}.tif")
+                    parameter = special_feature_dict["buffer"]
                 else:
                     warnings.warn(f"Unrecognized data type {special_feature_dict['type']}")
                     continue
-                excluded_area = self._exclude_regional_features(special_feature_dict, _ec, intermediate=intermediate,
-                                                                plot_sankey=plot_sankey)
-                if use_net_flows:
-                    excluded_area = remaining_area - _ec.areaAvailable
-                remaining_area = _ec.areaAvailable
-                excluded_areas_others.append(excluded_area)
-                labels_others.append(f"{key}")
-                if special_feature_dict["type"] == "vector":
-                    print(f"Excluded {key} with " +
-                          f"{special_feature_dict['buffer']} after " +
-                          f"{(time.time() - start) / 60} minutes",
-                          flush=True)
-                elif special_feature_dict["type"] == "raster":
-                    print(f"Excluded {key} with " +
-                          f"{special_feature_dict['value']} after " +
-                          f"{(time.time() - start) / 60} minutes",
-                          flush=True)
-        if exclusion_dict.get("region_edge") is not None:
-            _ec.excludeRegionEdge(exclusion_dict.get("region_edge"))
-            print("Excluded region edge with " +
-                  f"{exclusion_dict['region_edge']} after " +
-                  f"{(time.time() - start) / 60} minutes", flush=True)
-            # excluded_areas.append(remaining_area - _ec.areaAvailable)
-            # remaining_area = _ec.areaAvailable
-            # labels.append("Region edge")
-        else:
-            print("not excluding region buffer", flush=True)
-        if plot_sankey:
-            remaining_area = _ec.areaAvailable
-            excluded_areas_social, labels_social = self._cover_small_excluded_area(excluded_areas_social, labels_social,
-                                                                                   init_available_areas, "Social")
-            excluded_areas_infrastructure, labels_infrastructure = \
-                self._cover_small_excluded_area(excluded_areas_infrastructure,
-                                                labels_infrastructure,
-                                                init_available_areas, "Infrastructure")
-            excluded_areas_physical, labels_physical = self._cover_small_excluded_area(excluded_areas_physical,
-                                                                                       labels_physical,
-                                                                                       init_available_areas,
-                                                                                       "Physical")
-            excluded_areas_eco_tech, labels_eco_tech = self._cover_small_excluded_area(excluded_areas_eco_tech,
-                                                                                       labels_eco_tech,
-                                                                                       init_available_areas,
-                                                                                       "Eco & Tech")
-            excluded_areas_protected, labels_protected = self._cover_small_excluded_area(excluded_areas_protected,
-                                                                                         labels_protected,
-                                                                                         init_available_areas,
-                                                                                         "Protected")
-            excluded_areas_others, labels_others = self._cover_small_excluded_area(excluded_areas_others, labels_others,
-                                                                                   init_available_areas,
-                                                                                   "Others")
-            value = [sum(excluded_areas_social),
-                     sum(excluded_areas_infrastructure),
-                     sum(excluded_areas_physical),
-                     sum(excluded_areas_eco_tech),
-                     sum(excluded_areas_protected),
-                     sum(excluded_areas_others)] + \
-                    excluded_areas_social + \
-                    excluded_areas_infrastructure + \
-                    excluded_areas_physical + \
-                    excluded_areas_eco_tech + \
-                    excluded_areas_protected + \
-                    excluded_areas_others + \
-                    [remaining_area] * 2
-            labels = ["Initial available area",
-                      "Social",
-                      "Infrastructure",
-                      "Physical",
-                      "Economical & Technical",
-                      "Protected",
-                      "Others"] + \
-                     labels_social + \
-                     labels_infrastructure + \
-                     labels_physical + \
-                     labels_eco_tech + \
-                     labels_protected + \
-                     labels_others + \
-                     ["Remaining Area"] * 2
-            # add values to label
-            for i in range(len(labels)):
-                if i == 0:
+                intermediate = _cache.get_path(key, special_feature_dict, self.parent.regionMask)
+                layers.append(dict(key=key, label=f"{key}", category="others",
+                                   parts=[dict(name=key, feature_dict=special_feature_dict,
+                                               intermediate=intermediate, regional=True)],
+                                   description=f"{parameter}"))
+        return layers
+
+    def _prepare_shared_sources(self, layers, path):
+        """
+        Copy the features of vector sources, which are used by several layers, to small temporary files.
+
+        Each source is scanned once with the union of the where clauses of its layers and the region extent,
+        padded by the largest buffer. The parts then read the temporary file instead of the source, so that
+        every layer keeps its own where clause and buffer. The original path is kept as source_path, so the masks
+        of the parts are still shared by their source. Parts with an existing intermediate file are ignored.
+
+        Parameters
+        ----------
+        layers : list
+            Layers as returned by _get_exclusion_layers. The paths of the parts are replaced.
+        path : str
+            Directory for the temporary files
+        """
+        groups = {}
+        for layer in layers:
+            for part in layer["parts"]:
+                feature_dict = part["feature_dict"]
+                if part["regional"] or DATA_TYPES.get(feature_dict["source"]) != "vector":
                     continue
-                if not use_net_flows and (i <= 6):
+                if self.parent.use_intermediate and os.path.isfile(part["intermediate"]):
                     continue
-                if value[i - 1] / init_available_areas * 100 < 0.1:
-                    labels[i] = f"{labels[i]} <0.1%"
-                else:
-                    labels[i] = f"{labels[i]} {round(value[i - 1] / init_available_areas * 100, 1)}%"
-
-            value += excluded_areas_social + \
-                     excluded_areas_infrastructure + \
-                     excluded_areas_physical + \
-                     excluded_areas_eco_tech + \
-                     excluded_areas_protected + \
-                     excluded_areas_others + \
-                     [remaining_area]
-            value = [int(v) for v in value]
-            remaining_percentage = round(remaining_area / init_available_areas * 100, 1)
-            labels += [f"Excluded Area {100 - remaining_percentage}%"] + [f"Remaining Area {remaining_percentage}%"]
-
-            color_social = 'rgba(200, 0, 0, 0.8)'
-            color_infrastructure = 'rgba(200,200,0, 0.8)'
-            color_physical = 'rgba(0,0,200, 0.8)'
-            color_eco_tech = 'rgba(0, 160, 240, 0.8)'
-            color_protected = 'rgba(0, 240, 0, 0.8)'
-            color_others = 'rgba(80, 80, 80, 0.8)'
-            color_remaining = 'rgba(0, 240, 160, 0.8)'
-            color_exclusion = 'rgba(128, 128, 128, 0.8)'
-            color = ['rgba(0, 0, 0, 0.8)',
-                     color_social,
-                     color_infrastructure,
-                     color_physical,
-                     color_eco_tech,
-                     color_protected,
-                     color_others] + \
-                    [color_social] * len(excluded_areas_social) + \
-                    [color_infrastructure] * len(excluded_areas_infrastructure) + \
-                    [color_physical] * len(excluded_areas_physical) + \
-                    [color_eco_tech] * len(excluded_areas_eco_tech) + \
-                    [color_protected] * len(excluded_areas_protected) + \
-                    [color_others] * len(excluded_areas_others) + \
-                    [color_remaining] * 2 + \
-                    [color_exclusion] + \
-                    [color_remaining]
-            source = [0] * 6 + \
-                     [1] * len(excluded_areas_social) + \
-                     [2] * len(excluded_areas_infrastructure) + \
-                     [3] * len(excluded_areas_physical) + \
-                     [4] * len(excluded_areas_eco_tech) + \
-                     [5] * len(excluded_areas_protected) + \
-                     [6] * len(excluded_areas_others) + \
-                     [0, len(labels) - 4] + \
-                     list(range(len(labels)))[7:-4] + \
-                     [len(labels) - 3]
-            target = list(range(len(labels)))[1:-3] + \
-                     [len(labels) - 3] + \
-                     [len(labels) - 2] * len(list(range(len(labels)))[7:-4]) + \
-                     [len(labels) - 1]
-            color_link_social = 'rgba(200, 0, 0, 0.4)'
-            color_link_infrastructure = 'rgba(200,200,0, 0.4)'
-            color_link_physical = 'rgba(0,0,200, 0.4)'
-            color_link_eco_tech = 'rgba(0, 160, 240, 0.4)'
-            color_link_protected = 'rgba(0, 240, 0, 0.4)'
-            color_link_others = 'rgba(80, 80, 80, 0.4)'
-            color_link_remaining = 'rgba(0, 240, 160, 0.4)'
-            color_link_exclusion = 'rgba(128, 128, 128, 0.4)'
-            color_link = [
-                             color_link_social,
-                             color_link_infrastructure,
-                             color_link_physical,
-                             color_link_eco_tech,
-                             color_link_protected,
-                             color_link_others] + \
-                         [color_link_social] * len(excluded_areas_social) + \
-                         [color_link_infrastructure] * len(excluded_areas_infrastructure) + \
-                         [color_link_physical] * len(excluded_areas_physical) + \
-                         [color_link_eco_tech] * len(excluded_areas_eco_tech) + \
-                         [color_link_protected] * len(excluded_areas_protected) + \
-                         [color_link_others] * len(excluded_areas_others) + \
-                         [color_link_remaining] * 2 + \
-                         [color_link_exclusion] * len(list(range(len(labels)))[7:-4]) + \
-                         [color_link_remaining]
-            node = dict(
-                pad=15,
-                thickness=10,
-                line=dict(color="black", width=0.5),
-                label=labels,
-                color=color
-            )
-            link = dict(
-                source=source,  # indices correspond to labels, eg A1, A2, A1, B1, ...
-                target=target,
-                value=value,
-                color=color_link
-            )
-            data = dict(
-                node=node,
-                link=link
-            )
-            with open(os.path.join(self.result_path, "sankey_config.json"), "w") as f:
-                json.dump(data, f, indent=2)
-        return exclusion_dict
+                groups.setdefault(feature_dict["path"], []).append(part)
+        for n, (source, parts) in enumerate(groups.items()):
+            if len(parts) < 2:
+                continue
+            where_texts = [part["feature_dict"]["where_text"] for part in parts]
+            if all(where_texts):
+                where = " OR ".join(f"({where_text})" for where_text in dict.fromkeys(where_texts))
+            else:
+                where = None
+            buffer = max([part["feature_dict"]["buffer"] or 0 for part in parts])
+            ds = gdal.OpenEx(source, gdal.OF_VECTOR)
+            extent = self.parent.regionMask.extent.pad(buffer).castTo(ds.GetLayer().GetSpatialRef())
+            if source.lower().endswith(".shp"):
+                subset = os.path.join(path, f"{n}_{os.path.basename(source)}")
+                driver = "ESRI Shapefile"
+            else:
+                subset = os.path.join(path, f"{n}_{os.path.splitext(os.path.basename(source))[0]}.gpkg")
+                driver = "GPKG"
+            gdal.VectorTranslate(subset, ds,
+                                 options=gdal.VectorTranslateOptions(format=driver, where=where,
+                                                                     spatFilter=[extent.xMin, extent.yMin,
+                                                                                 extent.xMax, extent.yMax]))
+            ds = None
+            for part in parts:
+                part["feature_dict"] = dict(part["feature_dict"], path=subset, source_path=source)
+            print(f"Read {len(parts)} layers from {source} in one pass", flush=True)
+
+    def _exclude_part(self, part, ec):
+        """
+        Exclude one part of an exclusion layer, see _get_exclusion_layers.
+        """
+        if part["regional"]:
+            self._exclude_regional_features(part["feature_dict"], ec, intermediate=part["intermediate"])
+        else:
+            self._exclude_features(part["feature_dict"], ec, intermediate=part["intermediate"])
+
+    def _layer_mask(self, part, ec):
+        """
+        Rasterize one part of an exclusion layer.
+
+        The part is excluded from a fully available copy of the availability, so the mask does not depend on
+        the layers excluded before. If TREP.use_distance_cache is set, buffered vector parts are taken from
+        the distance raster of the part instead. If TREP.share_layers is set, the mask is taken from or kept
+        in TREP.shared_layers, so technologies of the region rasterize each part only once.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the pixels inside the region excluded by the part
+        """
+        key = self._shared_layer_key(part, ec)
+        if key is not None and key in self.parent.shared_layers:
+            print(f"Use the mask of {part['name']} shared by another technology", flush=True)
+            return np.unpackbits(self.parent.shared_layers[key],
+                                 count=ec.region.mask.size).reshape(ec.region.mask.shape).view(bool)
+        buffer = part["feature_dict"].get("buffer") or 0
+        if self.parent.use_distance_cache and self._is_vector_part(part) and buffer <= self.parent.max_distance:
+            mask = (self._distance_raster(part, ec) <= buffer) & ec.region.mask
+        else:
+            mask = self._rasterize_mask(part, ec)
+        self._share_layer_mask(part, ec, mask)
+        return mask
+
+    @staticmethod
+    def _part_key(part, buffer=True):
+        """Identify the mask of a part of an exclusion layer by its source, where clause, value and buffer. The
+        source is the original path of the part, not the temporary subset of _prepare_shared_sources."""
+        feature_dict = part["feature_dict"]
+        return json.dumps([feature_dict.get("source_path", feature_dict.get("path")),
+                           feature_dict.get("where_text"), feature_dict.get("value"),
+                           feature_dict.get("buffer") if buffer else None, part["regional"]],
+                          sort_keys=True, default=str)
+
+    def _shared_layer_key(self, part, ec):
+        """Key of a part in TREP.shared_layers, None if masks are not shared or ec is not on the grid of the
+        region, e.g. a tile of run_exclusion_tiled."""
+        if not self.parent.share_layers:
+            return None
+        region = self.parent.regionMask
+        if ec.region is not region and (ec.region.mask.shape != region.mask.shape or
+                                        ec.region.extent.xyXY != region.extent.xyXY):
+            return None
+        return self._part_key(part)
+
+    def _share_layer_mask(self, part, ec, mask):
+        """Keep the mask of a part bit-packed in TREP.shared_layers for the other technologies."""
+        key = self._shared_layer_key(part, ec)
+        if key is not None and key not in self.parent.shared_layers:
+            self.parent.shared_layers[key] = np.packbits(mask)
+
+    def _rasterize_mask(self, part, ec):
+        """Exclude one part of an exclusion layer from a fully available copy of the availability."""
+        availability = ec._availability
+        ec._availability = self._full_availability(ec.region.mask, availability.dtype)
+        try:
+            self._exclude_part(part, ec)
+            mask = (ec._availability == 0) & ec.region.mask
+        finally:
+            ec._availability = availability
+        return mask
+
+    @staticmethod
+    def _is_vector_part(part):
+        """Whether a part of an exclusion layer reads a vector source."""
+        if part["regional"]:
+            return part["feature_dict"]["type"] == "vector"
+        return DATA_TYPES.get(part["feature_dict"]["source"]) == "vector"
+
+    def _distance_raster(self, part, ec):
+        """
+        Get the distance of every pixel of the region to the features of a vector part.
+
+        The features are rasterized without buffer on the region grid padded by TREP.max_distance and the
+        euclidean distance transform between pixel centers is calculated. Distances above max_distance are
+        set to infinity. The raster is cached in the intermediate cache and in memory, so that any buffer up
+        to max_distance is applied by a threshold. The buffered area can differ from the buffered geometry of
+        excludeVectorType by up to one pixel.
+
+        Returns
+        -------
+        np.ndarray
+            Distance in the unit of the region's srs
+        """
+        max_distance = self.parent.max_distance
+        region = ec.region
+        path = self.parent.intermediate_cache.get_path(f"{part['name']}_distance",
+                                                       dict(part["feature_dict"], buffer=max_distance), region)
+        if path in self.parent.distance_rasters:
+            return self.parent.distance_rasters[path]
+        with self.parent.intermediate_cache.writing(path) as _path:
+            if _path == path:
+                distance = gk.raster.extractMatrix(path)
+            else:
+                pad_x = int(np.ceil(max_distance / region.pixelWidth))
+                pad_y = int(np.ceil(max_distance / region.pixelHeight))
+                extent = region.extent
+                padded_extent = gk.Extent(extent.xMin - pad_x * region.pixelWidth,
+                                          extent.yMin - pad_y * region.pixelHeight,
+                                          extent.xMax + pad_x * region.pixelWidth,
+                                          extent.yMax + pad_y * region.pixelHeight,
+                                          srs=region.srs)
+                height, width = region.mask.shape
+                padded_ec = gl.ExclusionCalculator(
+                    gk.RegionMask.fromMask(padded_extent, np.ones((height + 2 * pad_y, width + 2 * pad_x), dtype=bool)))
+                features = self._rasterize_mask(dict(part, feature_dict=dict(part["feature_dict"], buffer=None),
+                                                     intermediate=None), padded_ec)
+                distance = scipy.ndimage.distance_transform_edt(~features,
+                                                                sampling=(region.pixelHeight, region.pixelWidth))
+                distance = distance[pad_y:pad_y + height, pad_x:pad_x + width].astype(np.float32)
+                distance[distance > max_distance] = np.inf
+                region.createRaster(output=_path, data=distance)
+        self.parent.distance_rasters[path] = distance
+        return distance
+
+    def _rasterize_layers_parallel(self, layers, n_jobs):
+        """
+        Rasterize the parts of all exclusion layers in a pool of forked processes.
+
+        Every part is excluded from a fresh ExclusionCalculator of the region. The workers write the masks of
+        excluded pixels bit-packed into slots of shared memory. The masks are yielded in the order of the layers
+        and their parts as soon as they are rasterized. The slot of a mask is reused once it is yielded, so at most
+        2 * n_jobs masks are held at once.
+
+        Parameters
+        ----------
+        layers : list
+            Layers as returned by _get_exclusion_layers
+        n_jobs : int
+            Number of processes
+
+        Yields
+        ------
+        tuple
+            The mask of a part and the seconds needed to rasterize it
+        """
+        parts = [part for layer in layers for part in layer["parts"]]
+        n_slots = max(min(2 * n_jobs, len(parts)), 1)
+        masks = _LayerMasks(n_slots, self.parent.regionMask.mask.shape)
+        _PARALLEL_EXCLUSION.update(technology=self, parts=parts, masks=masks)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("fork")) as pool:
+                free_slots = list(range(n_slots))
+                futures = {}
+                next_part = 0
+                for index in range(len(parts)):
+                    # parts are submitted in order, so the next part to yield always has a slot
+                    while free_slots and next_part < len(parts):
+                        futures[next_part] = pool.submit(_rasterize_part, next_part, free_slots.pop())
+                        next_part += 1
+                    # raise errors of the workers
+                    slot, seconds = futures.pop(index).result()
+                    mask = masks[slot]
+                    free_slots.append(slot)
+                    print(f"Rasterized {index + 1}/{len(parts)}", flush=True)
+                    yield mask, seconds
+        finally:
+            _PARALLEL_EXCLUSION.clear()
+            masks.close()
+
+    @staticmethod
+    def _apply_layer_mask(mask, availability, provenance, layer_id):
+        """
+        Exclude the pixels of a layer mask from an availability matrix and record the layer in the provenance
+        raster.
+
+        Returns
+        -------
+        tuple
+            Number of pixels covered by the mask (gross) and number of pixels excluded first by the layer (net)
+        """
+        excluded = mask & (provenance == 0)
+        provenance[excluded] = layer_id
+        availability[mask] = 0
+        return int(mask.sum()), int(excluded.sum())
+
+    def _save_sankey_config(self, excluded_areas, labels, init_available_areas, remaining_area,
+                            use_net_flows=True):
+        """
+        Write the configuration of the sankey plot of the area flows to the result path.
+
+        Parameters
+        ----------
+        excluded_areas : dict
+            Excluded area of each layer per category
+        labels : dict
+            Label of each layer per category
+        init_available_areas : float
+            Available area before the exclusion
+        remaining_area : float
+            Available area after the exclusion
+        use_net_flows : bool, optional
+            Whether the excluded areas are net flows, by default True
+        """
+        excluded_areas_social, labels_social = self._cover_small_excluded_area(excluded_areas["social"],
+                                                                               labels["social"],
+                                                                               init_available_areas, "Social")
+        excluded_areas_infrastructure, labels_infrastructure = \
+            self._cover_small_excluded_area(excluded_areas["infrastructure"],
+                                            labels["infrastructure"],
+                                            init_available_areas, "Infrastructure")
+        excluded_areas_physical, labels_physical = self._cover_small_excluded_area(excluded_areas["physical"],
+                                                                                   labels["physical"],
+                                                                                   init_available_areas,
+                                                                                   "Physical")
+        excluded_areas_eco_tech, labels_eco_tech = self._cover_small_excluded_area(excluded_areas["eco_tech"],
+                                                                                   labels["eco_tech"],
+                                                                                   init_available_areas,
+                                                                                   "Eco & Tech")
+        excluded_areas_protected, labels_protected = self._cover_small_excluded_area(excluded_areas["protected"],
+                                                                                     labels["protected"],
+                                                                                     init_available_areas,
+                                                                                     "Protected")
+        excluded_areas_others, labels_others = self._cover_small_excluded_area(excluded_areas["others"],
+                                                                               labels["others"],
+                                                                               init_available_areas,
+                                                                               "Others")
+        value = [sum(excluded_areas_social),
+                 sum(excluded_areas_infrastructure),
+                 sum(excluded_areas_physical),
+                 sum(excluded_areas_eco_tech),
+                 sum(excluded_areas_protected),
+                 sum(excluded_areas_others)] + \
+                excluded_areas_social + \
+                excluded_areas_infrastructure + \
+                excluded_areas_physical + \
+                excluded_areas_eco_tech + \
+                excluded_areas_protected + \
+                excluded_areas_others + \
+                [remaining_area] * 2
+        labels = ["Initial available area",
+                  "Social",
+                  "Infrastructure",
+                  "Physical",
+                  "Economical & Technical",
+                  "Protected",
+                  "Others"] + \
+                 labels_social + \
+                 labels_infrastructure + \
+                 labels_physical + \
+                 labels_eco_tech + \
+                 labels_protected + \
+                 labels_others + \
+                 ["Remaining Area"] * 2
+        # add values to label
+        for i in range(len(labels)):
+            if i == 0:
+                continue
+            if not use_net_flows and (i <= 6):
+                continue
+            if value[i - 1] / init_available_areas * 100 < 0.1:
+                labels[i] = f"{labels[i]} <0.1%"
+            else:
+                labels[i] = f"{labels[i]} {round(value[i - 1] / init_available_areas * 100, 1)}%"
+
+        value += excluded_areas_social + \
+                 excluded_areas_infrastructure + \
+                 excluded_areas_physical + \
+                 excluded_areas_eco_tech + \
+                 excluded_areas_protected + \
+                 excluded_areas_others + \
+                 [remaining_area]
+        value = [int(v) for v in value]
+        remaining_percentage = round(remaining_area / init_available_areas * 100, 1)
+        labels += [f"Excluded Area {100 - remaining_percentage}%"] + [f"Remaining Area {remaining_percentage}%"]
+
+        color_social = 'rgba(200, 0, 0, 0.8)'
+        color_infrastructure = 'rgba(200,200,0, 0.8)'
+        color_physical = 'rgba(0,0,200, 0.8)'
+        color_eco_tech = 'rgba(0, 160, 240, 0.8)'
+        color_protected = 'rgba(0, 240, 0, 0.8)'
+        color_others = 'rgba(80, 80, 80, 0.8)'
+        color_remaining = 'rgba(0, 240, 160, 0.8)'
+        color_exclusion = 'rgba(128, 128, 128, 0.8)'
+        color = ['rgba(0, 0, 0, 0.8)',
+                 color_social,
+                 color_infrastructure,
+                 color_physical,
+                 color_eco_tech,
+                 color_protected,
+                 color_others] + \
+                [color_social] * len(excluded_areas_social) + \
+                [color_infrastructure] * len(excluded_areas_infrastructure) + \
+                [color_physical] * len(excluded_areas_physical) + \
+                [color_eco_tech] * len(excluded_areas_eco_tech) + \
+                [color_protected] * len(excluded_areas_protected) + \
+                [color_others] * len(excluded_areas_others) + \
+                [color_remaining] * 2 + \
+                [color_exclusion] + \
+                [color_remaining]
+        source = [0] * 6 + \
+                 [1] * len(excluded_areas_social) + \
+                 [2] * len(excluded_areas_infrastructure) + \
+                 [3] * len(excluded_areas_physical) + \
+                 [4] * len(excluded_areas_eco_tech) + \
+                 [5] * len(excluded_areas_protected) + \
+                 [6] * len(excluded_areas_others) + \
+                 [0, len(labels) - 4] + \
+                 list(range(len(labels)))[7:-4] + \
+                 [len(labels) - 3]
+        target = list(range(len(labels)))[1:-3] + \
+                 [len(labels) - 3] + \
+                 [len(labels) - 2] * len(list(range(len(labels)))[7:-4]) + \
+                 [len(labels) - 1]
+        color_link_social = 'rgba(200, 0, 0, 0.4)'
+        color_link_infrastructure = 'rgba(200,200,0, 0.4)'
+        color_link_physical = 'rgba(0,0,200, 0.4)'
+        color_link_eco_tech = 'rgba(0, 160, 240, 0.4)'
+        color_link_protected = 'rgba(0, 240, 0, 0.4)'
+        color_link_others = 'rgba(80, 80, 80, 0.4)'
+        color_link_remaining = 'rgba(0, 240, 160, 0.4)'
+        color_link_exclusion = 'rgba(128, 128, 128, 0.4)'
+        color_link = [
+                         color_link_social,
+                         color_link_infrastructure,
+                         color_link_physical,
+                         color_link_eco_tech,
+                         color_link_protected,
+                         color_link_others] + \
+                     [color_link_social] * len(excluded_areas_social) + \
+                     [color_link_infrastructure] * len(excluded_areas_infrastructure) + \
+                     [color_link_physical] * len(excluded_areas_physical) + \
+                     [color_link_eco_tech] * len(excluded_areas_eco_tech) + \
+                     [color_link_protected] * len(excluded_areas_protected) + \
+                     [color_link_others] * len(excluded_areas_others) + \
+                     [color_link_remaining] * 2 + \
+                     [color_link_exclusion] * len(list(range(len(labels)))[7:-4]) + \
+                     [color_link_remaining]
+        node = dict(
+            pad=15,
+            thickness=10,
+            line=dict(color="black", width=0.5),
+            label=labels,
+            color=color
+        )
+        link = dict(
+            source=source,  # indices correspond to labels, eg A1, A2, A1, B1, ...
+            target=target,
+            value=value,
+            color=color_link
+        )
+        data = dict(
+            node=node,
+            link=link
+        )
+        with open(os.path.join(self.result_path, "sankey_config.json"), "w") as f:
+            json.dump(data, f, indent=2)
 
     @staticmethod
     def _cover_small_excluded_area(excluded_areas, labels, init_available_areas, category_name):
@@ -2825,7 +2450,7 @@ class Technology(ABC):
         return exclusion_dict
 
     def _exclude_features(self, feature_dict: Dict, ec: Type[gl.ExclusionCalculator],
-                          intermediate: Text = None, plot_sankey: bool = False) -> float:
+                          intermediate: Text = None) -> None:
         """
         Call the exclusion method from glaes. Select correct data type to exclude.
         ----------
@@ -2837,31 +2462,41 @@ class Technology(ABC):
             Path to an intermediate result raster file for this set of function arguments.
             All acceptable to excludeRasterType/excludeVectorType.
         """
-        _data_type = {
-            "basis-dlm": "vector", "dlm250": "vector", "osm": "vector", "clc": "vector", "osm_overpass": "vector",
-            "copernicus": "raster", "gwa": "raster", "wdpa": "vector", "hu": "vector", "inner_areas": "vector",
-            "bgr": "vector", "vg250": "vector", "bfn": "vector"
-        }
         # if not use intermediate, set the path to None
         if not self.parent.use_intermediate:
             intermediate = None
-        if _data_type[feature_dict["source"]] == "vector":
-            ec.excludeVectorType(feature_dict["path"], where=feature_dict["where_text"], buffer=feature_dict["buffer"],
-                                 intermediate=intermediate)
-        elif _data_type[feature_dict["source"]] == "raster":
-            ec.excludeRasterType(feature_dict["path"], value=feature_dict["value"], buffer=feature_dict["buffer"],
-                                 intermediate=intermediate)
-        if intermediate is not None and plot_sankey:
-            matrix = gk.raster.extractMatrix(intermediate)
-            matrix = np.where(matrix == 0, 1, 0)
-            sum_pixels = matrix.sum()
-            excluded_area = sum_pixels * self.parent.regionMask._pixelRes ** 2
-            return excluded_area
-        else:
-            return 0.0
+        with self.parent.intermediate_cache.writing(intermediate) as _intermediate:
+            if DATA_TYPES[feature_dict["source"]] == "vector":
+                ec.excludeVectorType(feature_dict["path"], where=feature_dict["where_text"],
+                                     buffer=feature_dict["buffer"], intermediate=_intermediate)
+            elif DATA_TYPES[feature_dict["source"]] == "raster":
+                ec.excludeRasterType(feature_dict["path"], value=feature_dict["value"],
+                                     buffer=feature_dict["buffer"], intermediate=_intermediate,
+                                     resampleAlg=RASTER_RESAMPLE_ALG)
+
+    def _warp_raster_layer(self, key: Text, feature_dict: Dict = None) -> np.ndarray:
+        """
+        Warp the raster of a raster layer to the region like its exclusion does.
+        ----------
+        key : str
+            Key of the layer in RASTER_KEYS, e.g. "wind_100m"
+        feature_dict : dict, optional
+            Entry of the layer in the exclusion dictionary, only the source is used. By default the default source
+
+        Returns
+        -------
+        np.ndarray
+            Values of the raster on the grid of the region
+        """
+        assert key in RASTER_KEYS, f"{key} is not a raster layer"
+        feature_dict = dict(feature_dict or {})
+        # the value range is not needed, but required by the exclusion condition
+        feature_dict.setdefault("value", (0, 0))
+        feature_dict = self._get_exclusion_condition({key: feature_dict})[key]
+        return self.ec.region.warp(feature_dict["path"], resampleAlg=RASTER_RESAMPLE_ALG)
 
     def _exclude_regional_features(self, feature_dict: Dict, ec: Type[gl.ExclusionCalculator],
-                                   intermediate: Text = None, plot_sankey: bool = False) -> float:
+                                   intermediate: Text = None) -> None:
         """
         Read information from the auxiliary dictionary and use them to exclude regional features.
         ----------
@@ -2873,23 +2508,15 @@ class Technology(ABC):
             Path to an intermediate result raster file for this set of function arguments.
             All acceptable to excludeRasterType/excludeVectorType.
         """
-        # TODO how can we set intermediate for special features? Or do we still need intermediate here?
         if not self.parent.use_intermediate:
             intermediate = None
-        if feature_dict["type"] == "vector":
-            ec.excludeVectorType(feature_dict["source_path"], where=feature_dict["where_text"],
-                                 buffer=feature_dict["buffer"], intermediate=intermediate)
-        elif feature_dict["type"] == "raster":
-            ec.excludeRasterType(feature_dict["source_path"], value=feature_dict["value"],
-                                 buffer=feature_dict["buffer"], intermediate=intermediate)
-        if intermediate is not None and plot_sankey:
-            matrix = gk.raster.extractMatrix(intermediate)
-            matrix = np.where(matrix == 0, 1, 0)
-            sum_pixels = matrix.sum()
-            excluded_area = sum_pixels * self.parent.regionMask._pixelRes ** 2
-            return excluded_area
-        else:
-            return 0.0
+        with self.parent.intermediate_cache.writing(intermediate) as _intermediate:
+            if feature_dict["type"] == "vector":
+                ec.excludeVectorType(feature_dict["source_path"], where=feature_dict["where_text"],
+                                     buffer=feature_dict["buffer"], intermediate=_intermediate)
+            elif feature_dict["type"] == "raster":
+                ec.excludeRasterType(feature_dict["source_path"], value=feature_dict["value"],
+                                     buffer=feature_dict["buffer"], intermediate=_intermediate)
 
     def save_report(self, output: Text) -> None:
         """
@@ -2919,6 +2546,94 @@ class Technology(ABC):
 
         # gk.vector.createVector(geoms, output=output)
 
+    def split_by_municipality(self, output_path=None):
+        """
+        Split the result of a run at nuts3 or state level into the municipalities of the region.
+
+        The eligible area, the layer statistics of the exclusion and the predicted items are assigned to the
+        municipalities with the label raster of TREP.municipality_labels, so no exclusion has to be run for the
+        municipalities themselves. The results equal separate runs at MUN level except for edge effects at the
+        borders between the municipalities, which are not borders of the region: the region edge is only
+        excluded at the border of the region, and pruned areas and the distribution of items are not limited
+        by the borders of the municipalities. The layer statistics are only split if the exclusion was run with
+        keep_provenance=True. The provenance raster is released afterwards.
+
+        Parameters
+        ----------
+        output_path : str, optional
+            directory for the eligible area of each municipality as {RS}_potential_area.tif, not saved if None,
+            by default None
+
+        Returns
+        -------
+        dict
+            report of each municipality
+        """
+        labels, municipalities = self.parent.municipality_labels
+        region = self.ec.region
+        n_labels = len(municipalities) + 1
+        pixel_area = region.pixelWidth * region.pixelHeight
+        available = self.ec._availability > 0
+        total_pixels = np.bincount(labels.ravel(), minlength=n_labels)
+        eligible_pixels = np.bincount(labels[available], minlength=n_labels)
+        # first excluding layer of each pixel counted for each municipality
+        provenance = getattr(self, "exclusion_provenance", None)
+        if provenance is not None:
+            layer_pixels = np.bincount(labels.ravel().astype(np.int64) * 256 + provenance.ravel(),
+                                       minlength=n_labels * 256).reshape(n_labels, 256)
+        item_labels = None
+        if getattr(self, "predicted_items", None) is not None and len(self.predicted_items) > 0:
+            x, y = transform_points(self.predicted_items["lon"].values, self.predicted_items["lat"].values, 4326,
+                                    region.srs)
+            rows, cols, inside = pixel_index(region, x, y)
+            item_labels = np.where(inside, labels[rows, cols], 0)
+        if output_path is not None and not os.path.isdir(output_path):
+            os.makedirs(output_path, exist_ok=True)
+
+        self.municipality_reports = {}
+        self.municipality_items = {}
+        for label, rs in enumerate(municipalities, start=1):
+            if total_pixels[label] == 0:
+                continue
+            report_dict = {"Exclusion": "split from " + str(self.parent.id),
+                           "Total_Area": int(total_pixels[label] * pixel_area),
+                           "Eligible_Area": float(eligible_pixels[label] * pixel_area),
+                           "Eligible_Percentage": 100 * eligible_pixels[label] / total_pixels[label]}
+            if provenance is not None:
+                report_dict["layer_statistics"] = {
+                    key: dict(net_area=float(layer_pixels[label, layer_id] * pixel_area))
+                    for layer_id, key in enumerate(self.exclusion_provenance_keys) if key is not None
+                }
+            if item_labels is not None:
+                self.municipality_items[rs] = self.predicted_items[item_labels == label]
+                report_dict["Items_Number"] = len(self.municipality_items[rs])
+                if "capacity" in self.predicted_items.columns:
+                    report_dict["Capacity"] = float(self.municipality_items[rs]["capacity"].sum())
+            self.municipality_reports[rs] = report_dict
+            if output_path is not None:
+                self._save_label_raster(os.path.join(output_path, f"{rs}_potential_area.tif"), labels == label)
+        self.exclusion_provenance = None
+        return self.municipality_reports
+
+    def _save_label_raster(self, output, mask):
+        """Save the availability within a mask, cropped to the bounding box of the mask, with 255 outside."""
+        region = self.ec.region
+        rows = np.nonzero(mask.any(axis=1))[0]
+        cols = np.nonzero(mask.any(axis=0))[0]
+        window = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        data = np.where(mask[window], self.ec._availability[window], np.uint8(255)).astype(np.uint8, copy=False)
+        extent = region.extent
+        ds = gdal.GetDriverByName("GTiff").Create(output, data.shape[1], data.shape[0], 1, gdal.GDT_Byte,
+                                                  options=["COMPRESS=DEFLATE"])
+        ds.SetGeoTransform((extent.xMin + cols[0] * region.pixelWidth, region.pixelWidth, 0,
+                            extent.yMax - rows[0] * region.pixelHeight, 0, -region.pixelHeight))
+        ds.SetProjection(region.srs.ExportToWkt())
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(255)
+        band.WriteArray(data)
+        band.FlushCache()
+        ds = None
+
     def _merge_to_germany(self, path_states=None, technology=None):
         """Merge the potential area in federal states to germany, i.e. merge several small rasters to one large.
 
@@ -10,11 +10,36 @@ import trep.utils as utils
 from trep.wind import Wind
 from trep.openfield_pv import OpenfieldPV, OpenfieldPVRoads
 from trep.rooftop_pv import RooftopPV
+from trep.intermediate_cache import IntermediateCache
+from trep.region_catalog import RegionCatalog
+from trep.region_mask_cache import RegionMaskCache
+from trep.mastr import MastrSnapshot
+from trep import asset_registry
+from trep.region_labels import rasterize_labels, pixel_index, transform_points
 import shutil
 import osgeo
 import time
 
 
+class _Techs(dict):
+    """Technologies of a TREP, which are added on first access by key.
+
+    Iteration, get, items and values do not add technologies, so technologies which were not used are None.
+    """
+
+    def __init__(self, parent):
+        super().__init__({"Wind": None,
+                          "OpenfieldPV": None,
+                          "OpenfieldPVRoads": None,
+                          "RooftopPV": None})
+        self.parent = parent
+
+    def __getitem__(self, tech):
+        if dict.__getitem__(self, tech) is None:
+            self.parent.add_tech(tech)
+        return dict.__getitem__(self, tech)
+
+
 class TREP(object):
     """Object to Estimate Regional Renewable Energy Potentials."""
 
@@ -28,6 +53,12 @@ class TREP(object):
                  dlm_basis_path=None,
                  hu_path=None,
                  use_intermediate=False,
+                 intermediate_max_size=None,
+                 pack_availability=False,
+                 use_distance_cache=False,
+                 max_distance=5000,
+                 share_layers=False,
+                 eager=False,
                  pixelRes=10,
                  srs=3035):
         """Initialize trep.
@@ -54,20 +85,54 @@ class TREP(object):
             spatial reference system, by default 3035
         use_intermediate: bool, optional
             if true use intermediate file for exclusion calculation, by default false
+        intermediate_max_size: float, optional
+            size budget of the intermediate files in GB. The least recently used files are removed when the
+            budget is exceeded. No limit if None, by default None
+        pack_availability: bool, optional
+            if true the availability of each technology is held bit-packed (8 pixels per byte) until its
+            ExclusionCalculator is used, so that all technologies of large regions fit into memory, by default false
+        use_distance_cache: bool, optional
+            if true vector layers are excluded by a threshold on a cached distance raster instead of buffering the
+            features, so that changing a buffer does not require to rasterize the layer again, by default false
+        max_distance: float, optional
+            largest buffer in m, which is covered by the distance rasters. Larger buffers are excluded as usual,
+            by default 5000
+        share_layers: bool, optional
+            if true the mask of every exclusion layer is kept bit-packed, so technologies excluding the same
+            layer with the same source, where clause and buffer rasterize it only once, by default false
+        eager: bool, optional
+            if true all technologies are added at initialization. Otherwise, each technology is added on first
+            access through TREP.techs or its property, by default false
         """
-        if not isinstance(region, list):
-            self.region = [region]
-        else:
-            self.region = region
+        self._set_settings(case, db_path, datasource_path, intermediate_path, dlm_basis_path, hu_path,
+                           use_intermediate, intermediate_max_size, pack_availability, use_distance_cache,
+                           max_distance, share_layers)
+        self._reset(region, level)
+        self.get_regionMask(srs, pixelRes)
+        if level == "nuts3":
+            self.get_municipalities()
+        # # TODO why only check for RoofPV? And why only for municipality?
+        # path = os.path.join(self.db_path, case, "RooftopPV_{}".format(self.id))
+        # if not os.path.exists(path) and self.level == "MUN":
+        #     os.mkdir(path)
+
+        if eager:
+            self.add_all()
+
+    def _set_settings(self, case, db_path, datasource_path, intermediate_path, dlm_basis_path, hu_path,
+                      use_intermediate, intermediate_max_size, pack_availability, use_distance_cache, max_distance,
+                      share_layers, parent=None):
+        """Set the paths and settings of the TREP, see __init__.
+
+        The arguments are kept in _settings, so a child region is set up with the same settings. The intermediate
+        cache, distance rasters, region catalog and MaStR snapshot of a given parent are shared with the child.
+        """
+        self._settings = dict(case=case, db_path=db_path, datasource_path=datasource_path,
+                              intermediate_path=intermediate_path, dlm_basis_path=dlm_basis_path, hu_path=hu_path,
+                              use_intermediate=use_intermediate, intermediate_max_size=intermediate_max_size,
+                              pack_availability=pack_availability, use_distance_cache=use_distance_cache,
+                              max_distance=max_distance, share_layers=share_layers)
         self.case = case
-        self.techs = {"Wind": None,
-                      "OpenfieldPV": None,
-                      "OpenfieldPVRoads": None,
-                      "RooftopPV": None}
-        self.exclusionCalculators = {}
-        self.available_areas = {}
-        self.available_areas_old = {}
-        self.level = level
         self.db_path = db_path
         if self.db_path is None:
             self.db_path = os.path.join(utils.get_data_path(), "database")
@@ -83,6 +148,10 @@ class TREP(object):
         elif isinstance(self.datasource_path, str):
             pass  # Assume is path
         self.use_intermediate = use_intermediate
+        self.pack_availability = pack_availability
+        self.use_distance_cache = use_distance_cache
+        self.max_distance = max_distance
+        self.share_layers = share_layers
         self.intermediate_path = intermediate_path
         if self.intermediate_path is None:
             self.intermediate_path = os.path.join(utils.get_datasources_path(), "intermediates")
@@ -104,23 +173,37 @@ class TREP(object):
             self.hu_path = "/storage/internal/data/res/bkg/merged/300001227_2054_HU-DE/hu-de/"
         elif isinstance(self.hu_path, str):
             pass  # Assume is path
-        self.get_regionMask(srs, pixelRes)
         # TODO see how to add path for each case
         self.case_path = os.path.join(self.db_path, case)
         if not os.path.exists(self.case_path):
             os.mkdir(self.case_path)
-        if level == "nuts3":
-            self.get_municipalities()
-        # # TODO why only check for RoofPV? And why only for municipality?
-        # path = os.path.join(self.db_path, case, "RooftopPV_{}".format(self.id))
-        # if not os.path.exists(path) and self.level == "MUN":
-        #     os.mkdir(path)
+        if parent is None:
+            self.intermediate_cache = IntermediateCache(self.intermediate_path, max_size=intermediate_max_size)
+            self.distance_rasters = {}
+        else:
+            self.intermediate_cache = parent.intermediate_cache
+            self.distance_rasters = parent.distance_rasters
+            self._region_catalog = parent.region_catalog
+            self._mastr = getattr(parent, "_mastr", None)
 
-        self.add_all()
+    def _reset(self, region, level):
+        """Set the region and level and start without technologies and results."""
+        if not isinstance(region, list):
+            self.region = [region]
+        else:
+            self.region = region
+        self.level = level
+        self.techs = _Techs(self)
+        self.exclusionCalculators = {}
+        self.available_areas = {}
+        self.available_areas_old = {}
+        self.shared_layers = {}
 
     def get_regionMask(self, srs, pixelRes):
         """Load RegionMask.
 
+        The features of the region are selected from the region catalog, see RegionCatalog.
+
         Parameters
         ----------
         srs : int
@@ -128,77 +211,38 @@ class TREP(object):
         pixelRes : int
             pixel resolution
         """
-        if self.level == "MUN":
-            path = os.path.join(self.datasource_path,
-                                "germany_administrative",
-                                "vg250_ebenen",
-                                "VG250_GEM.shp")
-            for i, el in enumerate(self.region):
-                if el[0] in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]:
-                    _str = "RS='{}'".format(el)
-                else:
-                    _str = "GEN='{}'".format(el)
-                if i == 0:
-                    region_str = _str
-                else:
-                    region_str += " OR {}".format(_str)
-        elif self.level == "nuts3":
-            path = os.path.join(self.datasource_path,
-                                "germany_administrative",
-                                "vg250_ebenen",
-                                "VG250_KRS.shp")
-            for i, el in enumerate(self.region):
-                if el[0] in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]:
-                    _str = "RS='{}'".format(el)
-                else:
-                    _str = "GEN='{}'".format(el)
-                if i == 0:
-                    region_str = _str
-                else:
-                    region_str += " OR {}".format(_str)
+        print(self.region, flush=True)
+        if self.level == "country" and self.region[0] not in ("germany", "Deutschland"):
+            # TODO for off shore may also need to add a "elif"
+            self.features = self.region_catalog.get_features("state", None)
+        else:
+            self.features = self.region_catalog.get_features(self.level, self.region)
+        self._set_region(srs, pixelRes)
 
-        elif self.level == "state":
-            for i, el in enumerate(self.region):
-                path = os.path.join(self.datasource_path,
-                                    "germany_administrative",
-                                    "vg250_ebenen",
-                                    "VG250_LAN.shp")
-                if el[0] in ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]:
-                    _str = "RS='{}'".format(el)
-                else:
-                    _str = "GEN='{}'".format(el)
+    def _set_region(self, srs, pixelRes):
+        """Set the ids and the RegionMask of the region from its features."""
+        self._set_ids()
+        # the mask is rasterized only once for each region, level, srs and pixelRes
+        mask_cache = RegionMaskCache(os.path.join(self.intermediate_path, "region_masks"))
+        mask_path = mask_cache.get_path([f"{rs}_{gf}" for rs, gf in zip(self.features["RS"], self.features["GF"])],
+                                        self.level, srs, pixelRes, self.region_catalog.version)
+        # the cached mask holds the geometry of the region in its srs
+        self.regionMask = mask_cache.load(mask_path)
+        if self.regionMask is None:
+            # the geometries of the catalog are already valid
+            for i, geom in enumerate(self.features.geom.values):
                 if i == 0:
-                    region_str = _str
-                    if el == "NRW":
-                        region_str = "RS='05'"
-                    elif el == "Bayern":
-                        region_str = "RS='09'"
-                    elif el == "Baden-Württemberg":
-                        region_str = "RS='08'"
-                    elif el == "Thüringen":
-                        region_str = "RS='16'"
-                    elif el == "Schleswig-Holstein":
-                        region_str = "RS='01'"
+                    _geom = geom
                 else:
-                    if el == "Bayern":
-                        _str = "RS='09'"
-                    elif el == "Baden-Württemberg":
-                        _str = "RS='08'"
-                    region_str += " OR {}".format(_str)
-            region_str = f"({region_str}) and GF != 1"
-        elif self.level == "country":
-            path = os.path.join(self.datasource_path,
-                                "germany_administrative",
-                                "vg250_ebenen",
-                                "VG250_LAN.shp")
-            print(self.region, flush=True)
-            if self.region[0] in ("germany", "Deutschland"):
-                region_str = "GF != 1"
-            else:
-                # TODO for off shore may also need to add a "elif"
-                region_str = None
-        print(region_str)
-        self.features = gk.vector.extractFeatures(path, where=region_str)
+                    _geom = _geom.Union(geom)
+            self.regionMask = gk.RegionMask.fromGeom(_geom,
+                                                    srs=srs,
+                                                    pixelRes=pixelRes)
+            mask_cache.save(mask_path, self.regionMask)
+
+    def _set_ids(self):
+        """Set the ids of the region from its features."""
+        assert len(self.features) > 0, f"Couldn't find {self.region} in level {self.level}"
         if self.level == "MUN":
             self._id = self.features["RS"][0]
             self.rs = self.features["RS"][0]
@@ -215,37 +259,170 @@ class TREP(object):
             self._id = "00"
             self.rs = "00"
         self._state = self.rs[0:2]
-        if not all([geom.IsValid() for geom in self.features.geom]):
-            self.features.geom = self.features.apply(lambda x: x["geom"].Buffer(0),
-                                                    axis=1)
-            for i, geom in enumerate(self.features.geom.values):
-                if i == 0:
-                    _geom = geom
-                else:
-                    _geom = _geom.Union(geom)
-            self.regionMask = gk.RegionMask.fromGeom(_geom,
-                                                    srs=srs,
-                                                    pixelRes=pixelRes)
+
+    def child(self, region, level="MUN"):
+        """Create the TREP of a region within this region, e.g. of a municipality of a district.
+
+        The child is set up with the settings of this TREP and shares its intermediate cache and region catalog.
+        The mask of a municipality is cut out of the municipality labels of this region, so it is neither
+        rasterized nor read from the region mask cache. Children of other levels are set up as in __init__ with
+        the srs and pixelRes of this region.
+
+        Parameters
+        ----------
+        region : str
+            RS or name of the region
+        level : str, optional
+            level of the region, by default "MUN"
+
+        Returns
+        -------
+        TREP
+            TREP of the region
+        """
+        child = TREP.__new__(TREP)
+        child._set_settings(**self._settings, parent=self)
+        child._reset(region, level)
+        child.features = self.region_catalog.get_features(level, child.region)
+        regionMask = self._child_mask(child.features) if level == "MUN" else None
+        if regionMask is None:
+            child._set_region(self.regionMask.srs, self.regionMask.pixelRes)
         else:
-            self.regionMask = gk.RegionMask.fromVector(path,
-                                                    where=region_str,
-                                                    limitOne=False,
-                                                    srs=srs,
-                                                    pixelRes=pixelRes)
+            child._set_ids()
+            child.regionMask = regionMask
+        if level == "nuts3":
+            child.get_municipalities()
+        return child
+
+    def _child_mask(self, features):
+        """
+        Cut the mask of a municipality out of the municipality labels of the region.
+
+        The window of the mask is the bounding box of the features snapped to the grid of the region, like the
+        extent of gk.RegionMask.fromGeom. The geometry of the mask is derived from the mask when needed.
+
+        Parameters
+        ----------
+        features : pd.DataFrame
+            features of the municipality from the region catalog
+
+        Returns
+        -------
+        gk.RegionMask or None
+            mask of the municipality, None if it is not within the region
+        """
+        labels, rs = self.municipality_labels
+        i = np.searchsorted(rs, features["RS"][0])
+        if i == len(rs) or rs[i] != features["RS"][0]:
+            return None
+        envelopes = np.array([geom.GetEnvelope() for geom in features.geom.values])
+        extent = gk.Extent(envelopes[:, 0].min(), envelopes[:, 2].min(), envelopes[:, 1].max(),
+                           envelopes[:, 3].max(), srs=self.region_catalog.srs)
+        region = self.regionMask
+        if not self.region_catalog.srs.IsSame(region.srs):
+            # the corners of a transformed box do not bound the transformed region exactly
+            extent = extent.castTo(region.srs).pad(region.pixelWidth)
+        col_start = max(int(np.floor((extent.xMin - region.extent.xMin) / region.pixelWidth)), 0)
+        col_stop = min(int(np.ceil((extent.xMax - region.extent.xMin) / region.pixelWidth)), region.mask.shape[1])
+        row_start = max(int(np.floor((region.extent.yMax - extent.yMax) / region.pixelHeight)), 0)
+        row_stop = min(int(np.ceil((region.extent.yMax - extent.yMin) / region.pixelHeight)), region.mask.shape[0])
+        if col_start >= col_stop or row_start >= row_stop:
+            return None
+        window_extent = gk.Extent(region.extent.xMin + col_start * region.pixelWidth,
+                                  region.extent.yMax - row_stop * region.pixelHeight,
+                                  region.extent.xMin + col_stop * region.pixelWidth,
+                                  region.extent.yMax - row_start * region.pixelHeight,
+                                  srs=region.srs)
+        mask = labels[row_start:row_stop, col_start:col_stop] == i + 1
+        return gk.RegionMask.fromMask(window_extent, mask)
+
+    @property
+    def municipality_labels(self):
+        """Label raster of the municipalities on the grid of the region.
+
+        Returns
+        -------
+        tuple
+            label of the municipality of each pixel, 0 outside of the region, and the RS of the labels 1 to n
+        """
+        if getattr(self, "_municipality_labels", None) is None:
+            extent = self.regionMask.extent.castTo(self.region_catalog.srs)
+            municipalities = self.region_catalog.get_features_intersecting("MUN", *extent.xyXY)
+            rs = np.array(sorted(set(municipalities.RS)), dtype=object)
+            label = {_rs: i + 1 for i, _rs in enumerate(rs)}
+            labels = rasterize_labels(self.regionMask, municipalities.geom.values,
+                                      [label[_rs] for _rs in municipalities.RS])
+            self._municipality_labels = (labels, rs)
+        return self._municipality_labels
+
+    def contains(self, x, y, srs=None):
+        """Check which points are within the region, given by the pixel of each point in the RegionMask.
+
+        Parameters
+        ----------
+        x, y : np.ndarray
+            Coordinates of the points, e.g. lon and lat
+        srs : any, optional
+            spatial reference system of the points, by default the srs of the RegionMask
+
+        Returns
+        -------
+        np.ndarray
+            whether each point is within the region
+        """
+        x, y = transform_points(x, y, srs, self.regionMask.srs)
+        rows, cols, inside = pixel_index(self.regionMask, x, y)
+        return inside & self.regionMask.mask[rows, cols]
+
+    @property
+    def region_catalog(self):
+        """Catalog of the administrative regions, built in the intermediate path when VG250 changes."""
+        if getattr(self, "_region_catalog", None) is None:
+            vg250_path = os.path.join(self.datasource_path,
+                                      "germany_administrative",
+                                      "vg250_ebenen")
+            self._region_catalog = RegionCatalog.open(
+                vg250_path, os.path.join(self.intermediate_path, "region_catalog.sqlite"))
+        return self._region_catalog
+
+    @property
+    def mastr(self):
+        """Columnar snapshot of the MaStR, compiled in the intermediate path when mastr.db changes."""
+        if getattr(self, "_mastr", None) is None:
+            self._mastr = MastrSnapshot.open(
+                os.path.join(self.datasource_path, "mastr", "mastr.db"),
+                os.path.join(self.intermediate_path, "mastr"))
+        return self._mastr
+
+    def get_existing_assets(self, kind, ags=None):
+        """
+        Get the existing units of a technology from the registry of the process, see trep.asset_registry.
+
+        Parameters
+        ----------
+        kind : str
+            ["Wind", "OpenfieldPV", "RooftopPV"]
+        ags : str, optional
+            AGS of a municipality. The units of the municipality are returned instead of the units in the bounding
+            box of the region, by default None
+
+        Returns
+        -------
+        pd.DataFrame
+            the existing units
+        """
+        if kind == "RooftopPV":
+            source = os.path.join(self.datasource_path, "mastr", "pv_groups.csv")
+        else:
+            source = self.mastr
+        registry = asset_registry.get_registry(kind, self._state, source)
+        if ags is not None:
+            return registry.get_municipality(ags)
+        return registry.query_extent(self.regionMask.extent)
 
     def get_municipalities(self):
         """Get the municipalities in a region."""
-        path = os.path.join(self.datasource_path,
-                            "germany_administrative",
-                            "vg250_ebenen",
-                            "VG250_GEM.shp")
-        # mun_string = "RS='{}'".format(self._id)
-        self.municipalities = gk.vector.extractFeatures(path)
-        self.municipalities["RS_nuts"] = self.municipalities.apply(
-            lambda x: x["RS"][0:5], axis=1)
-        self.municipalities = \
-            self.municipalities.loc[
-                self.municipalities.RS_nuts == self.rs]["RS"].values
+        self.municipalities = self.region_catalog.get_children(self.rs, level="MUN")
 
     def get_population(self):
         """Get the population of the region.
@@ -255,26 +432,14 @@ class TREP(object):
         NotImplementedError
             when level of region is not implemented
         """
-        path = os.path.join(
-            self.datasource_path,
-            "other", "Zensus2011_Bevoelkerung",
-            "Zensus11_Datensatz_Bevoelkerung.csv")
-        df_zensus = pd.read_csv(
-            path, sep=";", encoding="utf-8",
-            dtype={"AGS_12": str, "RS_Land": str, "RS_RB_NUTS2": str,
-                   "RS_Kreis": str, "RS_VB": str, "RS_Gem": str})
+        df_zensus = utils.get_zensus(self.datasource_path)
         if self.level == "nuts3":
-            df_zensus = df_zensus[df_zensus.Reg_Hier ==
-                                  "Stadtkreis/kreisfreie Stadt/Landkreis"]
-            df_zensus["RS"] = df_zensus["RS_Land"] + \
-                df_zensus["RS_RB_NUTS2"] + df_zensus["RS_Kreis"]
+            self.zensus = df_zensus[(df_zensus.Reg_Hier == "Stadtkreis/kreisfreie Stadt/Landkreis") &
+                                    (df_zensus.RS_nuts3 == self.rs)]
         elif self.level == "MUN":
-            df_zensus["RS"] = df_zensus["RS_Land"] + \
-                df_zensus["RS_RB_NUTS2"] + df_zensus["RS_Kreis"] + \
-                df_zensus["RS_VB"] + df_zensus["RS_Gem"]
+            self.zensus = df_zensus[df_zensus.RS == self.rs]
         else:
             raise NotImplementedError
-        self.zensus = df_zensus[df_zensus.RS == self.rs]
         self.population = self.zensus["AEWZ"].values[0]
 
     def new_ec(self, **args):
@@ -319,7 +484,7 @@ class TREP(object):
         for tech in techs:
             if self.techs[tech] is None:
                 self.add_tech(tech)
-            if self.techs[tech].ec.percentAvailable == 100 or self.techs[tech].ec.percentAvailable == 0:
+            if self.techs[tech].eligible.percentAvailable in [100, 0]:
                 self.techs[tech].run_exclusion()
             ecs.append(self.techs[tech].ec)
         for i, ec in enumerate(ecs):
@@ -336,13 +501,14 @@ class TREP(object):
             self.techs[tech].ec = ecs[i]
             self.techs[tech].predicted_items = None
             self.techs[tech].distribute_items()
+            self.techs[tech]._repack()
 
     def estimate_hybrid_potential(self):
         """Estimate the potential of using OFPV in the usable wind areas."""
         # Make all Openfield PV area unavailable
         self.OpenfieldPV.ec._availability.fill(0)
         # If wind potential has not been evaluated, do so
-        if self.Wind.ec.percentAvailable == 100:
+        if self.Wind.eligible.percentAvailable == 100:
             self.Wind.estimate_potential()
         # Re-Include areas, which are used for wind
         raster = self.Wind.ec.region.createRaster(
@@ -354,6 +520,8 @@ class TREP(object):
         self.OpenfieldPV._run_exclusion(
             exclusion_dict={'agriculture': 0, 'forests': 0})
         self.OpenfieldPV.distribute_items()
+        self.Wind._repack()
+        self.OpenfieldPV._repack()
 
     def sim_all(self):
         """Simulate predicted and existing items of technologies."""
@@ -523,8 +691,11 @@ class TREP(object):
                         "ts_{}_{}.csv".format(tech, "".join(self.id))))
             if self.techs[tech].report_dict is not None:
                 self.techs[tech].save_report(os.path.join(self.techs[tech].result_path, "report.json"))
-                self.techs[tech].ec.save(os.path.join(self.techs[tech].result_path, f"{tech}_potential_area.tif"))
-                if self.techs[tech].ec._itemCoords is not None and self.techs[tech].ec._itemCoords.shape[0] > 0:
+                self.techs[tech].eligible.save(os.path.join(self.techs[tech].result_path,
+                                                            f"{tech}_potential_area.tif"))
+                # the ExclusionCalculator is not unpacked to check for items
+                item_coords = getattr(self.techs[tech]._ec, "_itemCoords", None)
+                if item_coords is not None and item_coords.shape[0] > 0:
                     self.techs[tech].save_items_to_vector(os.path.join(self.techs[tech].result_path,
                                                                        f"{tech}_potential_items.shp")
                                                           )
@@ -532,7 +703,7 @@ class TREP(object):
     def all_to_db(self):
         """Save all techs to database."""
         for tech in self.techs.keys():
-            if self.techs[tech] is not None:
+            if self.techs.get(tech) is not None:
                 self.to_db(tech)
         # TODO what is existing_wind_to_db()
         # self.existing_wind_to_db()
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from sqlalchemy import create_engine
 import pandas as pd
 import statsmodels.formula.api as smf
@@ -51,6 +52,109 @@ def get_osm_path(state):
                         _map_state_osm[state])
 
 
+# ENH_Bundesland of the federal states in the MaStR
+MASTR_STATES = {
+    "01": "Schleswig-Holstein",
+    "02": "Hamburg",
+    "03": "Niedersachsen",
+    "04": "Bremen",
+    "05": "Nordrhein-Westfalen",
+    "06": "Hessen",
+    "07": "Rheinland-Pfalz",
+    "08": "Baden-Württemberg",
+    "09": "Bayern",
+    "10": "Saarland",
+    "11": "Berlin",
+    "12": "Brandenburg",
+    "13": "Mecklenburg-Vorpommern",
+    "14": "Sachsen",
+    "15": "Sachsen-Anhalt",
+    "16": "Thüringen"
+}
+
+
+def get_mastr_state(state):
+    """Return the ENH_Bundesland of a federal state in the MaStR.
+
+    Parameters
+    ----------
+    state : str
+        number of federal state ("01" to "16") or ENH_Bundesland
+
+    Returns
+    -------
+    str
+        ENH_Bundesland of the federal state
+
+    Raises
+    ------
+    ValueError
+        if the federal state is unknown
+    """
+    if state in MASTR_STATES.values():
+        return state
+    if state not in MASTR_STATES:
+        raise ValueError(f"Unknown federal state {state}")
+    return MASTR_STATES[state]
+
+
+@lru_cache(maxsize=None)
+def get_zensus(datasource_path):
+    """Load the population of the Zensus 2011 once per process.
+
+    The returned DataFrame is shared by all callers and must not be changed.
+
+    Parameters
+    ----------
+    datasource_path : str
+        Path that indicate the datasources
+
+    Returns
+    -------
+    pd.DataFrame
+        Zensus data with the RS of municipalities in "RS" and the RS of districts in "RS_nuts3"
+    """
+    path = os.path.join(
+        datasource_path,
+        "other", "Zensus2011_Bevoelkerung",
+        "Zensus11_Datensatz_Bevoelkerung.csv")
+    df_zensus = pd.read_csv(
+        path, sep=";", encoding="utf-8",
+        dtype={"AGS_12": str, "RS_Land": str, "RS_RB_NUTS2": str,
+               "RS_Kreis": str, "RS_VB": str, "RS_Gem": str})
+    df_zensus["RS_nuts3"] = df_zensus["RS_Land"] + df_zensus["RS_RB_NUTS2"] + df_zensus["RS_Kreis"]
+    df_zensus["RS"] = df_zensus["RS_nuts3"] + df_zensus["RS_VB"] + df_zensus["RS_Gem"]
+    return df_zensus
+
+
+@lru_cache(maxsize=None)
+def get_population_table(datasource_path, level):
+    """Population of all municipalities or districts of the Zensus 2011 indexed by RS.
+
+    Parameters
+    ----------
+    datasource_path : str
+        Path that indicate the datasources
+    level : str
+        ["MUN", "nuts3"]
+
+    Returns
+    -------
+    pd.Series
+        population (AEWZ) indexed by RS
+    """
+    df_zensus = get_zensus(datasource_path)
+    if level == "nuts3":
+        df_zensus = df_zensus[df_zensus.Reg_Hier == "Stadtkreis/kreisfreie Stadt/Landkreis"]
+        population = df_zensus.set_index("RS_nuts3")["AEWZ"]
+    elif level == "MUN":
+        df_zensus = df_zensus[df_zensus.Reg_Hier == "Gemeinde"]
+        population = df_zensus.set_index("RS")["AEWZ"]
+    else:
+        raise NotImplementedError
+    return population[~population.index.duplicated()]
+
+
 def df_to_sqlite(df, name, sqlite_path, **kwargs):
     """Write dataframe to sqlite database.
 
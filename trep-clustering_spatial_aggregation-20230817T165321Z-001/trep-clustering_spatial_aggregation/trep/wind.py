@@ -1,15 +1,14 @@
 from trep.technology import Technology
+from trep.availability import grow_areas, read_region
+from trep.region_labels import point_coordinates
 import geokit as gk
 import os
 from trep import utils
 import trep
 import pandas as pd
-import copy
 import numpy as np
 from trep.utils import rename_columns, fill_rotor_diameter
-import osgeo
 from warnings import warn
-from sqlalchemy import create_engine
 import time
 import xarray as xr
 import reskit as rk
@@ -115,36 +114,15 @@ class Wind(Technology):
                              "nabenhoehe": "ENH_Nabenhoehe"})
                 if _exItem.ENH_Rotordurchmesser.isna().any():
                     _exItem = fill_rotor_diameter(_exItem, self.parent.datasource_path)
-                exItem = []
-                for row in _exItem.iterrows():
-                    exItem.append(
-                        [row[1]["geom"].GetX(), row[1]["geom"].GetY()]
-                    )
-                exItem = np.array(exItem)
-                exItem = \
-                    gk.srs.xyTransform(exItem, fromSRS=25832,
-                                       toSRS=self.parent.regionMask.srs)
-                _exItem["location"] = _exItem.apply(
-                    lambda x: np.array(
-                        gk.srs.xyTransform(
-                            np.array(
-                                [[x["geom"].GetX(),
-                                  x["geom"].GetY()]]),
-                            fromSRS=25832, toSRS=self.parent.regionMask.srs)),
-                    axis=1)
-                _exItem["location"] = _exItem.apply(lambda x: np.array(
-                    [x["location"][0][0], x["location"][0][1]]), axis=1)
-                _coor = gk.srs.xyTransform(
-                    exItem, fromSRS=self.parent.regionMask.srs, toSRS=4326)
+                x, y = point_coordinates(_exItem["geom"])
                 self.existing_items["capacity"] = \
                     _exItem["ENH_Nettonennleistung"]
                 self.existing_items["rotor_diam"] = \
                     _exItem["ENH_Rotordurchmesser"]
                 self.existing_items["hub_height"] = \
                     _exItem["ENH_Nabenhoehe"].replace(0, np.nan)
-                self.existing_items["lat"] = [i[1] for i in _coor]
-                self.existing_items["lon"] = [i[0] for i in _coor]
-                self.existing_items["location"] = _exItem["location"]
+                self.existing_items = self._set_item_locations(
+                    self.existing_items, x, y, srs=25832)
                 self.existing_items["geom"] = _exItem["geom"]
                 print("Existing capacity " +
                       f"{self.existing_items['capacity'].sum()/1e3} GW",
@@ -173,36 +151,15 @@ class Wind(Technology):
                                  "NABENHOEHE": "ENH_Nabenhoehe"})
                     if _exItem.ENH_Rotordurchmesser.isna().any():
                         _exItem = fill_rotor_diameter(_exItem, self.parent.datasource_path)
-                    exItem = []
-                    for row in _exItem.iterrows():
-                        exItem.append(
-                            [row[1]["geom"].GetX(), row[1]["geom"].GetY()]
-                        )
-                    exItem = np.array(exItem)
-                    exItem = \
-                        gk.srs.xyTransform(exItem, fromSRS=25832,
-                                           toSRS=self.parent.regionMask.srs)
-                    _exItem["location"] = \
-                        _exItem.apply(lambda x: np.array(
-                            gk.srs.xyTransform(
-                                np.array(
-                                    [[x["geom"].GetX(), x["geom"].GetY()]]),
-                                fromSRS=25832,
-                                toSRS=self.parent.regionMask.srs)),
-                        axis=1)
-                    _exItem["location"] = _exItem.apply(lambda x: np.array(
-                        [x["location"][0][0], x["location"][0][1]]), axis=1)
-                    _coor = gk.srs.xyTransform(
-                        exItem, fromSRS=self.parent.regionMask.srs, toSRS=4326)
+                    x, y = point_coordinates(_exItem["geom"])
                     self.existing_items["capacity"] = \
                         _exItem["ENH_Nettonennleistung"]
                     self.existing_items["rotor_diam"] = \
                         _exItem["ENH_Rotordurchmesser"]
                     self.existing_items["hub_height"] = \
                         _exItem["ENH_Nabenhoehe"].replace(0, np.nan)
-                    self.existing_items["lat"] = [i[1] for i in _coor]
-                    self.existing_items["lon"] = [i[0] for i in _coor]
-                    self.existing_items["location"] = _exItem["location"]
+                    self.existing_items = self._set_item_locations(
+                        self.existing_items, x, y, srs=25832)
                     self.existing_items["geom"] = _exItem["geom"]
             elif self.parent._state == "01" and not mastr:
                 # Data from Schleswig-Holstein
@@ -228,45 +185,25 @@ class Wind(Technology):
                     columns={"ROTORDURCH": "ENH_Rotordurchmesser",
                              "LEISTUNG": "ENH_Nettonennleistung",
                              "NABENHÖHE": "ENH_Nabenhoehe"})
-                # Processing German entries (, --> .)
-                for idx, row in _exItem.iterrows():
-                    if isinstance(row["ENH_Rotordurchmesser"], str):
-                        try:
-                            _el = row["ENH_Rotordurchmesser"].replace(",", ".")
-                            _exItem.loc[idx, "ENH_Rotordurchmesser"] = float(
-                                _el)
-                        except Exception as e:
-                            _exItem.loc[idx, "ENH_Rotordurchmesser"] = np.nan
-                            print(e)
-                    if isinstance(row["ENH_Nabenhoehe"], str):
-                        try:
-                            _el = row["ENH_Nabenhoehe"].replace(",", ".")
-                            _exItem.loc[idx, "ENH_Nabenhoehe"] = float(_el)
-                        except Exception as e:
-                            print("hub height not defined")
-                            _exItem.loc[idx, "ENH_Nabenhoehe"] = np.nan
-                            print(e)
+                # Processing German entries (, --> .), entries which are
+                # no numbers are not defined
+                for col in ["ENH_Rotordurchmesser", "ENH_Nabenhoehe"]:
+                    _exItem[col] = pd.to_numeric(
+                        _exItem[col].replace(",", ".", regex=True),
+                        errors="coerce")
                 if _exItem.ENH_Rotordurchmesser.isna().any():
                     _exItem = fill_rotor_diameter(_exItem, self.parent.datasource_path)
-                exItem = []
-                for row in _exItem.iterrows():
-                    exItem.append(
-                        [row[1]["geom"].GetX(), row[1]["geom"].GetY()]
-                    )
-                exItem = np.array(exItem)
-                exItem = gk.srs.xyTransform(
-                    exItem, fromSRS=_exItem["geom"][0].GetSpatialReference(),
-                    toSRS=self.parent.regionMask.srs)
-                _coor = gk.srs.xyTransform(
-                    exItem, fromSRS=self.parent.regionMask.srs, toSRS=4326)
+                x, y = point_coordinates(_exItem["geom"])
                 self.existing_items["capacity"] = \
                     _exItem["ENH_Nettonennleistung"]
                 self.existing_items["rotor_diam"] = \
                     _exItem["ENH_Rotordurchmesser"]
                 self.existing_items["hub_height"] = \
                     _exItem["ENH_Nabenhoehe"].replace(0, np.nan)
-                self.existing_items["lat"] = [i[1] for i in _coor]
-                self.existing_items["lon"] = [i[0] for i in _coor]
+                if len(_exItem) > 0:
+                    self.existing_items = self._set_item_locations(
+                        self.existing_items, x, y,
+                        srs=_exItem["geom"].values[0].GetSpatialReference())
                 self.existing_items["BST_NR"] = _exItem["BST_NR"]
                 self.existing_items["geom"] = _exItem["geom"]
                 self.existing_items["STATUS"] = _exItem["STATUS"]
@@ -276,53 +213,13 @@ class Wind(Technology):
                         "For federal state {} ".format(self.parent.state) +
                         "only existing plants from mastr are available ",
                         UserWarning)
-                # Get data from mastr
-                _regions = []
-                # First get all items in federal state.
-                # TODO: Map all states, maybe in utils (@Junsong)
-                if self.parent._state == "01":
-                    existing_str = "ENH_Bundesland='Schleswig-Holstein'"
-                elif self.parent._state == "03":
-                    existing_str = "ENH_Bundesland='Niedersachsen'"
-                elif self.parent._state == "05":
-                    existing_str = "ENH_Bundesland='Nordrhein-Westfalen'"
-                elif self.parent._state == "07":
-                    existing_str = "ENH_Bundesland='Rheinland-Pfalz'"
-                elif self.parent._state == "12":
-                    existing_str = "ENH_Bundesland='Brandenburg'"
-                elif self.parent._state == "16":
-                    existing_str = "ENH_Bundesland='Thüringen'"
-                else:
-                    raise ValueError("State not implemented yet")
-                # Get raw data for wind turbines from db
-                query = "SELECT ENH_MastrID, ENH_Nettonennleistung," + \
-                    "ENH_Plz, ENH_InbetriebnahmeDatum, " + \
-                    "ENH_Rotordurchmesser, ENH_Nabenhoehe, " + \
-                    "ENH_Breitengrad, ENH_Laengengrad, ENH_Seelage " + \
-                    "FROM processed WHERE " + \
-                    "ENH_EinheitenTyp='Windeinheit' and " +\
-                    "ENH_Betriebsstatus='In Betrieb' and ({})".format(
-                        existing_str)
-                # raw_wts = db_query(query)
-                engine = create_engine(
-                    "sqlite:///" + os.path.join(
-                        self.parent.datasource_path,
-                        "mastr", "mastr.db") + "/?charset=utf8mb4")
-                raw_wts = pd.read_sql(sql=query, con=engine)
-                # TODO: Filter in DB!
+                # Get raw data for wind turbines in the bounding box of the
+                # region from the registry of existing units
+                raw_wts = self.parent.get_existing_assets("Wind")
                 # raw_wts = fill_rotor_diameter(raw_wts)
-                # Geometry processing. First get point geometry of coordinate.
-                raw_wts["geom"] = raw_wts.apply(lambda x: gk.geom.point(
-                    [x["ENH_Laengengrad"], x["ENH_Breitengrad"]]), axis=1)
-                # Then check if point is within regionMask.
-                _rm_lat_lon = gk.geom.transform(
-                    self.parent.regionMask.geometry, toSRS=4326)
-                raw_wts["Within"] = raw_wts.apply(
-                    lambda x: osgeo.ogr.Geometry.Within(
-                        x["geom"],
-                        _rm_lat_lon),
-                    axis=1)
-                raw_wts = raw_wts[raw_wts["Within"]]
+                # Check if point is within regionMask.
+                raw_wts = raw_wts[self.parent.contains(
+                    raw_wts["ENH_Laengengrad"], raw_wts["ENH_Breitengrad"], srs=4326)]
                 # Some filtering (No wts > 10MW, No diameter >500)
                 _filtered_wts = \
                     raw_wts[raw_wts["ENH_Nettonennleistung"] < 10*1e3]
@@ -345,20 +242,15 @@ class Wind(Technology):
                         UserWarning)
                 print("Existing Turbines", len(self.existing_items), flush=True)
                 if len(self.existing_items) > 0:
-                    self.existing_items["location"] = \
-                        self.existing_items.apply(
-                            lambda x: np.array(gk.srs.xyTransform(np.array(
-                                [[x["ENH_Laengengrad"],
-                                  x["ENH_Breitengrad"]]]),
-                                fromSRS=4326,
-                                toSRS=self.parent.regionMask.srs)),
-                        axis=1)
-                    self.existing_items["location"] = \
-                        self.existing_items.apply(
-                            lambda x: np.array(
-                                [x["location"][0][0], x["location"][0][1]]),
-                            axis=1)
                     self.existing_items = rename_columns(self.existing_items)
+                    self.existing_items = self._set_item_locations(
+                        self.existing_items, self.existing_items["lon"].values,
+                        self.existing_items["lat"].values, srs=4326)
+                    # Point geometries only of the items in the region
+                    self.existing_items["geom"] = [
+                        gk.geom.point(lon, lat, srs=4326) for lon, lat in
+                        zip(self.existing_items["lon"],
+                            self.existing_items["lat"])]
                     # Drop not needed columns
                     for col in self.existing_items.columns:
                         if "ENH_" in col:
@@ -366,8 +258,8 @@ class Wind(Technology):
                                 columns=col)
             # Add points to Exclusion Calculator
             if len(self.existing_items) > 0:
-                ec._existingItemCoords = np.array(
-                    [i for i in self.existing_items["location"].values])
+                ec._existingItemCoords = \
+                    self.existing_items[["x", "y"]].values
         # else:
         #     if ec._existingItemCoords is None:
         #         if len(self.existing_items) > 0:
@@ -393,22 +285,20 @@ class Wind(Technology):
         print("Getting existing Items")
         self.get_existing_plants(self.ec, **args)
         if len(self.existing_items) > 0:
-            if self.wind_dir == "from_era":
-                wind_dir_raster = gk.raster.loadRaster(
-                    os.path.join(self.parent.datasource_path, "era5",
-                                 "ERA5_wind_direction_100m_mean.tiff"))
-                # TODO: Rename to direction
-                # Direction has to be in vector file or dataframe
-                self.existing_items["direction"] = \
-                    self.existing_items.apply(
-                        lambda x: gk.raster.interpolateValues(
-                            wind_dir_raster, x["geom"]),
-                        axis=1)
-            for idx, row in self.existing_items.iterrows():
-                self.existing_items.loc[idx, "distance"] = row["rotor_diam"] if row["rotor_diam"] > self.target_diameter else self.target_diameter
-            self.existing_items["scale"] = self.existing_items.apply(lambda x: np.array([self.distance[0]*x["distance"], self.distance[1]*x["distance"]]), axis=1)
-            # TODO: Moved to glaes#
-            self.ec.excludePoints(self.existing_items, geometry_shape, save_to_ec="Existing Turbines")
+            self.existing_items["direction"] = self.get_wind_direction(
+                self.existing_items["lon"].values,
+                self.existing_items["lat"].values)
+            # rotor diameter, at least the target diameter
+            self.existing_items["distance"] = np.fmax(
+                self.existing_items["rotor_diam"].values.astype(float),
+                self.target_diameter)
+            distance = self.existing_items["distance"].values
+            self.exclude_footprints(
+                self.existing_items,
+                np.column_stack([self.distance[0] * distance,
+                                 self.distance[1] * distance]),
+                direction=self.existing_items["direction"].values,
+                geometry_shape=geometry_shape)
         print("Done excluding existing, took {} minutes".format(
             (time.time()-start)/60), flush=True)
         if self.parent.OpenfieldPV.existing_items is None:
@@ -417,11 +307,12 @@ class Wind(Technology):
                 # distance from PV-loc: sqrt(14m^2/kWp * pv_cap) -->
                 # distance equally in both directions
                 # (14m2 from Frauenhofer recent facts)
-            self.parent.OpenfieldPV.existing_items["scale"] = self.parent.OpenfieldPV.existing_items.apply(
-                lambda x: np.array([np.sqrt(x["capacity"] * 14) / 2, np.sqrt(x["capacity"] * 14) / 2]), axis=1)
+            half_width = np.sqrt(
+                self.parent.OpenfieldPV.existing_items["capacity"].values.astype(float) * 14) / 2
             self.parent.OpenfieldPV.existing_items["direction"] = 0
-            self.ec.excludePoints(self.parent.OpenfieldPV.existing_items,
-                                 geometry_shape="rectangle", save_to_ec="existing Openfield")
+            self.exclude_footprints(self.parent.OpenfieldPV.existing_items,
+                                    np.column_stack([half_width, half_width]),
+                                    geometry_shape="rectangle")
 
     def run_exclusion(self, exclusion_dict=None, update=True, **kwargs):
         """Run exclusion to estimate potential eligible area for wind.
@@ -466,10 +357,11 @@ class Wind(Technology):
         # Not exclude small area, when all areas are already excluded
         if self.ec.percentAvailable > 0:
             self.ec.pruneIsolatedAreas(minSize=10000)
-            # write results in dictionary
+        self._repack()
+        # write results in dictionary
         report_dict["Total_Area"] = int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2)
-        report_dict["Eligible_Area"] = self.ec.areaAvailable
-        report_dict["Eligible_Percentage"] = self.ec.percentAvailable
+        report_dict["Eligible_Area"] = self.eligible.areaAvailable
+        report_dict["Eligible_Percentage"] = self.eligible.percentAvailable
         return report_dict
 
     def distribute_items(self, **args):
@@ -477,13 +369,12 @@ class Wind(Technology):
         print(self.distance)
         distance = tuple((i*self.target_diameter for i in self.distance))
         print("Distance between turbines ", distance, flush=True)
+        # the separation ellipses have the direction of the footprints of exclude_footprints
         if self.wind_dir == "from_era":
-            _wind_dir = os.path.join(
-                self.parent.datasource_path, "era5",
-                "ERA5_wind_direction_100m_mean.tiff")
+            _wind_dir = self.get_wind_direction_raster()
         else:
             assert isinstance(self.wind_dir, int)
-            _wind_dir = self.wind_dir
+            _wind_dir = np.mod(self.wind_dir, 180)
         coordinates = self.ec.distributeItems(axialDirection=_wind_dir,
                                               separation=distance,
                                               outputSRS=4326,
@@ -498,113 +389,126 @@ class Wind(Technology):
         df_items["hub_height"] = self.hub_height
         self.predicted_items = df_items
 
-    def restrict_area(self, share=0.01, tolerance=0.00001, step=0.00001):
+    def get_wind_direction(self, lon, lat):
+        """Get the main wind direction at points as axis for exclude_footprints.
+
+        The direction is given in degrees counterclockwise from the x axis
+        (0: west, 90: south, see stamp_footprints). Era5 gives the
+        meteorological direction, i.e. where the wind comes from in degrees
+        clockwise from north, which is converted by 90 - direction.
+
+        Parameters
+        ----------
+        lon, lat : np.ndarray
+            coordinates of the points
+
+        Returns
+        -------
+        np.ndarray
+            main wind direction of each point in [0, 180), from Era5 if
+            wind_dir is 'from_era', else wind_dir
+        """
+        if self.wind_dir == "from_era":
+            meteorological = np.asarray(gk.raster.interpolateValues(
+                self._era5_wind_direction_path, list(zip(lon, lat)),
+                pointSRS=4326), dtype=float)
+            return self._axial_direction(meteorological)
+        return np.full(len(lon), np.mod(self.wind_dir, 180), dtype=float)
+
+    def get_wind_direction_raster(self):
+        """Get the main wind direction from Era5 on the grid of the region.
+
+        The direction is converted like in get_wind_direction, so the
+        separation of placed turbines in distribute_items and the
+        footprints of exclude_footprints have the same direction.
+
+        Returns
+        -------
+        np.ndarray
+            main wind direction of each pixel in [0, 180)
+        """
+        return self._axial_direction(
+            self.parent.regionMask.warp(self._era5_wind_direction_path))
+
+    @property
+    def _era5_wind_direction_path(self):
+        """Path of the mean Era5 wind direction at 100m."""
+        return os.path.join(self.parent.datasource_path, "era5",
+                            "ERA5_wind_direction_100m_mean.tiff")
+
+    @staticmethod
+    def _axial_direction(meteorological):
+        """Convert the meteorological direction (where the wind comes from,
+        clockwise from north) to the axis counterclockwise from the x axis."""
+        return np.mod(90 - np.asarray(meteorological, dtype=float), 180)
+
+    def restrict_area(self, share=0.01, tolerance=0.00001, step=None, min_size=10000, wind_100m=None):
         """Restrict usable area for wind to certain share.
 
-        Parameters 
+        The available pixels with the highest wind speed at 100m are kept. Isolated areas smaller than min_size
+        are pruned, so the wind speed threshold is found by trep.availability.grow_areas from the histogram of the
+        wind speed of the available pixels and a union-find of the areas. Then the smallest remaining areas are
+        pruned as long as the share stays within the tolerance.
+
+        Parameters
         ----------
         share : float, optional
             desired share of area, by default 0.01
         tolerance : float, optional
             acceptable tolerance in share, by default 0.00001
         step : float, optional
-            step size, by default 0.00001
+            deprecated and ignored, the threshold is found without steps, by default None
+        min_size : float, optional
+            minimal size of an area in m², by default 10000
+        wind_100m : dict, optional
+            Entry of wind_100m in the exclusion dictionary to take the source of the wind speed from, by default
+            the default source of the exclusion
         """
-        _exclusion_dict = self.load_exclusionDict("restrict_areas")
-        # while self.ec.percentAvailable/100 > (share + 0.5):
-        #     self.run_exclusion(_exclusion_dict)
-        #     _exclusion_dict["wind_100m_era"] += 0.1
-        temp0 = copy.copy(self.ec)
-        temp1 = copy.copy(self.ec)
-        temp2 = copy.copy(self.ec)
-        temp3 = copy.copy(self.ec)
-        temp4 = copy.copy(self.ec)
-        temp5 = copy.copy(self.ec)
-        temp6 = copy.copy(self.ec)
-        print("0st step size")
-        while temp6.percentAvailable / 100 > (share):
-            _exclusion_dict["wind_100m"] += step * 1000000
-            self._run_exclusion(ec=temp6, exclusion_dict=_exclusion_dict)
-        _exclusion_dict["wind_100m"] -= step * 1000000
-        while temp5.percentAvailable / 100 > (share):
-            _exclusion_dict["wind_100m"] += step * 100000
-            self._run_exclusion(ec=temp5, exclusion_dict=_exclusion_dict)
-        _exclusion_dict["wind_100m"] -= step * 100000
-        while temp0.percentAvailable / 100 > (share):
-            _exclusion_dict["wind_100m"] += step * 10000
-            self._run_exclusion(ec=temp0, exclusion_dict=_exclusion_dict)
-        _exclusion_dict["wind_100m"] -= step * 10000
-        print("First step size")
-        while temp1.percentAvailable/100 > (share):
-            _exclusion_dict["wind_100m"] += step*1000
-            self._run_exclusion(ec=temp1, exclusion_dict=_exclusion_dict)
-        _exclusion_dict["wind_100m"] -= step*1000
-        print("Second step size")
-        while temp2.percentAvailable/100 > (share):
-            _exclusion_dict["wind_100m"] += step*100
-            self._run_exclusion(ec=temp2, exclusion_dict=_exclusion_dict)
-            # temp1.pruneIsolatedAreas(minSize=10000)
-        _exclusion_dict["wind_100m"] -= step*100
-        print("Third step size")
-        while temp3.percentAvailable/100 > (share):
-            _exclusion_dict["wind_100m"] += step*10
-            self._run_exclusion(ec=temp3, exclusion_dict=_exclusion_dict)
-        _exclusion_dict["wind_100m"] -= step*10
-        while temp4.percentAvailable/100 > (share):
-            _exclusion_dict["wind_100m"] += step
-            self._run_exclusion(ec=temp4, exclusion_dict=_exclusion_dict)
-        print("Final step size")
-        temp = copy.copy(self.ec)
-        self._run_exclusion(ec=temp, exclusion_dict=_exclusion_dict)
-        if temp.percentAvailable > 0:
-            temp.pruneIsolatedAreas(minSize=10000)
-        count = 0
-        while temp.percentAvailable / 100 < (share):
-            count += 1
-            temp = copy.copy(self.ec)
-            _exclusion_dict["wind_100m"] -= step*100
-            self._run_exclusion(ec=temp, exclusion_dict=_exclusion_dict)
-            if temp.percentAvailable > 0:
-                temp.pruneIsolatedAreas(minSize=10000)
-            if count % 100 == 0:
-                print(count)
-                print(temp.percentAvailable)
-        print(temp.percentAvailable)
-        _exclusion_dict["wind_100m"] += step * 100
-        temp = copy.copy(self.ec)
-        self._run_exclusion(ec=temp, exclusion_dict=_exclusion_dict)
-        if temp.percentAvailable > 0:
-            temp.pruneIsolatedAreas(minSize=10000)
-        count = 0
-        while temp.percentAvailable / 100 < (share - 0.00004):
-            count += 1
-            temp = copy.copy(self.ec)
-            _exclusion_dict["wind_100m"] -= step
-            self._run_exclusion(ec=temp, exclusion_dict=_exclusion_dict)
-            if temp.percentAvailable > 0:
-                temp.pruneIsolatedAreas(minSize=10000)
-            if count % 100 == 0:
-                print(count)
-                print(temp.percentAvailable)
-        if temp.percentAvailable / 100 < (
-                share - 0.002) or temp.percentAvailable / 100 > (
-                share + 0.002):
+        if step is not None:
+            warn("step of restrict_area is deprecated and ignored", DeprecationWarning)
+        region = self.ec.region
+        wind_speed = self._warp_raster_layer("wind_100m", wind_100m)
+        available = (self.ec._availability > 0) & region.mask
+        region_pixels = region.mask.sum()
+        target_pixels = share * region_pixels
+        pixel_area = region.pixelWidth * region.pixelHeight
+        if available.sum() < target_pixels:
+            raise ValueError(
+                "Couldn't meet percentage within tolerance. " +
+                "Available percentage is already: ", self.ec.percentAvailable)
+        min_pixels = int(np.ceil(min_size / pixel_area))
+        threshold, pixels, areas, sizes = grow_areas(
+            wind_speed, available, target_pixels, min_pixels=min_pixels,
+            chunk_pixels=max(int(tolerance * region_pixels), 1))
+        print(f"Wind speed threshold at 100m: {threshold}", flush=True)
+
+        # prune the small areas and then the smallest areas while the share is still within the tolerance
+        size_order = np.argsort(sizes, kind="stable")
+        kept = sizes >= min_pixels
+        kept[0] = False
+        kept_pixels = sizes[kept].sum()
+        size = min_size
+        for label in size_order:
+            if not kept[label]:
+                continue
+            if kept_pixels <= (share + tolerance) * region_pixels or \
+                    kept_pixels - sizes[label] < (share - tolerance) * region_pixels:
+                break
+            kept[label] = False
+            kept_pixels -= sizes[label]
+            size = max(size, (sizes[label] + 1) * pixel_area)
+        print(f"Isolated areas smaller than {size} m² are pruned", flush=True)
+        pixels = pixels[kept[areas]]
+        availability = np.zeros_like(self.ec._availability)
+        availability.flat[pixels] = self.ec._availability.flat[pixels]
+        self.ec._availability = availability
+        if self.ec.percentAvailable / 100 < (share - 0.002) or self.ec.percentAvailable / 100 > (share + 0.002):
             raise ValueError(
                 "Couldn't meet percentage within tolerance. " +
                 "Percentage achieved by wind speed is: ",
-                temp.percentAvailable)
-        print(temp.percentAvailable)
-        size = 10000
-        while temp.percentAvailable / 100 > (share + 0.00004):
-            if temp.percentAvailable > 0:
-                temp.pruneIsolatedAreas(minSize=size)
-            size += 100
-        print(temp.percentAvailable)
-        self._run_exclusion(_exclusion_dict)
-        if self.ec.percentAvailable > 0:
-            self.ec.pruneIsolatedAreas(minSize=size)
-        if self.ec.percentAvailable/100 < (share - tolerance):
-            print("Conflict with tolerance, please use smaller step size.")
+                self.ec.percentAvailable)
+        if self.ec.percentAvailable / 100 < (share - tolerance):
+            print("Conflict with tolerance, the share is limited by the size of the isolated areas.")
 
     def estimate_potential(
             self, predict=True, exclusion_dict=None, restrict_area=None, **args):
@@ -634,6 +538,7 @@ class Wind(Technology):
                 self.distribute_items()
                 self.report_dict["Items_Number"] = self.ec._itemCoords.shape[0]
                 self.report_dict["Capacity"] = self.predicted_items['capacity'].sum()
+            self._repack()
 
     def sim(self):
         """Simulate time-series of predicted wind turbines."""
@@ -664,28 +569,11 @@ class Wind(Technology):
         ----------
         overwrite_old: bool, default False. Only set to True, when you want to save the loading time
         for a very large RegionMask.
+
+        With TREP(pack_availability=True) the result is read bit-packed in blocks of rows.
         """
         path_LE = os.path.join(self.result_path, "Wind_potential_area.tif")
-        assert os.path.isfile(path_LE), f"Can't find the LE result {path_LE}"
-        if self.ec._hasEqualContext(path_LE):
-            print("The LE result can be directly accepted", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE)
-        else:
-            print("The LE result has to be warped to the mask region", flush=True)
-            path_LE_warp = os.path.join(self.result_path, "Wind_potential_area_warp.tif")
-            self.ec.region.warp(path_LE, output=path_LE_warp)
-            print("Warp finished", flush=True)
-            initial_LE = gk.raster.extractMatrix(path_LE_warp)
-        initial_LE = np.where(initial_LE == 100, 100, 0)
-        self.ec._availability = initial_LE
-        print("LE result is loaded", flush=True)
-        if overwrite_old:
-            self.ec.save(path_LE)
-        report_dict = {"Exclusion": "loaded from existing results",
-                       "Total_Area": int(self.parent.regionMask.mask.sum() * self.parent.regionMask.pixelRes ** 2),
-                       "Eligible_Area": self.ec.areaAvailable,
-                       "Eligible_Percentage": self.ec.percentAvailable}
-        return report_dict
+        return self._load_eligible_area(path_LE, overwrite_old=overwrite_old)
 
     def merge_to_germany(self, path_states: list = None):
         """Merge the potential area in federal states to germany, i.e. merge several small rasters to one large.
@@ -725,11 +613,6 @@ class Wind(Technology):
         all_mun_features = gk.vector.extractFeatures(path_mun)
         all_mun = all_mun_features[["geom", "RS"]]
 
-        # load wind direction from era
-        if self.wind_dir == "from_era":
-            wind_dir_raster = gk.raster.loadRaster(
-                os.path.join(self.parent.datasource_path, "era5",
-                             "ERA5_wind_direction_100m_mean.tiff"))
         # load netCDF data of turbines. Or get path of wind speed data from GlobalWindAtlas
         if mode == "QuWind100":
             files = os.listdir(path_netCDF)
@@ -750,9 +633,10 @@ class Wind(Technology):
         elif mode == "fromRK":
             path_gwa_de = os.path.join(self.parent.datasource_path, "gwa", "DEU_wind-speed_100m.tif")
 
-        mun_geom_with_items = []
-        mun_rs_with_items = []
-        all_items = []
+        # neighbours of the municipalities from the adjacency of the region catalog
+        catalog = self.parent.region_catalog
+        # placed items of each municipality with items
+        mun_items = {}
         mun_use_turbine = {key: list() for key in optional_turbines}
         for i in range(len(all_mun)):
             start = time.time()
@@ -768,14 +652,19 @@ class Wind(Technology):
             trep_mun.Wind.capacity = turbine["Capacity"]
             trep_mun.Wind.distance = self.distance
             # print("load available area", flush=True)
-            trep_mun.Wind.ec.excludeRasterType(os.path.join(path_LE, f"Wind_{state}", "Wind_potential_area.tif"),
-                                               value=0, buffer=0)
+            # only the window of the municipality is read from the potential area of the state
+            potential_area = read_region(trep_mun.Wind.ec.region,
+                                         os.path.join(path_LE, f"Wind_{state}", "Wind_potential_area.tif"))
+            trep_mun.Wind.ec._availability[potential_area == 0] = 0
             # print(f"loaded available area after {time.time() - start} sec", flush=True)
-            for k in range(len(mun_geom_with_items)):
-                if mun_geom_with_items[k].Intersect(all_mun.loc[i]['geom']):
-                    print(f"exclude items of neighbour {mun_rs_with_items[k]}", flush=True)
-                    trep_mun.Wind.ec.excludePoints(source=all_items[k], geometry_shape=geometry_shape,
-                                                   direction=self.wind_dir)
+            rs = all_mun.loc[i]['RS']
+            for neighbour in [rs] + catalog.get_neighbours(rs):
+                for items in mun_items.get(neighbour, []):
+                    print(f"exclude items of neighbour {neighbour}", flush=True)
+                    rotor_diam = items["rotor_diam"].values.astype(float)
+                    trep_mun.Wind.exclude_footprints(
+                        items, np.column_stack([self.distance[0] * rotor_diam, self.distance[1] * rotor_diam]),
+                        direction=items["direction"].values, geometry_shape=geometry_shape)
             # print(f"exclude items after {time.time() - start} sec", flush=True)
             trep_mun.Wind.distribute_items()
             if len(trep_mun.Wind.predicted_items) == 0:
@@ -834,20 +723,11 @@ class Wind(Technology):
                 continue
             else:
                 # print("save items and municipality in list", flush=True)
-                mun_geom_with_items.append(all_mun.loc[i]['geom'])
-                mun_rs_with_items.append(all_mun.loc[i]['RS'])
-                # prepare "scale" and "direction" for excludePoints()
-                trep_mun.Wind.predicted_items["scale"] = trep_mun.Wind.predicted_items.apply(
-                    lambda x: np.array([self.distance[0] * x["rotor_diam"], self.distance[1] * x["rotor_diam"]]), axis=1)
-                trep_mun.Wind.predicted_items["geom"] = trep_mun.Wind.ec.saveItems()["geom"]
-                if self.wind_dir == "from_era":
-                    # Direction has to be in vector file or dataframe
-                    trep_mun.Wind.predicted_items["direction"] = \
-                        trep_mun.Wind.predicted_items.apply(lambda x:
-                                                            gk.raster.interpolateValues(wind_dir_raster, x["geom"]),
-                                                            axis=1)
+                # direction of the footprints excluded in the neighbours
+                trep_mun.Wind.predicted_items["direction"] = self.get_wind_direction(
+                    trep_mun.Wind.predicted_items["lon"].values, trep_mun.Wind.predicted_items["lat"].values)
                 # print(f"prepared exclusion point after {time.time() - start} sec", flush=True)
-                all_items.append(trep_mun.Wind.predicted_items)
+                mun_items.setdefault(rs, []).append(trep_mun.Wind.predicted_items)
         # save for each optional turbine the municipalities, that use this turbine
         for turbine, mun_list in mun_use_turbine.items():
             if len(mun_list) > 0: